@@ -0,0 +1,942 @@
+#!/usr/bin/env python3
+"""Micro-benchmarks for the server-side game plumbing.
+
+Run with e.g. `python3 benchmark.py push --iterations 50` or `python3 benchmark.py http`.
+"""
+
+import argparse
+import asyncio
+import collections
+import contextlib
+import copy
+import functools
+import glob
+import json
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+import uuid
+
+from eldritch import eldritch
+from eldritch import events
+from islanders import balance
+from islanders import islanders
+from islanders import mapgen
+from islanders import simulate
+import game as game_handler
+import persist
+import server
+
+ELDRITCH_CHARS = ["Nun", "Student", "Doctor", "Gangster", "Scientist", "Salesman", "Drifter"]
+ISLANDERS_MAPS = ["standard4.json", "standard6.json", "greater4.json", "shores4.json", "fog4.json"]
+
+
+def MakeIslanders(num_players, num_spectators):
+  game = islanders.IslandersGame()
+  sessions = [f"player{idx}" for idx in range(num_players)]
+  sessions += [f"spectator{idx}" for idx in range(num_spectators)]
+  for session in sessions:
+    game.connect_user(session)
+  for idx in range(num_players):
+    game.handle_join(sessions[idx], {"name": sessions[idx]})
+  game.handle_start(sessions[0], {"options": {}})
+  return game, sessions
+
+
+def MakeEldritch(num_players, num_spectators):
+  game = eldritch.EldritchGame()
+  sessions = [f"player{idx}" for idx in range(num_players)]
+  sessions += [f"spectator{idx}" for idx in range(num_spectators)]
+  for session in sessions:
+    game.connect_user(session)
+  for _ in game.handle(sessions[0], {"type": "ancient", "ancient": "Wendigo"}) or []:
+    pass
+  for idx in range(num_players):
+    for _ in game.handle(sessions[idx], {"type": "join", "char": ELDRITCH_CHARS[idx]}) or []:
+      pass
+  for _ in game.handle(sessions[0], {"type": "start"}) or []:
+    pass
+  return game, sessions
+
+
+def TimePush(game, sessions, iterations):
+  start = time.perf_counter()
+  for _ in range(iterations):
+    for session in sessions:
+      game.for_player(session)
+  per_session = (time.perf_counter() - start) / iterations
+
+  start = time.perf_counter()
+  for _ in range(iterations):
+    game.for_players(sessions)
+  shared = (time.perf_counter() - start) / iterations
+  return per_session, shared
+
+
+def BenchmarkPush(args):
+  makers = {"islanders": (MakeIslanders, 6), "eldritch": (MakeEldritch, 7)}
+  print(
+    f"{'game':<10} {'players':>7} {'sessions':>8} {'per-session':>12} {'shared':>9} {'speedup':>7}"
+  )
+  for name, (maker, max_players) in makers.items():
+    for num_players in range(2, max_players + 1):
+      game, sessions = maker(num_players, args.spectators)
+      per_session, shared = TimePush(game, sessions, args.iterations)
+      print(
+        f"{name:<10} {num_players:>7} {len(sessions):>8} {per_session * 1000:>10.2f}ms "
+        f"{shared * 1000:>7.2f}ms {per_session / shared:>6.1f}x"
+      )
+
+
+async def HttpClient(port, paths, deadline):
+  reader, writer = await asyncio.open_connection("127.0.0.1", port)
+  session = uuid.uuid4()
+  count = 0
+  try:
+    while time.perf_counter() < deadline:
+      path = paths[count % len(paths)]
+      request = f"GET {path} HTTP/1.1\r\nHost: localhost\r\nCookie: session={session}\r\n\r\n"
+      writer.write(request.encode("ascii"))
+      await writer.drain()
+      head = await reader.readuntil(b"\r\n\r\n")
+      length = int(head.split(b"Content-Length: ")[1].split(b"\r\n")[0])
+      await reader.readexactly(length)
+      count += 1
+  finally:
+    writer.close()
+  return count
+
+
+async def Hammer(paths, num_clients, seconds):
+  """Returns the number of requests per second served to num_clients clients fetching paths."""
+  http_server = await asyncio.start_server(server.MyHandler.serve_connection, "127.0.0.1", 0)
+  port = http_server.sockets[0].getsockname()[1]
+  async with http_server:
+    deadline = time.perf_counter() + seconds
+    clients = [HttpClient(port, paths[idx:] + paths[:idx], deadline) for idx in range(num_clients)]
+    counts = await asyncio.gather(*clients)
+  return sum(counts) / seconds
+
+
+def BenchmarkHttp(args):
+  paths = ["/", "/islanders/islanders.js"]
+  for idx in range(args.games):
+    game_id = f"bench{idx}"
+    server.GAMES[game_id] = game_handler.GameHandler(game_id, islanders.IslandersGame)
+    server.GAMES[game_id].game, _ = MakeIslanders(4, 0)
+    paths.append(f"/json?game_id={game_id}")
+  rate = asyncio.run(Hammer(paths, args.clients, args.seconds))
+  print(f"{args.clients} clients, {args.games} games: {rate:.0f} requests/second")
+
+
+def BenchmarkStatic(args):
+  dirpath = os.path.join(server.ROOT_DIR, args.dir)
+  names = sorted(os.listdir(dirpath)) if os.path.isdir(dirpath) else []
+  paths = [f"/{args.dir}/{name}" for name in names if not name.startswith(".")]
+  if not paths:
+    print(f"No files found in {dirpath}")
+    return
+  server.STATIC_FILES.preload()
+  rate = asyncio.run(Hammer(paths, args.clients, args.seconds))
+  print(f"{args.clients} clients, {len(paths)} files in {args.dir}: {rate:.0f} requests/second")
+
+
+def BenchmarkRecover(args):
+  game_types = {"islanders": islanders.IslandersGame}
+  with tempfile.TemporaryDirectory() as tmpdir:
+    store = persist.Store(tmpdir, game_types, args.snapshot_interval)
+    start = time.perf_counter()
+    for idx in range(args.games):
+      game, sessions = MakeIslanders(4, 0)
+      journal = store.journal(f"game{idx}", "islanders")
+      journal.record(game)
+      for move in range(args.moves):
+        player = game.game.player_data[move % len(sessions)]
+        player.cards[f"rsrc{move % 5 + 1}"] += 1
+        journal.record(game, sessions[move % len(sessions)], {"type": "collect"})
+      journal.close()
+    saved = time.perf_counter() - start
+    size = sum(os.path.getsize(os.path.join(tmpdir, name)) for name in os.listdir(tmpdir))
+
+    start = time.perf_counter()
+    recovered = store.recover()
+    elapsed = time.perf_counter() - start
+    for _, _, _, journal in recovered:
+      journal.close()
+  print(
+    f"{args.games} games with {args.moves} moves each ({size / 1024 / 1024:.1f}MB on disk): "
+    f"saved in {saved:.2f}s, recovered {len(recovered)} in {elapsed:.2f}s "
+    f"({elapsed / args.games * 1000:.2f}ms per game)"
+  )
+
+
+def BuildRoutes(filename, num_players, rng):
+  """Builds random roads and ships on a map until players run out of pieces or places to build.
+
+  Returns the number of builds, the time spent calculating longest routes, the longest route, and
+  the finished board.
+  """
+  state = islanders.IslandersState()
+  for idx in range(num_players):
+    state.add_player(f"color{idx}", f"player{idx}")
+  islanders.Scenario.load_file(state, filename)
+  return FillRoutes(state, num_players, rng)
+
+
+def FillRoutes(state, num_players, rng, pieces=15):
+  """Like BuildRoutes, on a board that has already been loaded, with pieces roads/ships each."""
+  # pylint: disable=protected-access
+  land = {loc for loc, tile in state.tiles.items() if tile.is_land}
+  corners = sorted({corner for loc in land for corner in loc.get_corner_locations()})
+
+  def can_settle(corner):
+    return all(loc not in state.pieces for loc in [corner, *corner.get_adjacent_corners()])
+
+  def settle(corner, player):
+    state._add_piece(islanders.Piece(corner.x, corner.y, "settlement", player))  # noqa: SLF001
+    # Like add_piece, recalculate for every player whose route might be cut by the settlement.
+    players = {state.roads[edge].player for edge in corner.get_edges() if edge in state.roads}
+    for idx in sorted(players):
+      state._calculate_longest_road(idx)  # noqa: SLF001
+
+  def frontier(player):
+    ends = {loc for loc, piece in state.pieces.items() if piece.player == player}
+    for road in state.roads.values():
+      if road.player == player:
+        ends.update([road.location.corner_left, road.location.corner_right])
+    counts = collections.Counter(r.road_type for r in state.roads.values() if r.player == player)
+    options = set()
+    for corner in ends:
+      piece = state.pieces.get(corner)
+      if piece is not None and piece.player != player:
+        continue
+      for edge in corner.get_edges():
+        tiles = edge.get_adjacent_tiles()
+        if edge in state.roads or not all(tile in state.tiles for tile in tiles):
+          continue
+        road_type = "road" if any(tile in land for tile in tiles) else "ship"
+        if counts[road_type] < pieces:
+          options.add((edge, road_type))
+    return sorted(options)
+
+  for player in list(range(num_players)) * 2:
+    settle(rng.choice([corner for corner in corners if can_settle(corner)]), player)
+  builds = 0
+  elapsed = 0
+  while True:
+    built = False
+    for player in range(num_players):
+      options = frontier(player)
+      if not options:
+        continue
+      edge, road_type = rng.choice(options)
+      state._add_road(islanders.Road(edge, road_type, player))  # noqa: SLF001
+      start = time.perf_counter()
+      state._calculate_longest_road(player)  # noqa: SLF001
+      if builds % 5 == 0:
+        spots = [corner for corner in (edge.corner_left, edge.corner_right) if can_settle(corner)]
+        if spots and spots[0] in corners:
+          settle(spots[0], (player + 1) % num_players)
+      elapsed += time.perf_counter() - start
+      builds += 1
+      built = True
+    if not built:
+      break
+  longest = max(state._calculate_longest_road(idx) for idx in range(num_players))  # noqa: SLF001
+  return builds, elapsed, longest, state
+
+
+def BenchmarkRoutes(args):
+  print(f"{'map':<16} {'players':>7} {'builds':>6} {'total':>9} {'per build':>10} {'longest':>7}")
+  for filename in args.maps:
+    num_players = int(filename.removesuffix(".json")[-1])
+    rng = random.Random(args.seed)
+    builds, elapsed, longest = 0, 0, 0
+    for _ in range(args.games):
+      game_builds, game_elapsed, game_longest, _ = BuildRoutes(filename, num_players, rng)
+      builds += game_builds
+      elapsed += game_elapsed
+      longest = max(longest, game_longest)
+    print(
+      f"{filename:<16} {num_players:>7} {builds:>6} {elapsed * 1000:>7.0f}ms "
+      f"{elapsed / builds * 1000:>8.3f}ms {longest:>7}"
+    )
+
+
+def BenchmarkBoard(args):
+  """Times the parts of a move that walk the board's tiles, corners, and edges."""
+  # pylint: disable=protected-access
+  columns = ["state", "placements", "dice", "islands", "routes", "total"]
+  print(f"{'map':<16} " + " ".join(f"{column:>10}" for column in columns))
+  for filename in args.maps:
+    num_players = int(filename.removesuffix(".json")[-1])
+    _, _, _, state = BuildRoutes(filename, num_players, random.Random(args.seed))
+    state.game_phase = "main"
+    state.action_stack = []
+
+    def placements(state=state):
+      state._placement_cache.clear()  # noqa: SLF001
+      state.legal_placements(state.turn_idx)
+
+    def routes(state=state, num_players=num_players):
+      state.route_lengths.clear()
+      for idx in range(num_players):
+        state._calculate_longest_road(idx)  # noqa: SLF001
+
+    timings = []
+    for func in [
+      state.json_for_player,
+      placements,
+      lambda state=state: [state.calculate_resource_distribution((0, num)) for num in range(2, 13)],
+      state._compute_contiguous_islands,  # noqa: SLF001
+      routes,
+    ]:
+      start = time.perf_counter()
+      for _ in range(args.iterations):
+        func()
+      timings.append((time.perf_counter() - start) / args.iterations)
+    columns = " ".join(f"{timing * 1000:>8.3f}ms" for timing in [*timings, sum(timings)])
+    print(f"{filename:<16} {columns}")
+
+
+def BenchmarkScale(args):
+  """Times the parts of a move that walk the whole board, on generated maps of growing size."""
+  # pylint: disable=protected-access
+  columns = ["topology", "recompute", "routes", "placements", "state", "json"]
+  print(f"{'radius':>6} {'tiles':>6} {'roads':>6} " + " ".join(f"{col:>10}" for col in columns))
+  for radius in args.radii:
+    rng = random.Random(args.seed)
+    state = islanders.IslandersState()
+    for idx in range(args.players):
+      state.add_player(f"color{idx}", f"player{idx}")
+    mapgen.generate(state, radius, land=args.land, islands=args.islands, rng=rng)
+    # Players get more pieces on bigger boards, so that their routes grow with the board.
+    FillRoutes(state, args.players, rng, pieces=15 * radius // 3)
+    state.game_phase = "main"
+    state.action_stack = []
+
+    def topology(state=state):
+      islanders.board_topology.__wrapped__(frozenset(state.tiles))
+
+    def routes(state=state):
+      state.route_lengths.clear()
+      for idx in range(args.players):
+        state._calculate_longest_road(idx)  # noqa: SLF001
+
+    def placements(state=state):
+      state._placement_cache.clear()  # noqa: SLF001
+      state.legal_placements(state.turn_idx)
+
+    def encode(state=state):
+      json.dumps(state.for_player(0), cls=game_handler.CustomEncoder)
+
+    timings = []
+    for func in [topology, state.recompute, routes, placements, state.json_for_player, encode]:
+      start = time.perf_counter()
+      for _ in range(args.iterations):
+        func()
+      timings.append((time.perf_counter() - start) / args.iterations)
+    print(
+      f"{radius:>6} {len(state.tiles):>6} {len(state.roads):>6} "
+      + " ".join(f"{timing * 1000:>8.3f}ms" for timing in timings)
+    )
+
+
+def FogState(radius, fog, rng):
+  """A generated board where some of the land has not been discovered yet.
+
+  Undiscovered tiles have no number, and tiles without numbers do not connect islands, so every
+  discovery may grow or merge islands. Returns the board and its hidden tiles' numbers.
+  """
+  state = islanders.IslandersState()
+  state.options.norsrc_is_connected = False
+  mapgen.generate(state, radius, land=0.6, islands=radius, rng=rng)
+  land = [loc for loc, tile in state.tiles.items() if tile.number]
+  hidden = {loc: state.tiles[loc].number for loc in rng.sample(land, int(len(land) * fog))}
+  for loc in hidden:
+    state.tiles[loc].tile_type = "discover"
+    state.tiles[loc].number = None
+  state.recompute()
+  return state, hidden
+
+
+def BenchmarkFog(args):
+  """Times keeping track of islands as the fog is lifted from a generated board, tile by tile."""
+  # pylint: disable=protected-access
+  columns = ["rebuild", "incremental", "lookup"]
+  print(f"{'radius':>6} {'tiles':>6} {'hidden':>6} " + " ".join(f"{col:>11}" for col in columns))
+  for radius in args.radii:
+    state, hidden = FogState(radius, args.fog, random.Random(args.seed))
+    timings = []
+    for update in [
+      lambda state, tile: state._compute_contiguous_islands(),  # noqa: SLF001
+      lambda state, tile: state._join_island(tile),  # noqa: SLF001
+    ]:
+      board = state.clone()
+      start = time.perf_counter()
+      for loc, number in hidden.items():
+        tile = board.tiles[loc]
+        tile.tile_type = "rsrc1"
+        tile.number = number
+        update(board, tile)
+      timings.append((time.perf_counter() - start) / len(hidden))
+    corners = state.topology.corners
+    start = time.perf_counter()
+    for _ in range(args.iterations):
+      for corner in corners:
+        board.corners_to_islands.get(corner)
+    timings.append((time.perf_counter() - start) / args.iterations / len(corners))
+    print(
+      f"{radius:>6} {len(state.tiles):>6} {len(hidden):>6} "
+      + " ".join(f"{timing * 1e6:>9.2f}us" for timing in timings)
+    )
+
+
+def BenchmarkBalance(args):
+  """Times balancing the land of each scenario, and of generated maps, against FAIR."""
+  boards = []
+  # The test map has only four tiles, which cannot be balanced.
+  for name in [name for name in simulate.SCENARIOS if name != "Test Map"]:
+    game = islanders.IslandersGame()
+    for idx in range(args.players):
+      game.connect_user(f"player{idx}")
+      game.handle_join(f"player{idx}", {"name": f"player{idx}"})
+    game.handle_change_scenario("player0", {"scenario": name})
+    # Not every scenario can be played with every number of players.
+    with contextlib.suppress(game_handler.GameException, RuntimeError):
+      game.handle_start("player0", {"options": {}})
+    if game.game is not None:
+      boards.append((name, game.game))
+  for radius in args.radii:
+    state = islanders.IslandersState()
+    mapgen.generate(state, radius, rng=random.Random(args.seed))
+    boards.append((f"radius {radius}", state))
+
+  print(f"{'board':<24} {'tiles':>5} {'before':>7} {'after':>7} {'fair':>5} {'time':>10}")
+  rng = random.Random(args.seed)
+  for name, state in boards:
+    land = [loc for loc, t in state.tiles.items() if t.number or t.tile_type == "norsrc"]
+    before = balance.unfairness(state, balance.FAIR)
+    start = time.perf_counter()
+    fair = balance.balance(state, land, balance.FAIR, seconds=args.seconds, rng=rng)
+    elapsed = time.perf_counter() - start
+    after = balance.unfairness(state, balance.FAIR)
+    print(
+      f"{name:<24} {len(land):>5} {before:>7.1f} {after:>7.1f} {fair!s:>5} {elapsed * 1000:>8.1f}ms"
+    )
+
+
+def BenchmarkDice(args):
+  print(f"{'map':<16} {'rolls':>7} {'one by one':>11} {'per roll':>9} {'simulated':>10}")
+  for filename in args.maps:
+    num_players = int(filename.removesuffix(".json")[-1])
+    _, _, _, state = BuildRoutes(filename, num_players, random.Random(args.seed))
+    rng = random.Random(args.seed)
+    start = time.perf_counter()
+    for _ in range(args.rolls):
+      state.calculate_resource_distribution((rng.randint(1, 6), rng.randint(1, 6)))
+    one_by_one = time.perf_counter() - start
+    start = time.perf_counter()
+    state.simulate_rolls(args.rolls, rng)
+    simulated = time.perf_counter() - start
+    print(
+      f"{filename:<16} {args.rolls:>7} {one_by_one * 1000:>9.1f}ms "
+      f"{one_by_one / args.rolls * 1e6:>7.2f}us {simulated * 1000:>8.1f}ms"
+    )
+
+
+def BenchmarkShips(args):
+  """Times recalculating which ships are movable and closed on large networks full of loops."""
+  state = islanders.IslandersState()
+  state.add_player("color0", "player0")
+  for x in range(1, 6 * args.radius, 3):
+    for y in range(x % 6 == 1, 4 * args.radius, 2):
+      state.add_tile(islanders.Tile(x, y, "space", False, None))
+  topology = state.topology
+  source = min(
+    topology.corners, key=lambda c: abs(c.x - 3 * args.radius) + abs(c.y - 2 * args.radius)
+  )
+  print(f"{'ships':>6} {'loops':>6} {'settlements':>11} {'per recalculation':>18}")
+  for size in args.sizes:
+    state.roads.clear()
+    state.pieces.clear()
+    # Fill the board outwards from the source, so that the network has as many loops as possible.
+    corners = collections.deque([source])
+    seen = {source}
+    while corners and len(state.roads) < size:
+      corner = corners.popleft()
+      for edge in topology.corner_edges[corner]:
+        if edge not in topology.board_edges or edge in state.roads or len(state.roads) >= size:
+          continue
+        state.roads[edge] = islanders.Road(edge, "ship", 0, source=source)
+        for other in topology.edge_corners[edge]:
+          if other not in seen and other in topology.corner_edges:
+            seen.add(other)
+            corners.append(other)
+    network = sorted(seen)
+    for corner in [source, *network[:: max(len(network) // args.settlements, 1)]]:
+      state.pieces[corner] = islanders.Piece(corner.x, corner.y, "settlement", 0)
+    loops = len(state.roads) - len({c for e in state.roads for c in topology.edge_corners[e]}) + 1
+    start = time.perf_counter()
+    for _ in range(args.iterations):
+      state.recalculate_ships(source, 0)
+    elapsed = (time.perf_counter() - start) / args.iterations
+    print(f"{len(state.roads):>6} {loops:>6} {len(state.pieces):>11} {elapsed * 1000:>16.3f}ms")
+
+
+def BenchmarkClone(args):
+  """Compares copy.deepcopy with cloning a game, and times trying out moves and undoing them."""
+  columns = ["deepcopy", "clone", "restore"]
+  print(f"{'map':<16} " + " ".join(f"{column:>10}" for column in columns) + f" {'tries/s':>8}")
+  for filename in args.maps:
+    num_players = int(filename.removesuffix(".json")[-1])
+    _, _, _, state = BuildRoutes(filename, num_players, random.Random(args.seed))
+    state.game_phase = "main"
+    state.action_stack = []
+    for player in state.player_data:
+      player.cards.update({rsrc: 20 for rsrc in islanders.RESOURCES})
+    snapshot = state.clone()
+
+    timings = []
+    for func in [lambda state=state: copy.deepcopy(state), state.clone]:
+      start = time.perf_counter()
+      for _ in range(args.iterations):
+        func()
+      timings.append((time.perf_counter() - start) / args.iterations)
+    start = time.perf_counter()
+    for _ in range(args.iterations):
+      state.restore(snapshot)
+    timings.append((time.perf_counter() - start) / args.iterations)
+
+    # Try every move the current player could make to build something or trade with the bank.
+    player = state.turn_idx
+    own = [loc for loc, piece in state.pieces.items() if piece.player == player]
+    moves = [
+      {"type": "settle", "location": loc} for loc in state.legal_placements(player)["settle"]
+    ]
+    moves.extend({"type": "city", "location": loc} for loc in own)
+    moves.append({"type": "buy_dev"})
+    moves.extend(
+      {"type": "trade_bank", "offer": {"give": {give: 4}, "want": {want: 1}}}
+      for give in islanders.RESOURCES
+      for want in islanders.RESOURCES
+      if give != want
+    )
+    start = time.perf_counter()
+    for _ in range(args.iterations):
+      for move in moves:
+        try:
+          for _ in state.handle(player, move):
+            pass
+        except game_handler.GameException:
+          pass
+        state.restore(snapshot)
+    elapsed = time.perf_counter() - start
+    tries = len(moves) * args.iterations
+    columns = " ".join(f"{timing * 1000:>8.3f}ms" for timing in timings)
+    print(f"{filename:<16} {columns} {tries / elapsed:>8.0f}")
+
+
+def MeasureGames(make_game, count):
+  """Returns the number of bytes allocated for each game that make_game builds."""
+  make_game()  # Boards with the same layout share a topology, which only the first game pays for.
+  tracemalloc.start()
+  start = tracemalloc.get_traced_memory()[0]
+  games = [make_game() for _ in range(count)]
+  size = tracemalloc.get_traced_memory()[0] - start
+  tracemalloc.stop()
+  del games
+  return size // count
+
+
+def BenchmarkMemory(args):
+  """Measures the memory used by each game on each map, before and after the board fills up."""
+  print(f"{'map':<24} {'tiles':>5} {'pieces':>6} {'roads':>5} {'empty':>8} {'full':>8}")
+  for filename in args.maps:
+    num_players = int(filename.removesuffix(".json")[-1])
+
+    def empty(filename=filename, num_players=num_players):
+      state = islanders.IslandersState()
+      for idx in range(num_players):
+        state.add_player(f"color{idx}", f"player{idx}")
+      islanders.Scenario.load_file(state, filename)
+      return state
+
+    rng = random.Random(args.seed)
+
+    def full(filename=filename, num_players=num_players, rng=rng):
+      return BuildRoutes(filename, num_players, rng)[3]
+
+    state = full()
+    empty_size = MeasureGames(empty, args.games)
+    full_size = MeasureGames(full, args.games)
+    print(
+      f"{filename:<24} {len(state.tiles):>5} {len(state.pieces):>6} {len(state.roads):>5} "
+      f"{empty_size / 1024:>6.1f}kB {full_size / 1024:>6.1f}kB"
+    )
+
+
+def BenchmarkMaps(args):
+  """Times building the board for each scenario, for the lobby's preview and for new games."""
+  columns = ["unparsed", "parsed", "cached", "start"]
+  print(f"{'scenario':<24} " + " ".join(f"{column:>10}" for column in columns))
+  for name in simulate.SCENARIOS:
+    scenario = islanders.IslandersGame.SCENARIOS[name]
+
+    def preview(scenario=scenario):
+      islanders.scenario_preview.__wrapped__(islanders.IslandersState, scenario, args.players)
+
+    def unparsed(preview=preview):
+      islanders.map_template.cache_clear()
+      preview()
+
+    def cached(scenario=scenario):
+      islanders.scenario_preview(islanders.IslandersState, scenario, args.players)
+
+    def start(name=name):
+      game = islanders.IslandersGame()
+      for idx in range(args.players):
+        game.connect_user(f"player{idx}")
+        game.handle_join(f"player{idx}", {"name": f"player{idx}"})
+      game.handle_change_scenario("player0", {"scenario": name})
+      # Not every scenario can be played with every number of players.
+      with contextlib.suppress(game_handler.GameException, RuntimeError):
+        game.handle_start("player0", {"options": {}})
+
+    timings = []
+    for func in [unparsed, preview, cached, start]:
+      func()
+      begin = time.perf_counter()
+      for _ in range(args.iterations):
+        func()
+      timings.append((time.perf_counter() - begin) / args.iterations)
+    print(f"{name:<24} " + " ".join(f"{timing * 1000:>8.3f}ms" for timing in timings))
+
+
+def BenchmarkLobby(args):
+  """Times pushing the lobby to every session as the host cycles through the scenarios."""
+  # pylint: disable=protected-access
+  game = islanders.IslandersGame()
+  sessions = [f"player{idx}" for idx in range(args.players)]
+  sessions += [f"spectator{idx}" for idx in range(args.spectators)]
+  for session in sessions:
+    game.connect_user(session)
+  for idx in range(args.players):
+    game.handle_join(sessions[idx], {"name": sessions[idx]})
+
+  def rebuild():
+    # Every session builds its own preview board, as if nothing were cached.
+    for session in sessions:
+      islanders.scenario_preview.cache_clear()
+      game._lobby_json = None  # noqa: SLF001
+      game.for_player(session)
+
+  def per_session():
+    for session in sessions:
+      game.for_player(session)
+
+  def shared():
+    game.for_players(sessions)
+
+  columns = ["rebuild", "per-session", "shared"]
+  print(f"{'scenario':<24} " + " ".join(f"{column:>11}" for column in columns))
+  totals = [0] * len(columns)
+  for name in islanders.IslandersGame.SCENARIOS:
+    timings = []
+    for func in [rebuild, per_session, shared]:
+      elapsed = 0
+      for _ in range(args.iterations):
+        # Each push follows a change to the lobby, which invalidates the shared lobby state.
+        game.handle_change_scenario(sessions[0], {"scenario": name})
+        begin = time.perf_counter()
+        func()
+        elapsed += time.perf_counter() - begin
+      timings.append(elapsed / args.iterations)
+    totals = [total + timing for total, timing in zip(totals, timings)]
+    print(f"{name:<24} " + " ".join(f"{timing * 1000:>9.3f}ms" for timing in timings))
+  print(f"{'total':<24} " + " ".join(f"{total * 1000:>9.3f}ms" for total in totals))
+
+
+def MakeEvent(name, idx):
+  if name == "islanders":
+    return islanders.Event("rob", "{player0} stole a card", "{player0} stole {rsrc1}", [0, 1])
+  event = events.EventLog(f"Event {idx}", False)
+  for sub_idx in range(5):
+    event.sub_events.append(events.EventLog(f"Step {sub_idx} of event {idx}", False))
+  return event
+
+
+def TimeEvents(game, sessions, make_event, iterations):
+  """Returns the time and the kilobytes of the log sent per push for each way of sending the log.
+
+  rebuild renders every entry again for every session, inline adds the cached views to each state,
+  and incremental sends each session only the entries that it does not have yet.
+  """
+  log = game.game.event_log
+  revisions = {}
+
+  # Each returns the number of bytes of the log that it would send.
+  def rebuild(messages):  # pylint: disable=unused-argument
+    game.event_log_views.views.clear()
+    views = game.event_views(sessions)
+    return sum(len(views[session].json()) for session in sessions)
+
+  def inline(messages):
+    views = game.event_views(sessions)
+    states = [views[session].splice(messages[session]) for session in sessions]
+    return sum(map(len, states)) - sum(map(len, messages.values()))
+
+  def incremental(messages):  # pylint: disable=unused-argument
+    views = game.event_views(sessions)
+    sent = 0
+    for session in sessions:
+      view = views[session]
+      sent += len(view.since(revisions.get(session)) or "")
+      revisions[session] = view.revision
+    return sent
+
+  timings = []
+  sizes = []
+  for func in [rebuild, inline, incremental]:
+    incremental(None)  # Catch every session up before the first timed push.
+    elapsed = 0
+    sent = 0
+    for _ in range(iterations):
+      log.append(make_event(log.next_seq))
+      # Only the time spent on the log counts, not the rest of the state.
+      messages = game.for_players(sessions)
+      begin = time.perf_counter()
+      sent += func(messages)
+      elapsed += time.perf_counter() - begin
+    timings.append(elapsed / iterations)
+    sizes.append(sent / iterations / 1024)
+  return timings, sizes
+
+
+def BenchmarkEvents(args):
+  """Times sending the event log with each push as the log grows by one entry per push."""
+  makers = {"islanders": MakeIslanders, "eldritch": MakeEldritch}
+  columns = ["rebuild", "inline", "incremental", "inline KB", "incr. KB"]
+  print(f"{'game':<10} {'entries':>7} " + " ".join(f"{column:>11}" for column in columns))
+  for name, maker in makers.items():
+    game, sessions = maker(args.players, args.spectators)
+    log = game.game.event_log
+    make_event = functools.partial(MakeEvent, name)
+    for size in args.entries:
+      while log.next_seq < size:
+        log.append(make_event(log.next_seq))
+      if len(log) < size:
+        break  # The islanders log only keeps the newest entries.
+      timings, sizes = TimeEvents(game, sessions, make_event, args.iterations)
+      print(
+        f"{name:<10} {len(log):>7} "
+        + " ".join(f"{timing * 1000:>9.3f}ms" for timing in timings)
+        + " "
+        + " ".join(f"{size:>11.1f}" for size in sizes[1:])
+      )
+
+
+def TreasonState(radius, rng):
+  """A generated board with barbarians on some of its coast, waiting for a treason card's move."""
+  state = islanders.IslandersState()
+  for idx in range(4):
+    state.add_player(f"color{idx}", f"player{idx}")
+  mapgen.generate(state, radius, rng=rng)
+  state.options.invasion_type = "barbarians"
+  for tile in state.tiles.values():
+    if tile.is_land and tile.number and rng.random() < 0.3:
+      tile.barbarians = rng.randint(1, 3)
+      tile.conquered = tile.barbarians == 3
+  state.game_phase = "main"
+  state.action_stack = ["treason"]
+  return state
+
+
+def BenchmarkInvasion(args):
+  """Times the moves that bring and move barbarians, in games played by bots and on big boards."""
+  # pylint: disable=protected-access
+  policies = [args.policies[idx % len(args.policies)] for idx in range(args.players)]
+  move_types = ["roll_dice", "end_turn", "settle", "treason", "intrigue", "expel"]
+  print(f"{'scenario':<20} {'moves':>7} {'moves/s':>8} " + " ".join(f"{m:>10}" for m in move_types))
+  for scenario in args.scenarios:
+    start = time.perf_counter()
+    stats = simulate.play_games(
+      scenario, policies, args.games, seed=args.seed, workers=1, max_moves=args.max_moves
+    )
+    elapsed = time.perf_counter() - start
+    means = [
+      stats.move_seconds[move_type] / max(stats.histograms[move_type].total(), 1)
+      for move_type in move_types
+    ]
+    print(
+      f"{scenario:<20} {stats.moves:>7} {stats.moves / elapsed:>8.0f} "
+      + " ".join(f"{mean * 1e6:>8.1f}us" for mean in means)
+    )
+  print(f"\n{'radius':>6} {'tiles':>6} {'barbarians':>10} {'treason push':>12}")
+  for radius in args.radii:
+    state = TreasonState(radius, random.Random(args.seed))
+    start = time.perf_counter()
+    for _ in range(args.iterations):
+      state.player_json(state.turn_idx)
+    elapsed = (time.perf_counter() - start) / args.iterations
+    barbarians = sum(tile.barbarians for tile in state.tiles.values())
+    print(f"{radius:>6} {len(state.tiles):>6} {barbarians:>10} {elapsed * 1e6:>10.1f}us")
+
+
+def BenchmarkSelfplay(args):
+  """Plays whole games with bots in a process pool, and reports how quickly moves are handled."""
+  policies = [args.policies[idx % len(args.policies)] for idx in range(args.players)]
+  print(f"{'scenario':<24} {'games':>5} {'won':>4} {'moves':>7} {'rejected':>8} ", end="")
+  print(f"{'moves/s':>8} {'games/s':>8}")
+  for scenario in args.scenarios:
+    start = time.perf_counter()
+    stats = simulate.play_games(
+      scenario, policies, args.games, seed=args.seed, workers=args.workers, max_moves=args.max_moves
+    )
+    elapsed = time.perf_counter() - start
+    print(f"{scenario:<24} {stats.games:>5} {stats.finished:>4} {stats.moves:>7} ", end="")
+    print(f"{stats.rejected:>8} {stats.moves / elapsed:>8.0f} {stats.games / elapsed:>8.2f}")
+    for phase, count in sorted(stats.stuck.items()):
+      print(f"  stuck in {phase}: {count}")
+    for error, count in sorted(stats.errors.items()):
+      print(f"  error ({count}): {error}")
+    if not args.histogram:
+      continue
+    print(f"  {'move':<16} {'count':>7} {'mean':>9} {'p50':>9} {'p99':>9} {'max':>9}")
+    for move_type, histogram in sorted(stats.histograms.items()):
+      count = sum(histogram.values())
+      times = [
+        stats.move_seconds[move_type] / count,
+        stats.percentile(move_type, 0.5),
+        stats.percentile(move_type, 0.99),
+        stats.max_seconds[move_type],
+      ]
+      print(f"  {move_type:<16} {count:>7} " + " ".join(f"{t * 1e6:>7.0f}us" for t in times))
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__)
+  subparsers = parser.add_subparsers(dest="command", required=True)
+  push = subparsers.add_parser("push", help="CPU time per push versus number of players")
+  push.add_argument("--iterations", type=int, default=20)
+  push.add_argument("--spectators", type=int, default=2)
+  push.set_defaults(func=BenchmarkPush)
+  http = subparsers.add_parser("http", help="HTTP requests per second with concurrent clients")
+  http.add_argument("--clients", type=int, default=20)
+  http.add_argument("--games", type=int, default=10)
+  http.add_argument("--seconds", type=float, default=5)
+  http.set_defaults(func=BenchmarkHttp)
+  static = subparsers.add_parser("static", help="Static file requests per second")
+  static.add_argument("--dir", default="eldritch/images")
+  static.add_argument("--clients", type=int, default=20)
+  static.add_argument("--seconds", type=float, default=5)
+  static.set_defaults(func=BenchmarkStatic)
+  recover = subparsers.add_parser("recover", help="Time to load saved games on startup")
+  recover.add_argument("--games", type=int, default=300)
+  recover.add_argument("--moves", type=int, default=150)
+  recover.add_argument("--snapshot-interval", type=int, default=persist.SNAPSHOT_INTERVAL)
+  recover.set_defaults(func=BenchmarkRecover)
+  routes = subparsers.add_parser("routes", help="Time to update longest routes as players build")
+  routes.add_argument("--maps", nargs="+", default=ISLANDERS_MAPS)
+  routes.add_argument("--games", type=int, default=5)
+  routes.add_argument("--seed", type=int, default=0)
+  routes.set_defaults(func=BenchmarkRoutes)
+  board = subparsers.add_parser("board", help="Time spent walking the board per move")
+  board.add_argument("--maps", nargs="+", default=ISLANDERS_MAPS)
+  board.add_argument("--iterations", type=int, default=200)
+  board.add_argument("--seed", type=int, default=0)
+  board.set_defaults(func=BenchmarkBoard)
+  scale = subparsers.add_parser("scale", help="Time spent walking generated boards as they grow")
+  scale.add_argument("--radii", type=int, nargs="+", default=[3, 6, 9, 12])
+  scale.add_argument("--players", type=int, default=4)
+  scale.add_argument("--land", type=float, default=0.6)
+  scale.add_argument("--islands", type=int, default=3)
+  scale.add_argument("--iterations", type=int, default=5)
+  scale.add_argument("--seed", type=int, default=0)
+  scale.set_defaults(func=BenchmarkScale)
+  fog = subparsers.add_parser("fog", help="Time to update islands as generated fog is discovered")
+  fog.add_argument("--radii", type=int, nargs="+", default=[6, 12, 20, 30])
+  fog.add_argument("--fog", type=float, default=0.3)
+  fog.add_argument("--iterations", type=int, default=20)
+  fog.add_argument("--seed", type=int, default=0)
+  fog.set_defaults(func=BenchmarkFog)
+  fair = subparsers.add_parser("balance", help="Time to balance each scenario's board")
+  fair.add_argument("--players", type=int, default=4)
+  fair.add_argument("--radii", type=int, nargs="+", default=[6, 12, 20])
+  fair.add_argument("--seconds", type=float, default=10)
+  fair.add_argument("--seed", type=int, default=0)
+  fair.set_defaults(func=BenchmarkBalance)
+  dice = subparsers.add_parser("dice", help="Time to distribute resources for many dice rolls")
+  dice.add_argument("--maps", nargs="+", default=ISLANDERS_MAPS)
+  dice.add_argument("--rolls", type=int, default=10000)
+  dice.add_argument("--seed", type=int, default=0)
+  dice.set_defaults(func=BenchmarkDice)
+  ships = subparsers.add_parser("ships", help="Time to recalculate movable ships in big networks")
+  ships.add_argument("--sizes", type=int, nargs="+", default=[15, 30, 60, 120, 240])
+  ships.add_argument("--settlements", type=int, default=4)
+  ships.add_argument("--radius", type=int, default=8)
+  ships.add_argument("--iterations", type=int, default=100)
+  ships.set_defaults(func=BenchmarkShips)
+  clone = subparsers.add_parser("clone", help="Time to clone a game and undo moves on it")
+  clone.add_argument("--maps", nargs="+", default=ISLANDERS_MAPS)
+  clone.add_argument("--iterations", type=int, default=100)
+  clone.add_argument("--seed", type=int, default=0)
+  clone.set_defaults(func=BenchmarkClone)
+  map_files = sorted(
+    os.path.basename(path)
+    for path in glob.glob(os.path.join(os.path.dirname(islanders.__file__), "*[0-9].json"))
+  )
+  memory = subparsers.add_parser("memory", help="Bytes used by each game on each bundled map")
+  memory.add_argument("--maps", nargs="+", default=map_files)
+  memory.add_argument("--games", type=int, default=20)
+  memory.add_argument("--seed", type=int, default=0)
+  memory.set_defaults(func=BenchmarkMemory)
+  maps = subparsers.add_parser("maps", help="Time to load each scenario's map")
+  maps.add_argument("--players", type=int, default=4)
+  maps.add_argument("--iterations", type=int, default=50)
+  maps.set_defaults(func=BenchmarkMaps)
+  lobby = subparsers.add_parser("lobby", help="Time to push the lobby as the scenario changes")
+  lobby.add_argument("--players", type=int, default=6)
+  lobby.add_argument("--spectators", type=int, default=2)
+  lobby.add_argument("--iterations", type=int, default=20)
+  lobby.set_defaults(func=BenchmarkLobby)
+  log = subparsers.add_parser("events", help="Time to send a growing event log with each push")
+  log.add_argument("--players", type=int, default=4)
+  log.add_argument("--spectators", type=int, default=2)
+  log.add_argument("--entries", type=int, nargs="+", default=[50, 500, 5000])
+  log.add_argument("--iterations", type=int, default=20)
+  log.set_defaults(func=BenchmarkEvents)
+  invade = subparsers.add_parser("invasion", help="Time to move barbarians in games and big boards")
+  invade.add_argument("--scenarios", nargs="+", default=["Barbarians Attack", "Desert Riders"])
+  invade.add_argument(
+    "--policies", nargs="+", choices=sorted(simulate.POLICIES), default=["greedy", "random"]
+  )
+  invade.add_argument("--players", type=int, default=4)
+  invade.add_argument("--games", type=int, default=4)
+  invade.add_argument("--max-moves", type=int, default=5000)
+  invade.add_argument("--radii", type=int, nargs="+", default=[3, 6, 12, 20])
+  invade.add_argument("--iterations", type=int, default=200)
+  invade.add_argument("--seed", type=int, default=0)
+  invade.set_defaults(func=BenchmarkInvasion)
+  selfplay = subparsers.add_parser("selfplay", help="Moves per second in games played by bots")
+  selfplay.add_argument(
+    "--scenarios", nargs="+", choices=simulate.SCENARIOS, default=simulate.SCENARIOS
+  )
+  selfplay.add_argument(
+    "--policies", nargs="+", choices=sorted(simulate.POLICIES), default=["greedy", "random"]
+  )
+  selfplay.add_argument("--players", type=int, default=4)
+  selfplay.add_argument("--games", type=int, default=8)
+  selfplay.add_argument("--workers", type=int, default=None)
+  selfplay.add_argument("--seed", type=int, default=0)
+  selfplay.add_argument("--max-moves", type=int, default=5000)
+  selfplay.add_argument("--histogram", action="store_true")
+  selfplay.set_defaults(func=BenchmarkSelfplay)
+  args = parser.parse_args()
+  args.func(args)
+
+
+if __name__ == "__main__":
+  main()
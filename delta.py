@@ -0,0 +1,147 @@
+"""Opt-in delta protocol for game state pushes.
+
+Instead of the full state, a websocket that has opted in receives RFC 6902 style patches against
+the last state it was sent. Every message carries a sequence number; a client that misses a patch
+(or fails to apply one) asks for a resync and gets a full snapshot. Snapshots are also sent
+periodically, and whenever the patch would be larger than the state itself.
+
+Client side: /patch.js.
+"""
+
+import json
+import marshal
+
+SNAPSHOT_INTERVAL = 100
+
+
+def Escape(key):
+  return str(key).replace("~", "~0").replace("/", "~1")
+
+
+def Unescape(token):
+  return token.replace("~1", "/").replace("~0", "~")
+
+
+def Diff(old, new, path=""):
+  """Returns a list of add/remove/replace operations that turn old into new.
+
+  Both old and new must be plain JSON values (i.e. the result of json.loads).
+  """
+  ops = []
+  _Diff(old, new, path, ops)
+  return ops
+
+
+def _Same(old, new):
+  # Comparing is much faster than walking, and most of the state does not change. But == treats
+  # 1, 1.0, and True as equal, and they are different JSON values; marshal tells them apart.
+  return old == new and marshal.dumps(old, 2) == marshal.dumps(new, 2)
+
+
+def _Diff(old, new, path, ops):
+  if type(old) is type(new) and _Same(old, new):
+    return
+  if type(old) is not type(new):
+    ops.append({"op": "replace", "path": path, "value": new})
+  elif isinstance(old, dict):
+    for key, value in old.items():
+      if key not in new:
+        ops.append({"op": "remove", "path": path + "/" + Escape(key)})
+      else:
+        _Diff(value, new[key], path + "/" + Escape(key), ops)
+    for key, value in new.items():
+      if key not in old:
+        ops.append({"op": "add", "path": path + "/" + Escape(key), "value": value})
+  elif isinstance(old, list):
+    _DiffList(old, new, path, ops)
+  elif old != new:
+    ops.append({"op": "replace", "path": path, "value": new})
+
+
+def _DiffList(old, new, path, ops):
+  # Logs and queues tend to drop items off the front as new ones are appended. Detect this so
+  # that we don't end up replacing every single element of the list.
+  if old and new and old[0] != new[0]:
+    for shift in range(1, len(old)):
+      if old[shift] == new[0] and old[shift:] == new[: len(old) - shift]:
+        ops.extend({"op": "remove", "path": path + "/0"} for _ in range(shift))
+        old = old[shift:]
+        break
+  common = min(len(old), len(new))
+  for idx in range(common):
+    _Diff(old[idx], new[idx], f"{path}/{idx}", ops)
+  # Remove from the back so that the indexes of the remaining items do not change.
+  for idx in range(len(old) - 1, common - 1, -1):
+    ops.append({"op": "remove", "path": f"{path}/{idx}"})
+  for value in new[common:]:
+    ops.append({"op": "add", "path": path + "/-", "value": value})
+
+
+def Apply(doc, ops):
+  """Applies the operations generated by Diff to doc (in place), returning the new document."""
+  for op in ops:
+    if not op["path"]:
+      if op["op"] != "replace":
+        raise ValueError(f"Cannot {op['op']} the root document")
+      doc = op["value"]
+      continue
+    tokens = [Unescape(token) for token in op["path"].split("/")[1:]]
+    parent = doc
+    for token in tokens[:-1]:
+      parent = parent[int(token)] if isinstance(parent, list) else parent[token]
+    last = tokens[-1]
+    if isinstance(parent, list):
+      if op["op"] == "add":
+        parent.insert(len(parent) if last == "-" else int(last), op["value"])
+      elif op["op"] == "remove":
+        del parent[int(last)]
+      else:
+        parent[int(last)] = op["value"]
+    elif op["op"] == "remove":
+      del parent[last]
+    else:
+      parent[last] = op["value"]
+  return doc
+
+
+class Stream:
+  """Tracks the last state sent over a single websocket that uses the delta protocol."""
+
+  def __init__(self):
+    self.seq = 0
+    self.last = None
+    self.last_message = None  # The serialized version of last.
+    self.since_snapshot = 0
+
+  def snapshot(self, message, state):
+    """Returns a full snapshot message. message is the serialized version of state."""
+    self.seq += 1
+    self.last = state
+    self.last_message = message
+    self.since_snapshot = 0
+    return '{"type": "snapshot", "seq": %d, "state": %s}' % (self.seq, message)  # noqa: UP031
+
+  def encode(self, message, state, patches=None):
+    """Returns the message to send to move the client to the given state, or None if unchanged.
+
+    patches may be used to share encoded patches between streams that were sent the same states.
+    """
+    if self.last is None or self.since_snapshot >= SNAPSHOT_INTERVAL:
+      return self.snapshot(message, state)
+    key = (self.last_message, message)
+    if patches is not None and key in patches:
+      encoded = patches[key]
+    else:
+      ops = Diff(self.last, state)
+      encoded = json.dumps(ops) if ops else None
+      if patches is not None:
+        patches[key] = encoded
+    if encoded is None:
+      return None
+    if len(encoded) >= len(message):
+      return self.snapshot(message, state)
+    self.seq += 1
+    self.last = state
+    self.last_message = message
+    self.since_snapshot += 1
+    return '{"type": "patch", "seq": %d, "ops": %s}' % (self.seq, encoded)  # noqa: UP031
@@ -1,4 +1,5 @@
 import collections
+import functools
 import json
 import operator
 from random import SystemRandom
@@ -21,9 +22,12 @@ from eldritch import cards as assets
 from eldritch import allies
 from eldritch import abilities
 from eldritch import ancient_ones
+from eldritch import serialize
+import eventlog
 from game import (  # pylint: disable=unused-import
   BaseGame,
   CustomEncoder,
+  SpliceJson,
   InvalidInput,  # noqa: F401
   UnknownMove,
   InvalidMove,
@@ -57,6 +61,7 @@ class GameState:
       "monsters",
       "usables",
       "spendables",
+      "event_log",
     }
   )
   TURN_PHASES = ("upkeep", "movement", "encounter", "otherworld", "mythos")
@@ -128,7 +133,7 @@ class GameState:
     self.spendables = {}
     self.usables = {}
     self.done_using = {}
-    self.event_log = []
+    self.event_log = eventlog.Log()
     self.turn_number = -1
     self.turn_idx = 0
     self.first_player = 0
@@ -159,6 +164,21 @@ class GameState:
     self.test_mode = True
 
   def initialize(self):
+    self.create_content()
+    # Shuffle the decks.
+    for place in self.places.values():
+      if isinstance(place, places.Street):
+        random.shuffle(place.encounters)
+    random.shuffle(self.gates)
+    for deck in assets.Card.DECKS | {"gate_cards", "mythos"} - {"tradables", "specials"}:
+      random.shuffle(getattr(self, deck))
+    # Place initial clues.
+    for place in self.places.values():
+      if isinstance(place, places.Location) and place.is_unstable(self):
+        place.clues += 1
+
+  def create_content(self):
+    """Creates the places, cards, monsters, etc. for the chosen options, without shuffling them."""
     self.places = places.CreatePlaces()
     other_worlds = places.CreateOtherWorlds()
     self.places.update(other_worlds)
@@ -166,17 +186,14 @@ class GameState:
     encounter_cards = encounters.CreateEncounterCards(self.expansions("encounters"))
     self.gate_cards.extend(gate_encounters.CreateGateCards(self.expansions("encounters")))
     for neighborhood_name, cards in encounter_cards.items():
-      random.shuffle(cards)
       self.places[neighborhood_name].encounters.extend(cards)
     for location_name, fixed_encounters in facilities.items():
       self.places[location_name].fixed_encounters.extend(fixed_encounters)
 
-    gate_markers = gates.CreateGates()
-    random.shuffle(gate_markers)
-    self.gates.extend(gate_markers)
+    self.gates.extend(gates.CreateGates())
 
     self.monsters = monsters.CreateMonsters(self.expansions("monsters"))
-    if self.ancient_one.name != "The Thousand Masks":
+    if self.ancient_one is None or self.ancient_one.name != "The Thousand Masks":
       self.monsters = [mon for mon in self.monsters if not mon.has_attribute("mask", self, None)]
     for idx, monster in enumerate(self.monsters):
       monster.idx = idx
@@ -196,14 +213,6 @@ class GameState:
 
     self.mythos.extend(mythos.CreateMythos(self.expansions("mythos")))
 
-    # Shuffle the decks.
-    for deck in assets.Card.DECKS | {"gate_cards", "mythos"} - {"tradables", "specials"}:
-      random.shuffle(getattr(self, deck))
-    # Place initial clues.
-    for place in self.places.values():
-      if isinstance(place, places.Location) and place.is_unstable(self):
-        place.clues += 1
-
   def give_fixed_possessions(self, char, possessions):
     assert not possessions.keys() - assets.Card.DECKS, "bad deck(s) {', '.join(possessions.keys())}"
     for deck, names in possessions.items():
@@ -318,6 +327,12 @@ class GameState:
     return output
 
   def for_player(self, char_idx):
+    output = self.shared_json()
+    output.update(self.player_json(char_idx))
+    return output
+
+  def shared_json(self):
+    """The portion of the state that is identical for every player."""
     output = self.json_repr()
 
     # We only return the counts of these items, not the actual items.
@@ -532,6 +547,20 @@ class GameState:
       for name, value in top_event.pending.items():
         output["sliders"][name] = {"selection": value}
 
+    if top_event and isinstance(top_event, events.InitialSliders) and not top_event.is_done():
+      # Each player sees their own sliders; see player_json.
+      del output["chooser"]
+
+    output["autochoose"] = not bool(self.usables)
+    if len(self.event_stack) >= 3 and isinstance(self.event_stack[-3], events.Encounter):
+      if isinstance(top_event, events.CardChoice) and not self.usables:
+        output["autochoose"] = self.event_stack[-3].loc_name
+    return output
+
+  def player_json(self, char_idx):
+    """The portion of the state that differs between players; disjoint from shared_json()."""
+    output = {}
+    top_event = self.event_stack[-1] if self.event_stack else None
     if top_event and isinstance(top_event, events.InitialSliders) and not top_event.is_done():
       slider_char = self.characters[char_idx] if char_idx is not None else None
       if slider_char not in top_event.characters:
@@ -547,15 +576,32 @@ class GameState:
       output["spendables"] = list(self.spendables[char_idx].keys())
     if self.usables.get(char_idx):
       output["usables"] = list(self.usables[char_idx].keys())
-    output["autochoose"] = not bool(self.usables)
-    if len(self.event_stack) >= 3 and isinstance(self.event_stack[-3], events.Encounter):
-      if isinstance(top_event, events.CardChoice) and not self.usables:
-        output["autochoose"] = self.event_stack[-3].loc_name
     return output
 
   @classmethod
-  def parse_json(cls, json_str):
-    pass  # TODO
+  def create_fresh(cls, options, ancient_name):
+    """Creates a game with the given options and returns its content (see serialize.Collect)."""
+    state = cls()
+    state.options = {expansion: set(exp_options) for expansion, exp_options in options.items()}
+    state.all_characters = characters.CreateCharacters(state.expansions("characters"))
+    state.all_ancients = ancient_ones.AncientOnes(state.expansions("ancient_ones"))
+    state.ancient_one = state.all_ancients.get(ancient_name)
+    state.create_content()
+    char_specials = abilities.CreateAbilities(state.expansions("characters"))
+    return serialize.Collect(state, char_specials.values())
+
+  def save_repr(self):
+    """The full state of the game, in the form that parse_json loads."""
+    options = {expansion: sorted(exp_options) for expansion, exp_options in self.options.items()}
+    ancient_name = self.ancient_one.name if self.ancient_one is not None else None
+    pristine = PristineContent(json.dumps(options, sort_keys=True), ancient_name)
+    return {"options": options, "ancient_one": ancient_name, **serialize.Save(self, pristine)}
+
+  @classmethod
+  def parse_json(cls, data):
+    content, _ = cls.create_fresh(data["options"], data["ancient_one"])
+    serialize.Load(data, content)
+    return content["state"]
 
   def handle(self, char_idx, data):
     if self.game_stage in ["victory", "defeat"]:
@@ -1505,6 +1551,13 @@ class GameState:
     return events.InitialSliders(new_characters)
 
 
+@functools.lru_cache(maxsize=16)
+def PristineContent(options_str, ancient_name):
+  """The encoded content of a fresh game, which saved games only store the differences from."""
+  _, pristine = GameState.create_fresh(json.loads(options_str), ancient_name)
+  return pristine
+
+
 class EldritchGame(BaseGame):
   def __init__(self):
     self.game = GameState()
@@ -1512,6 +1565,12 @@ class EldritchGame(BaseGame):
     self.host = None
     self.player_sessions = {}
     self.pending_sessions = {}
+    # Entries are added to the log before their events finish, and may change until their events
+    # are popped off of the stack.
+    self.event_log_views = eventlog.Views(
+      lambda entry, audience: entry,
+      is_open=lambda entry: any(log is entry for log in self.game.log_stack),
+    )
 
   def game_url(self, game_id):
     return f"/eldritch/game.html?game_id={game_id}"
@@ -1520,14 +1579,21 @@ class EldritchGame(BaseGame):
     return self.game.game_status()
 
   @classmethod
-  def parse_json(cls, json_str):  # pylint: disable=arguments-renamed,unused-argument
-    return None  # TODO
+  def parse_json(cls, json_str):  # pylint: disable=arguments-renamed
+    gamedata = json.loads(json_str)
+    game = cls()
+    if not gamedata:
+      return game
+    game.player_sessions = gamedata.pop("player_sessions")
+    game.pending_sessions = gamedata.pop("pending_sessions")
+    game.game = GameState.parse_json(gamedata)
+    return game
 
   def json_str(self):
-    output = self.game.json_repr()
+    output = self.game.save_repr()
     output["player_sessions"] = self.player_sessions
     output["pending_sessions"] = self.pending_sessions
-    return json.dumps(output, cls=CustomEncoder)
+    return json.dumps(output)
 
   def for_player(self, session):
     output = self.game.for_player(self.player_sessions.get(session))
@@ -1540,6 +1606,26 @@ class EldritchGame(BaseGame):
     output["host"] = self.host == session
     return json.dumps(output, cls=CustomEncoder)
 
+  def for_players(self, sessions):
+    encoded = json.dumps(self.game.shared_json(), cls=CustomEncoder)
+    # Spectators (and multiple tabs for the same player) share a single overlay.
+    overlays = {}
+    output = {}
+    for session in sessions:
+      key = (self.player_sessions.get(session), self.pending_sessions.get(session))
+      key += (self.host == session,)
+      if key not in overlays:
+        overlay = self.game.player_json(key[0])
+        overlay.update({"player_idx": key[0], "pending_name": key[1], "host": key[2]})
+        overlays[key] = SpliceJson(encoded, overlay)
+      output[session] = overlays[key]
+    return output
+
+  def event_views(self, sessions):
+    # Every player sees the same log.
+    view = self.event_log_views.view(self.game.event_log, None)
+    return {session: view for session in sessions}
+
   def connect_user(self, session):
     self.connected.add(session)
     if self.host is None:
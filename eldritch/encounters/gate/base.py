@@ -1,3 +1,4 @@
+import functools
 import operator
 from eldritch import events
 from eldritch import items
@@ -34,22 +35,27 @@ def Pluto2(char) -> events.Event:
   return events.PassFail(char, check, events.Nothing(), events.LostInTimeAndSpace(char))
 
 
-def Other2(char) -> events.Event:
-  def return_and_close(name):
-    return events.Sequence(
-      [events.Return(char, char.place.info.name), events.CloseGate(char, name, True, True)], char
-    )
+def ReturnAndClose(char, name) -> events.Event:
+  return events.Sequence(
+    [events.Return(char, char.place.info.name), events.CloseGate(char, name, True, True)], char
+  )
+
+
+def NameAsList(name):
+  return [name] if name is not None else []
 
+
+def Other2(char) -> events.Event:
   check = events.Check(char, "speed", -2)
   place = values.EnteredGate(char)
   gate_exists = values.Calculation(place, None, bool)
-  place_as_list = values.Calculation(place, None, lambda name: [name] if name is not None else [])
+  place_as_list = values.Calculation(place, None, NameAsList)
   fail = events.Sequence(
     [events.CloseGate(char, place, False, False), events.LostInTimeAndSpace(char)], char
   )
   # TODO: this is a horrible hack where we use a ForEach to evaluate the place name before the
   # Return event is finished (which will erase the entered gate from the character).
-  foreach = events.ForEach(char, place_as_list, return_and_close)
+  foreach = events.ForEach(char, place_as_list, functools.partial(ReturnAndClose, char))
   results = {0: events.Return(char, char.place.info.name), 1: foreach}
   success = events.Conditional(char, gate_exists, None, results)
   return events.PassFail(char, check, success, fail)
@@ -932,6 +938,10 @@ def Other48(char) -> events.Event:
   return events.PassFail(char, events.Check(char, "lore", -2), knowledge, events.Nothing())
 
 
+def Shuffle(char) -> events.Event:  # pylint: disable=unused-argument
+  return events.Nothing()
+
+
 def CreateGateCards():
   return [
     GateCard("Gate1", {"blue"}, {"Abyss": Abyss1, "Great Hall": GreatHall1, "Other": Other1}),
@@ -1026,5 +1036,5 @@ def CreateGateCards():
     GateCard(
       "Gate48", {"yellow"}, {"Sunken City": SunkenCity48, "Pluto": Pluto48, "Other": Other48}
     ),
-    GateCard("ShuffleGate", set(), {"Other": lambda char: events.Nothing()}),
+    GateCard("ShuffleGate", set(), {"Other": Shuffle}),
   ]
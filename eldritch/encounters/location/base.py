@@ -1,3 +1,4 @@
+import functools
 import operator
 
 from eldritch import events
@@ -782,15 +783,16 @@ def Science6(char):
   return events.PassFail(char, check, success, events.Nothing())
 
 
-def Science7(char):
-  def roll_to_close(location_name):
-    roll = events.DiceRoll(char, 1)
-    close_gate = events.CloseGate(char, location_name, can_take=False, can_seal=False)
-    cond = events.Conditional(char, roll, "successes", {0: events.Nothing(), 1: close_gate})
-    return events.Sequence([roll, cond], char)
+def RollToClose(char, location_name):
+  roll = events.DiceRoll(char, 1)
+  close_gate = events.CloseGate(char, location_name, can_take=False, can_seal=False)
+  cond = events.Conditional(char, roll, "successes", {0: events.Nothing(), 1: close_gate})
+  return events.Sequence([roll, cond], char)
 
+
+def Science7(char):
   open_gates = values.OpenGates()
-  close_gates = events.ForEach(char, open_gates, roll_to_close)
+  close_gates = events.ForEach(char, open_gates, functools.partial(RollToClose, char))
   check = events.Check(char, "lore", -2)
   die = events.DiceRoll(char, 1, bad=list(range(1, 7)))
   stamina = events.Loss(char, {"stamina": values.Die(die)})
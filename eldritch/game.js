@@ -196,6 +196,7 @@ function continueInit() {
   ws = new WebSocket("ws://" + window.location.hostname + ":8081/" + gameId);
   ws.onmessage = onmsg;
   ws.onclose = lostConnection;
+  ws.onopen = function() { enablePatches(ws); };
   document.getElementById("board").cnvScale = 4;
   renderAssetToDiv(document.getElementById("board"), "board");
   let width = document.getElementById("boardcanvas").width;
@@ -492,10 +493,14 @@ function successfulRetry(socket) {
   ws = socket;
   ws.onmessage = onmsg;
   ws.onclose = lostConnection;
+  enablePatches(ws);
 }
 
 function onmsg(e) {
-  let data = JSON.parse(e.data);
+  let data = decodeMessage(ws, JSON.parse(e.data));
+  if (data == null) {
+    return;
+  }
   if (data.type == "error") {
     document.getElementById("errorText").innerText = formatServerString(data.message);
     document.getElementById("errorLink").innerText = "";
@@ -0,0 +1,352 @@
+"""Saving a GameState as JSON, and loading it again.
+
+Most of a game's state is its content: the cards, places, monsters, characters, and so on that the
+game creates when it starts. These are the same in every game with the same options, so instead of
+writing them out in full, each one is written as a reference to a stable key (a card's handle, a
+place's name, etc.), along with only the attributes that differ from a freshly created copy. To load
+a game, we create fresh content for its options and apply those attributes to it.
+
+Everything else (events, values, etc.) is written as a table of objects, so that objects referenced
+from several places (e.g. an event that is on both the event stack and the trigger stack) are still
+the same object once loaded. Functions and classes are written by name, so anything that holds a
+lambda or a nested function cannot be saved. Only the names in the registry below can be loaded:
+the classes and functions defined in the game's own modules, plus a few builtins. Anything else in
+a save is rejected, since a save may come from anyone who can send one to the server.
+"""
+
+import collections
+import functools
+import inspect
+import marshal
+import operator
+import types
+
+from eldritch import abilities
+from eldritch import allies
+from eldritch import ancient_ones
+from eldritch import cards
+from eldritch import characters
+from eldritch import events
+from eldritch import gates
+from eldritch import items
+from eldritch import location_specials
+from eldritch import monsters
+from eldritch import mythos
+from eldritch import places
+from eldritch import skills
+from eldritch import specials
+from eldritch import values
+from eldritch.encounters import gate as gate_encounter_cards
+from eldritch.encounters import location as encounter_cards
+from eldritch.encounters.gate import core as gate_encounters
+from eldritch.encounters.location import core as encounters
+from eldritch.items import deputy
+import eventlog
+
+_PRIMITIVES = frozenset({str, int, float, bool, type(None)})
+_FUNCTIONS = (types.FunctionType, types.BuiltinFunctionType, type)
+# Modules whose classes and functions may be saved and loaded by name.
+_MODULES = (
+  abilities.base,
+  abilities.clifftown,
+  abilities.seaside,
+  allies.base,
+  ancient_ones.base,
+  ancient_ones.core,
+  cards,
+  characters.base,
+  characters.clifftown,
+  characters.core,
+  characters.seaside,
+  deputy,
+  encounter_cards.base,
+  encounters,
+  events,
+  gate_encounter_cards.base,
+  gate_encounters,
+  gates,
+  items.common.base,
+  items.core,
+  items.spells.base,
+  items.unique.base,
+  location_specials,
+  monsters.base,
+  monsters.core,
+  mythos.base,
+  mythos.core,
+  places,
+  skills.base,
+  specials,
+  values,
+)
+# Objects without a __dict__ that may be saved as a call to their class. These are only ever
+# created with the name of a method to call, so that is the only argument they may be loaded with.
+_CONSTRUCTORS = (operator.methodcaller,)
+# Functions and classes from outside of those modules that may be saved and loaded by name.
+_EXTRAS = (
+  *(bool, int, float, str, list, dict, set, len, max, min, sum, abs),
+  *(operator.add, operator.sub, operator.mul, operator.floordiv, operator.neg, operator.not_),
+  *(operator.eq, operator.lt, operator.le, operator.gt, operator.ge),
+  eventlog.Log,
+  *_CONSTRUCTORS,
+)
+_CONTENT_KEYS = (
+  (cards.Asset, lambda obj: "asset/" + obj.handle),
+  (monsters.core.Monster, lambda obj: None if obj.idx is None else f"monster/{obj.idx}"),
+  (monsters.core.MonsterCup, lambda obj: "cup"),
+  (gates.Gate, lambda obj: "gate/" + obj.handle),
+  (places.Place, lambda obj: "place/" + obj.name),
+  (characters.core.BaseCharacter, lambda obj: "character/" + obj.name),
+  (ancient_ones.core.AncientOne, lambda obj: "ancient/" + obj.name),
+  (mythos.core.MythosCard, lambda obj: "mythos/" + obj.name),
+  (encounters.EncounterCard, lambda obj: "encounter/" + obj.name),
+  (gate_encounters.GateCard, lambda obj: "gatecard/" + obj.name),
+  (location_specials.FixedEncounter, lambda obj: "fixed/" + obj.name),
+)
+_key_funcs = {}  # type -> function returning the content key for objects of that type, or None
+
+
+def ContentKey(obj):
+  """Returns the key for a piece of content, or None if obj is not content."""
+  cls = type(obj)
+  if cls not in _key_funcs:
+    _key_funcs[cls] = next((func for base, func in _CONTENT_KEYS if issubclass(cls, base)), None)
+  func = _key_funcs[cls]
+  return func(obj) if func is not None else None
+
+
+def _FullName(value):
+  return f"{getattr(value, '__module__', None)}:{getattr(value, '__qualname__', None)}"
+
+
+def _Registry():
+  registry = {_FullName(value): value for value in _EXTRAS}
+  for module in _MODULES:
+    for value in vars(module).values():
+      if isinstance(value, (types.FunctionType, type)) and value.__module__ == module.__name__:
+        registry[_FullName(value)] = value
+  return registry
+
+
+_REGISTRY = _Registry()  # name -> the function or class that may be saved and loaded by that name
+
+
+def _Name(value):
+  name = _FullName(value)
+  if "<" in name:
+    raise TypeError(f"cannot save {name}; use a module-level function instead")
+  if _REGISTRY.get(name) is not value:
+    raise TypeError(f"cannot save {value!r}; it is not in the registry")
+  return name
+
+
+def _CheckCall(func, args):
+  if func not in _CONSTRUCTORS or len(args) != 1 or not isinstance(args[0], str):
+    raise ValueError(f"cannot save or load a call to {func!r} with {args!r}")
+  if args[0].startswith("_"):
+    raise ValueError(f"cannot save or load a call to private method {args[0]}")
+
+
+def _Lookup(name, kind=object):
+  if name not in _REGISTRY or not isinstance(_REGISTRY[name], kind):
+    raise ValueError(f"cannot load {name}")
+  return _REGISTRY[name]
+
+
+def _Order(encoded):
+  # Sets are written in a consistent order, so that saving the same set always gives the same JSON.
+  return marshal.dumps(encoded, 2)
+
+
+class _Encoder:
+  def __init__(self, pristine):
+    # key -> (type, {attribute: marshalled encoding}) for fresh content, or None when collecting it
+    self.pristine = pristine
+    self.content = {}  # key -> the encoded attributes that differ from fresh content
+    self.bound = {}  # key -> the object encoded with that key
+    self.ids = {}  # id(obj) -> index into objects
+    self.objects = []
+    self.queue = collections.deque()
+    self.generic = False  # Whether the last encoded value referenced any objects in the table.
+
+  def encode(self, value):  # noqa: C901, PLR0911, PLR0912
+    cls = type(value)
+    if cls in _PRIMITIVES:
+      return value
+    if cls is list:
+      return [self.encode(val) for val in value]
+    if cls is dict:
+      if all(isinstance(key, str) for key in value):
+        return {"d": {key: self.encode(val) for key, val in value.items()}}
+      return {"i": [[self.encode(key), self.encode(val)] for key, val in value.items()]}
+    if cls is collections.deque:
+      return {"q": [self.encode(val) for val in value]}
+    if cls is tuple:
+      return {"t": [self.encode(val) for val in value]}
+    if cls is set:
+      return {"s": sorted((self.encode(val) for val in value), key=_Order)}
+    if cls is frozenset:
+      return {"fs": sorted((self.encode(val) for val in value), key=_Order)}
+    if cls is collections.defaultdict:
+      pairs = [[self.encode(key), self.encode(val)] for key, val in value.items()]
+      return {"dd": [self.encode(value.default_factory), pairs]}
+    if isinstance(value, _FUNCTIONS):
+      return {"f": _Name(value)}
+    if cls is types.MethodType:
+      return {"m": [self.encode(value.__self__), value.__func__.__name__]}
+    if cls is functools.partial:
+      args = [self.encode(val) for val in value.args]
+      return {"p": [self.encode(value.func), args, self.encode(value.keywords)]}
+
+    key = ContentKey(value)
+    if key is not None and self.bind(key, value):
+      return {"$": key}
+    if isinstance(value, tuple):  # A namedtuple that is not content.
+      return {"nt": [_Name(cls), [self.encode(val) for val in value]]}
+    if not hasattr(value, "__dict__"):  # e.g. operator.methodcaller
+      func, args = value.__reduce__()[:2]
+      _CheckCall(func, args)
+      return {"r": [self.encode(func), [self.encode(val) for val in args]]}
+    self.generic = True
+    if id(value) not in self.ids:
+      self.ids[id(value)] = len(self.objects)
+      self.objects.append(None)
+      self.queue.append((len(self.objects) - 1, value))
+    return {"@": self.ids[id(value)]}
+
+  def bind(self, key, value):
+    """Reserves the key for this object. Returns False if it cannot be encoded as content."""
+    if key in self.bound:
+      return self.bound[key] is value
+    if self.pristine is not None and self.pristine.get(key, (None,))[0] is not type(value):
+      return False
+    self.bound[key] = value
+    self.queue.append((key, value))
+    return True
+
+  def encode_attributes(self, key, value):
+    attrs = vars(value) if hasattr(value, "__dict__") else {}
+    if self.pristine is None:
+      fresh = {}
+      for attr, val in attrs.items():
+        self.generic = False
+        encoded = marshal.dumps(self.encode(val), 2)
+        fresh[attr] = None if self.generic else encoded
+      self.content[key] = (type(value), fresh)
+      return
+    fresh = self.pristine[key][1]
+    changed = {}
+    for attr, val in attrs.items():
+      self.generic = False
+      encoded = self.encode(val)
+      if self.generic or fresh.get(attr) != marshal.dumps(encoded, 2):
+        changed[attr] = encoded
+    if changed:
+      self.content[key] = changed
+
+  def run(self):
+    while self.queue:
+      key, value = self.queue.popleft()
+      if isinstance(key, int):
+        self.objects[key] = [
+          _Name(type(value)),
+          {a: self.encode(v) for a, v in vars(value).items()},
+        ]
+      else:
+        self.encode_attributes(key, value)
+
+
+def Collect(state, extras=()):
+  """Finds all of the content in a fresh game, plus any extra content not yet in the game.
+
+  Returns (content, pristine): the content by key, and the encoding of each one's attributes.
+  """
+  encoder = _Encoder(None)
+  encoder.bind("state", state)
+  encoder.encode(list(extras))
+  encoder.run()
+  return encoder.bound, encoder.content
+
+
+def Save(state, pristine):
+  """Encodes a game, given the pristine content from Collect for a game with the same options."""
+  encoder = _Encoder(pristine)
+  encoder.bind("state", state)
+  encoder.run()
+  return {"content": encoder.content, "objects": encoder.objects}
+
+
+class _Decoder:
+  def __init__(self, content, objects):
+    self.content = content
+    self.objects = []
+    for name, _ in objects:
+      cls = _Lookup(name, type)
+      self.objects.append(cls.__new__(cls))
+
+  def decode(self, value):  # noqa: C901, PLR0911
+    cls = type(value)
+    if cls is list:
+      return [self.decode(val) for val in value]
+    if cls is not dict:
+      return value
+    ((kind, data),) = value.items()
+    if kind == "$":
+      return self.content[data]
+    if kind == "@":
+      return self.objects[data]
+    if kind == "d":
+      return {key: self.decode(val) for key, val in data.items()}
+    if kind == "i":
+      return {self.decode(key): self.decode(val) for key, val in data}
+    if kind == "q":
+      return collections.deque(self.decode(val) for val in data)
+    if kind == "t":
+      return tuple(self.decode(val) for val in data)
+    if kind == "s":
+      return {self.decode(val) for val in data}
+    if kind == "fs":
+      return frozenset(self.decode(val) for val in data)
+    if kind == "dd":
+      pairs = ((self.decode(key), self.decode(val)) for key, val in data[1])
+      return collections.defaultdict(self.decode(data[0]), pairs)
+    if kind == "f":
+      return _Lookup(data)
+    if kind == "m":
+      return self.decode_method(*data)
+    if kind == "p":
+      return functools.partial(self.decode(data[0]), *self.decode(data[1]), **self.decode(data[2]))
+    if kind == "nt":
+      cls = _Lookup(data[0], type)
+      if not issubclass(cls, tuple):
+        raise ValueError(f"cannot load {data[0]} as a namedtuple")
+      return cls(*self.decode(data[1]))
+    if kind == "r":
+      return self.decode_call(*data)
+    raise ValueError(f"Unknown encoding {kind}")
+
+  def decode_method(self, obj, name):
+    obj = self.decode(obj)
+    cls = type(obj)
+    method = inspect.getattr_static(cls, name, None)
+    if _REGISTRY.get(_FullName(cls)) is not cls or not isinstance(method, types.FunctionType):
+      raise ValueError(f"cannot load method {name} of {_FullName(cls)}")
+    if name.startswith("_"):
+      raise ValueError(f"cannot load private method {name}")
+    return getattr(obj, name)
+
+  def decode_call(self, func, args):
+    func = self.decode(func)
+    args = self.decode(args)
+    _CheckCall(func, args)
+    return func(*args)
+
+
+def Load(data, content):
+  """Applies saved data to fresh content, which maps keys to objects (see Collect)."""
+  decoder = _Decoder(content, data["objects"])
+  for obj, (_, attrs) in zip(decoder.objects, data["objects"]):
+    obj.__dict__.update({attr: decoder.decode(val) for attr, val in attrs.items()})
+  for key, attrs in data["content"].items():
+    obj = content[key]
+    obj.__dict__.update({attr: decoder.decode(val) for attr, val in attrs.items()})
@@ -1204,6 +1204,33 @@ class WinGameTest(NextTurnBase):
       pass
     self.assertEqual(self.state.game_stage, "victory")
 
+  def testEventLogViewWithEntriesInProgress(self):
+    eldritch_game = eldritch.EldritchGame()
+    eldritch_game.game = self.state
+    self.state.game_stage = "awakened"
+    self.state.ancient_one.health = 5
+    self.state.turn_phase = "attack"
+    self.state.event_stack.append(events.InvestigatorAttack(self.state.characters[0]))
+
+    def resolve():
+      for _ in self.state.resolve_loop():
+        pass
+      view = eldritch_game.event_views([None])[None]
+      expected = json.dumps(list(self.state.event_log), cls=game.CustomEncoder)
+      self.assertEqual(json.loads(view.json()), json.loads(expected))
+
+    resolve()
+    # Entries such as victory are added straight to the log while the attack is still in progress.
+    self.state.event_log.append(events.EventLog("Something happened.", False))
+    resolve()
+    self.state.event_stack[-1].resolve(self.state, "done")
+    resolve()
+    with mock.patch.object(events.random, "randint", new=mock.MagicMock(return_value=5)):
+      self.state.event_stack[-1].resolve(self.state)
+    resolve()
+    self.state.event_stack[-1].resolve(self.state, "Pass")
+    resolve()
+
 
 class LoseGameTest(NextTurnBase):
   def testInstantDefeatFromAwakening(self):
@@ -2038,6 +2065,22 @@ class PlayerJoinTest(PlayerTest):
     self.assertEqual(json.loads(data)["player_idx"], 0)
     self.assertIsNone(json.loads(data)["pending_name"])
 
+  def testForPlayersMatchesForPlayer(self):
+    sessions = ["A", "B", "C", "D"]
+    for session in sessions:
+      self.game.connect_user(session)
+    self.handle("A", {"type": "join", "char": "Nun"})
+    self.handle("B", {"type": "join", "char": "Student"})
+    self.handle("A", {"type": "start"})
+    # Both players are setting their initial sliders; each should see their own.
+    output = self.game.for_players(sessions)
+    for session in sessions:
+      with self.subTest(session=session):
+        self.assertDictEqual(json.loads(output[session]), json.loads(self.game.for_player(session)))
+    self.assertEqual(json.loads(output["A"])["chooser"], 0)
+    self.assertEqual(json.loads(output["B"])["chooser"], 1)
+    self.assertEqual(output["C"], output["D"])
+
   def testCannotStartWithoutPlayers(self):
     self.game.connect_user("A")
     with self.assertRaisesRegex(game.InvalidMove, "At least one player"):
@@ -2260,5 +2303,100 @@ class DevouredPlayerJoinTest(PlayerTest):
     self.game.handle("A", {"type": "choice", "choice": "NoMythos"})
 
 
+class SaveGameTest(PlayerTest):
+  def setUp(self):
+    super().setUp()
+    self.game.game.ancient_one = None
+    self.game.connect_user("A")
+    self.game.connect_user("B")
+    self.handle("A", {"type": "ancient", "ancient": "Wendigo"})
+    self.handle("A", {"type": "join", "char": "Nun"})
+    self.handle("B", {"type": "join", "char": "Student"})
+
+  def reload(self):
+    self.game = eldritch.EldritchGame.parse_json(self.game.json_str())
+    self.game.connect_user("A")
+    self.game.connect_user("B")
+
+  def testUnstartedGame(self):
+    self.reload()
+    self.assertEqual(self.game.pending_sessions, {"A": "Nun", "B": "Student"})
+    self.assertEqual(self.game.game.pending_chars, {"Nun": None, "Student": None})
+    self.assertEqual(self.game.game.ancient_one.name, "Wendigo")
+    self.handle("A", {"type": "start"})
+    self.assertEqual(self.game.player_sessions, {"A": 0, "B": 1})
+
+  def testSameStateAfterLoad(self):
+    self.handle("A", {"type": "start"})
+    expected = {session: json.loads(self.game.for_player(session)) for session in "AB"}
+    saved = self.game.json_str()
+    self.reload()
+    self.assertEqual(json.loads(self.game.json_str()), json.loads(saved))
+    for session in "AB":
+      with self.subTest(session=session):
+        self.assertDictEqual(json.loads(self.game.for_player(session)), expected[session])
+
+  def testEventLogIsKept(self):
+    self.handle("A", {"type": "start"})
+    self.assertTrue(self.game.game.event_log)
+    expected = self.game.event_views(["A"])["A"].json()
+    self.reload()
+    self.assertEqual(self.game.event_views(["A"])["A"].json(), expected)
+
+  def testReferencesAreKept(self):
+    self.handle("A", {"type": "start"})
+    self.reload()
+    state = self.game.game
+    nun = state.characters[0]
+    self.assertIs(nun, state.all_characters["Nun"])
+    self.assertIs(nun.place, state.places["Church"])
+    self.assertIs(state.monsters[0].place, state.monster_cup)
+    # The initial sliders are both on top of the stack, and part of the sequence under them.
+    sequence, sliders = state.event_stack
+    self.assertIs(sequence.events[0], sliders)
+    self.assertIs(sliders.characters[0], nun)
+
+  def testOnlyChangedContentIsSaved(self):
+    self.handle("A", {"type": "start"})
+    saved = json.loads(self.game.json_str())
+    self.assertIn("character/Nun", saved["content"])
+    self.assertNotIn("character/Doctor", saved["content"])
+    self.assertNotIn("monster/0", saved["content"])
+
+  def testContinuePlaying(self):
+    self.handle("A", {"type": "start"})
+    self.reload()
+    self.handle("A", {"type": "set_slider", "name": "done"})
+    self.handle("B", {"type": "set_slider", "name": "done"})
+    self.assertEqual(self.game.game.turn_number, 0)
+    self.assertEqual(self.game.game.turn_phase, "upkeep")
+    self.assertIsInstance(self.game.game.event_stack[-1], events.SliderInput)
+
+  def testCannotLoadOtherModules(self):
+    self.handle("A", {"type": "start"})
+    saved = json.loads(self.game.json_str())
+    saved["objects"].append(["os:system", {}])
+    with self.assertRaisesRegex(ValueError, "cannot load os:system"):
+      eldritch.EldritchGame.parse_json(json.dumps(saved))
+
+  def testCannotCallUnregisteredFunctions(self):
+    self.handle("A", {"type": "start"})
+    import_os = {"r": [{"f": "eldritch.serialize:importlib.import_module"}, ["os"]]}
+    payloads = {
+      "import": {"r": [{"m": [import_os, "getpid"]}, []]},
+      "walk": {"f": "eldritch.events:functools.partial"},
+      "call": {"r": [{"f": "eldritch.events:CancelEvent"}, ["x"]]},
+      "namedtuple": {"nt": ["builtins:dict", []]},
+      "method": {"m": [{"$": "character/Nun"}, "__init__"]},
+      "methodcaller": {"r": [{"f": "operator:methodcaller"}, ["__reduce__"]]},
+    }
+    for name, payload in payloads.items():
+      with self.subTest(payload=name):
+        saved = json.loads(self.game.json_str())
+        saved["content"]["state"]["test"] = payload
+        with self.assertRaisesRegex(ValueError, "cannot"):
+          eldritch.EldritchGame.parse_json(json.dumps(saved))
+
+
 if __name__ == "__main__":
   unittest.main()
@@ -0,0 +1,168 @@
+"""An append-only log of game events, and the views of it that are sent to each player.
+
+A game's Log keeps every entry once, in whatever form the game created it, and numbers the entries
+in the order that they were added. Players may see different versions of the same entry (e.g. only
+the players in a trade see what was traded), so each audience gets a View: the entries rendered for
+that audience and encoded as JSON once each. A view is extended as entries are added instead of
+being rebuilt on every update.
+
+Websockets that opt in (see game.GameHandler) get the log separately from the game state, and are
+only sent the entries that they do not have yet:
+  {"type": "events", "first": <the oldest entry still in the log>, "seq": <the first entry sent>,
+   "entries": [...]}
+The client replaces its entries from seq onwards with the given entries, and forgets any entries
+before first. Other websockets get the whole log as the "event_log" of every state.
+
+Client side: /patch.js.
+"""
+
+import collections
+import json
+
+from game import CustomEncoder
+
+
+class Log:
+  """The entries of an event log, oldest first.
+
+  If maxlen is given, only the newest maxlen entries are kept.
+  """
+
+  def __init__(self, maxlen=None):
+    self.entries = collections.deque(maxlen=maxlen)
+    self.first_seq = 0  # The sequence number of entries[0]. Numbers are never reused.
+
+  @property
+  def next_seq(self):
+    """The sequence number that the next entry will get."""
+    return self.first_seq + len(self.entries)
+
+  def append(self, entry):
+    if len(self.entries) == self.entries.maxlen:
+      self.first_seq += 1
+    self.entries.append(entry)
+
+  def clear(self):
+    self.first_seq = self.next_seq
+    self.entries.clear()
+
+  def copy(self):
+    log = Log(self.entries.maxlen)
+    log.entries.extend(self.entries)
+    log.first_seq = self.first_seq
+    return log
+
+  def __len__(self):
+    return len(self.entries)
+
+  def __iter__(self):
+    return iter(self.entries)
+
+  def __getitem__(self, idx):
+    return self.entries[idx]
+
+
+class View:
+  """One audience's rendering of a log, as a JSON string per entry.
+
+  Every change to the view gets a new revision number. When an entry changes, every entry after it
+  gets the new revision too, so the entries that changed since a given revision are always the last
+  few. Only open entries can change, and those are usually the newest ones.
+  """
+
+  def __init__(self, log, render, is_open):
+    self.log = log
+    self.render = render
+    self.is_open = is_open
+    self.first_seq = log.first_seq
+    self.encoded = collections.deque()
+    self.revisions = collections.deque()
+    self.revision = 0
+    self.open = []  # The sequence numbers of entries that were open at the last refresh.
+
+  def refresh(self):
+    """Catches up with any entries added to the log since the last refresh."""
+    log = self.log
+    drop = min(log.first_seq - self.first_seq, len(self.encoded))
+    for _ in range(drop):
+      self.encoded.popleft()
+      self.revisions.popleft()
+    self.first_seq = max(self.first_seq, log.first_seq)
+    next_seq = self.first_seq + len(self.encoded)
+    # Render open entries again, including ones that closed since the last refresh.
+    was_open, self.open = self.open, []
+    changed = len(self.encoded)
+    for seq in was_open:
+      if seq < self.first_seq:
+        continue
+      entry = log[seq - log.first_seq]
+      encoded = self.encode(entry)
+      if encoded != self.encoded[seq - self.first_seq]:
+        self.encoded[seq - self.first_seq] = encoded
+        changed = min(changed, seq - self.first_seq)
+      if self.is_open(entry):
+        self.open.append(seq)
+    if changed < len(self.encoded):
+      self.revision += 1
+      for idx in range(changed, len(self.encoded)):
+        self.revisions[idx] = self.revision
+    for idx in range(next_seq - log.first_seq, len(log)):
+      self.revision += 1
+      self.encoded.append(self.encode(log[idx]))
+      self.revisions.append(self.revision)
+      if self.is_open(log[idx]):
+        self.open.append(log.first_seq + idx)
+
+  def encode(self, entry):
+    return json.dumps(self.render(entry), cls=CustomEncoder)
+
+  def json(self):
+    """Returns every entry in the view as an encoded JSON list."""
+    return "[" + ", ".join(self.encoded) + "]"
+
+  def splice(self, message):
+    """Adds the whole view to an encoded state as its event_log."""
+    return message[:-1] + ', "event_log": ' + self.json() + "}"
+
+  def since(self, revision):
+    """Returns an events message with every entry that changed after the given revision.
+
+    If revision is None, the message has every entry. Returns None if nothing has changed.
+    """
+    start = len(self.encoded)
+    if revision is None:
+      start = 0
+    else:
+      while start and self.revisions[start - 1] > revision:
+        start -= 1
+      if start == len(self.encoded):
+        return None
+    entries = ", ".join(self.encoded[idx] for idx in range(start, len(self.encoded)))
+    return '{"type": "events", "first": %d, "seq": %d, "entries": [%s]}' % (  # noqa: UP031
+      self.first_seq,
+      self.first_seq + start,
+      entries,
+    )
+
+
+class Views:
+  """The views of a game's log, one per audience.
+
+  render(entry, audience) returns the JSON-serializable form of an entry for an audience. If given,
+  is_open(entry) says whether an entry may still change after it is added. Open entries are rendered
+  again on every refresh until they are closed, and once more after that.
+  """
+
+  def __init__(self, render, *, is_open=None):
+    self.render = render
+    self.is_open = is_open or (lambda entry: False)
+    self.views = {}
+
+  def view(self, log, audience):
+    """Returns the audience's view of the log, up to date with the log's newest entries."""
+    view = self.views.get(audience)
+    if view is None or view.log is not log:
+      view = View(log, lambda entry: self.render(entry, audience), self.is_open)
+      self.views[audience] = view
+    view.refresh()
+    return view
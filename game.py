@@ -6,8 +6,11 @@ import enum
 from http import HTTPStatus
 import json
 import sys
+import time
 import traceback
 
+import delta
+
 
 class GameException(Exception):  # noqa: N818
   pass
@@ -61,6 +64,20 @@ class CustomEncoder(json.JSONEncoder):
     return json.JSONEncoder.default(self, o)
 
 
+def SpliceJson(shared, overlay):
+  """Merges an overlay dict into an already-encoded JSON object.
+
+  The shared string is encoded once per update and reused for every player; only the (small)
+  overlay is encoded per player. Keys in the overlay must not also appear in the shared object.
+  """
+  if not overlay:
+    return shared
+  encoded = json.dumps(overlay, cls=CustomEncoder)
+  if shared == "{}":
+    return encoded
+  return shared[:-1] + ", " + encoded[1:]
+
+
 class BaseGame(metaclass=abc.ABCMeta):
   @abc.abstractmethod
   def game_url(self, game_id):
@@ -85,6 +102,21 @@ class BaseGame(metaclass=abc.ABCMeta):
   def for_player(self, session):
     pass
 
+  def for_players(self, sessions):
+    """Returns a map of session to the serialized state for each of the given sessions.
+
+    Games may override this to compute the public portion of their state once per update.
+    """
+    return {session: self.for_player(session) for session in sessions}
+
+  def event_views(self, sessions):  # pylint: disable=unused-argument
+    """Returns a map of session to the eventlog.View of the game's event log for that session.
+
+    Games that have an event log leave it out of their states and override this instead, so that
+    the log can be sent separately to clients that support it. Sessions may be left out.
+    """
+    return {}
+
   @abc.abstractmethod
   def handle(self, session, data):
     pass
@@ -95,12 +127,136 @@ class BaseGame(metaclass=abc.ABCMeta):
     return None
 
 
+class Outbox:
+  """Sends messages to a single websocket so that one slow client cannot hold up the others.
+
+  Each state message is a complete game state, so when the websocket falls more than max_backlog
+  states behind, the oldest queued states are dropped; the client still ends at the latest state.
+  Other messages (errors, snapshots, event log entries) are never dropped.
+  """
+
+  def __init__(self, websocket, max_backlog):
+    self.websocket = websocket
+    self.max_backlog = max_backlog
+    self.stream = None  # delta.Stream, if the websocket opted in to patches
+    self.events = False  # Whether the websocket opted in to getting the event log separately.
+    self.event_view = None  # The eventlog.View that this websocket was last sent entries from,
+    self.event_revision = None  # and the revision of the view that it was sent.
+    self.queue = collections.deque()
+    self.task = None
+    self.dropped = 0
+
+  def put(self, kind, message, state=None, patches=None):
+    """Queues a message of kind "state", "snapshot", or "raw". state is the parsed message.
+
+    patches is shared by the outboxes that a state was pushed to; see delta.Stream.encode.
+    """
+    self.queue.append((kind, message, state, patches))
+    if kind == "state":
+      states = [item for item in self.queue if item[0] == "state"]
+      for item in states[: max(len(states) - self.max_backlog, 0)]:
+        self.queue.remove(item)
+        self.dropped += 1
+    if self.task is None or self.task.done():
+      self.task = asyncio.create_task(self.drain())
+
+  async def drain(self):
+    while self.queue:
+      kind, message, state, patches = self.queue.popleft()
+      if self.stream is not None and kind != "raw":
+        if state is None:
+          state = json.loads(message)
+        if kind == "snapshot":
+          message = self.stream.snapshot(message, state)
+        else:
+          message = self.stream.encode(message, state, patches)
+        if message is None:
+          continue
+      try:
+        await self.websocket.send(message)
+      except Exception:  # pylint: disable=broad-except # noqa: BLE001
+        # The connection is going away; the game loop will notice and disconnect the user.
+        self.queue.clear()
+
+  def put_events(self, view):
+    """Queues the entries of an eventlog.View that have changed since they were last sent."""
+    revision = self.event_revision if view is self.event_view else None
+    message = view.since(revision)
+    self.event_view = view
+    self.event_revision = view.revision
+    if message is not None:
+      self.put("raw", message)
+
+  def close(self):
+    self.queue.clear()
+    if self.task is not None:
+      self.task.cancel()
+
+
+_DONE = object()  # Marks the end of the states yielded by a move.
+
+
+class MoveStats:
+  """Counts how many moves are waiting for a game and how long moves take to handle."""
+
+  def __init__(self):
+    self.depth = 0  # Moves received but not yet finished, including the one being handled.
+    self.max_depth = 0
+    self.moves = 0
+    self.total_seconds = 0
+    self.max_seconds = 0
+
+  def start(self):
+    self.depth += 1
+    self.max_depth = max(self.max_depth, self.depth)
+    return time.perf_counter()
+
+  def finish(self, start):
+    elapsed = time.perf_counter() - start
+    self.depth -= 1
+    self.moves += 1
+    self.total_seconds += elapsed
+    self.max_seconds = max(self.max_seconds, elapsed)
+
+  def json_repr(self):
+    return {
+      "depth": self.depth,
+      "max_depth": self.max_depth,
+      "moves": self.moves,
+      "mean_seconds": self.total_seconds / self.moves if self.moves else 0,
+      "max_seconds": self.max_seconds,
+    }
+
+
 class GameHandler:
-  def __init__(self, game_id, game_class):
+  FRAME_INTERVAL = 0  # Minimum seconds between intermediate states; 0 sends every yielded state.
+  MAX_BACKLOG = 8  # States queued for a slow websocket before superseded ones are dropped.
+
+  def __init__(
+    self,
+    game_id,
+    game_class,
+    frame_interval=None,
+    max_backlog=None,
+    *,
+    executor=None,
+    lobby=None,
+    journal=None,
+  ):
     self.game_id = game_id
     self.game = game_class()
     self.game_class = game_class
     self.websockets = collections.defaultdict(set)
+    self.outboxes = {}
+    self.frame_interval = self.FRAME_INTERVAL if frame_interval is None else frame_interval
+    self.max_backlog = self.MAX_BACKLOG if max_backlog is None else max_backlog
+    # When there is an executor, game logic runs there instead of on the event loop. The lock
+    # makes moves (and anything else that touches self.game) run one at a time, in order.
+    self.executor = executor
+    self.lock = asyncio.Lock()
+    self.stats = MoveStats()
+    self.lobby = lobby  # lobby.Lobby to tell about status changes
+    self.journal = journal  # persist.Journal to save the game's state to after each move
 
   def game_url(self):
     return self.game.game_url(self.game_id)
@@ -109,21 +265,31 @@ class GameHandler:
     return self.game.game_status()
 
   def get_urls(self):
-    return {"/dump", "/save", "/json"}
+    return {"/dump", "/save", "/json", "/stats"}
 
   def post_urls(self):
     return {"/load"}
 
-  def handle_get(self, event_loop, http_handler, path, args):  # pylint: disable=unused-argument
-    if path not in ["/dump", "/save", "/json"]:
+  async def run(self, func, *args):
+    """Calls func(*args) on the executor, or directly if this game does not use one."""
+    if self.executor is None:
+      return func(*args)
+    return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+
+  async def handle_get(self, http_handler, path, args):  # pylint: disable=unused-argument
+    if path not in ["/dump", "/save", "/json", "/stats"]:
       http_handler.send_error(HTTPStatus.NOT_FOUND.value, f"Unknown path {path}")
       return
-    value = self.game.json_str().encode("ascii")
+    if path == "/stats":
+      value = json.dumps(self.stats, cls=CustomEncoder).encode("ascii")
+    else:
+      async with self.lock:
+        value = (await self.run(self.game.json_str)).encode("ascii")
     http_handler.send_response(HTTPStatus.OK.value)
     http_handler.end_headers()
     http_handler.wfile.write(value)
 
-  def handle_post(self, event_loop, http_handler, path, args, data):  # pylint: disable=unused-argument
+  async def handle_post(self, http_handler, path, args, data):  # pylint: disable=unused-argument
     if path not in ["/load"]:
       http_handler.send_error(HTTPStatus.NOT_FOUND.value, f"Unknown path {path}")
       return
@@ -135,30 +301,35 @@ class GameHandler:
       traceback.print_tb(sys.exc_info()[2])
       http_handler.send_error(HTTPStatus.BAD_REQUEST.value, str(err))
       return
-    self.game = new_game
-    for session in self.websockets:
-      self.game.connect_user(session)
-    http_handler.send_response(HTTPStatus.NO_CONTENT.value)
-    http_handler.end_headers()
-    fut = asyncio.run_coroutine_threadsafe(self.push(), event_loop)
-    fut.result(10)
+    async with self.lock:
+      self.game = new_game
+      for session in self.websockets:
+        self.game.connect_user(session)
+      http_handler.send_response(HTTPStatus.NO_CONTENT.value)
+      http_handler.end_headers()
+      await self.save(None, {"type": "load"})
+      await self.push()
 
   async def connect_user(self, session, websocket):
-    is_new_user = not self.websockets[session]
-    self.websockets[session].add(websocket)
-    if is_new_user:
-      print(f"added {session} to the game {self.game_id}")
-      self.game.connect_user(session)
-    # Need to push, since the new connection needs data too.
-    await self.push()
+    async with self.lock:
+      is_new_user = not self.websockets[session]
+      self.websockets[session].add(websocket)
+      self.outboxes[websocket] = Outbox(websocket, self.max_backlog)
+      if is_new_user:
+        print(f"added {session} to the game {self.game_id}")
+        await self.run(self.game.connect_user, session)
+      # Need to push, since the new connection needs data too.
+      await self.push()
 
   async def disconnect_user(self, session, websocket):
-    self.websockets[session].remove(websocket)
-    if not self.websockets[session]:
-      print(f"{session} has left game {self.game_id}")
-      del self.websockets[session]
-      self.game.disconnect_user(session)
-      await self.push()
+    async with self.lock:
+      self.websockets[session].remove(websocket)
+      self.outboxes.pop(websocket).close()
+      if not self.websockets[session]:
+        print(f"{session} has left game {self.game_id}")
+        del self.websockets[session]
+        await self.run(self.game.disconnect_user, session)
+        await self.push()
 
   async def handle(self, websocket, session, raw_data):
     try:
@@ -166,13 +337,37 @@ class GameHandler:
     except Exception as err:  # pylint: disable=broad-except # noqa: BLE001
       await self.push_error(websocket, str(err))
       return
+    if isinstance(data, dict) and data.get("type") in ("protocol", "resync"):
+      async with self.lock:
+        await self.handle_protocol(websocket, session, data)
+      return
+    start = self.stats.start()
+    try:
+      async with self.lock:
+        await self.handle_move(websocket, session, data)
+    finally:
+      self.stats.finish(start)
+
+  async def handle_move(self, websocket, session, data):
     pushed = False
     try:
-      result = self.game.handle(session, data)
+      result = await self.run(self.game.handle, session, data)
       if isinstance(result, collections.abc.Iterable):
         # TODO: investigate what happens when one of these websockets disconnects or throws an
         # error in the middle of handling this input.
-        for _ in result:
+        last_push = None
+        stale = False
+        steps = iter(result)
+        while await self.run(next, steps, _DONE) is not _DONE:
+          now = time.monotonic()
+          if last_push is not None and now - last_push < self.frame_interval:
+            # Coalesce this state into the next one.
+            stale = True
+            continue
+          last_push = now
+          stale = False
+          await self.push()
+        if stale:
           await self.push()
         # Avoid pushing the last state twice.
         pushed = True
@@ -192,15 +387,69 @@ class GameHandler:
       await self.push_error(
         websocket, f"unexpected error of type {sys.exc_info()[0]}: {sys.exc_info()[1]}"
       )
+    await self.save(session, data)
     if not pushed:
       await self.push()
 
+  async def save(self, session, move):
+    if self.journal is None:
+      return
+    try:
+      await self.run(self.journal.record, self.game, session, move)
+    except Exception:  # pylint: disable=broad-except # noqa: BLE001
+      # Keep playing; the game will be saved again after the next move.
+      print(sys.exc_info()[0])
+      print(sys.exc_info()[1])
+      traceback.print_tb(sys.exc_info()[2])
+
+  async def handle_protocol(self, websocket, session, data):
+    outbox = self.outboxes[websocket]
+    if data["type"] == "protocol":
+      outbox.stream = delta.Stream() if data.get("patches") else None
+      outbox.events = bool(data.get("events"))
+    # The snapshot comes with the whole event log.
+    outbox.event_view = None
+    message = await self.run(self.game.for_player, session)
+    views = await self.run(self.game.event_views, [session])
+    outbox.put("snapshot", self.add_events(outbox, message, views.get(session)))
+    await asyncio.sleep(0)
+
   async def push(self):
-    callbacks = []
+    sessions = list(self.websockets.keys())
+    messages = await self.run(self.game.for_players, sessions)
+    views = await self.run(self.game.event_views, sessions)
+    states = {}
+    patches = {}  # Patched websockets that were sent the same state get the same patch.
     for session, ws_list in self.websockets.items():
-      data = self.game.for_player(session)
-      callbacks.extend([websocket.send(data) for websocket in ws_list])
-    await asyncio.gather(*callbacks)
+      for websocket in ws_list:
+        outbox = self.outboxes[websocket]
+        message = self.add_events(outbox, messages[session], views.get(session))
+        if outbox.stream is not None and message not in states:
+          states[message] = json.loads(message)
+        outbox.put("state", message, states.get(message), patches)
+    if self.lobby is not None:
+      self.lobby.set_status(self.game_id, self.game_status())
+    # Let the outboxes start sending before we compute the next state.
+    await asyncio.sleep(0)
+
+  def add_events(self, outbox, message, view):
+    """Sends the event log along with a state, and returns the state to send.
+
+    The log is sent separately to websockets that opted in to that, and as part of the state to the
+    others.
+    """
+    if view is None:
+      return message
+    if outbox.events:
+      outbox.put_events(view)
+      return message
+    return view.splice(message)
 
   async def push_error(self, websocket, err):
-    await websocket.send(json.dumps({"type": "error", "message": err}))
+    self.outboxes[websocket].put("raw", json.dumps({"type": "error", "message": err}))
+    await asyncio.sleep(0)
+
+  async def flush(self):
+    """Waits until every queued message has been sent."""
+    tasks = [outbox.task for outbox in self.outboxes.values() if outbox.task]
+    await asyncio.gather(*[task for task in tasks if not task.done()])
@@ -0,0 +1,148 @@
+"""A small HTTP/1.1 server that runs on the asyncio event loop.
+
+RequestHandler provides the parts of http.server.BaseHTTPRequestHandler that our handlers use
+(path, headers, send_response, send_header, end_headers, send_error, wfile), except that the do_*
+methods are coroutines. The response is buffered and written out once the do_* method returns, so
+connections can be kept alive without handlers having to compute a Content-Length. Large files can
+be sent with sendfile instead by assigning an open file to file_body.
+"""
+
+import asyncio
+import email.utils
+import html
+from http import HTTPStatus
+import http.client
+import io
+import os
+import sys
+import traceback
+
+
+class RequestHandler:
+  server_version = "lunboks"
+  max_body_size = 16 * 1024 * 1024  # Saved games are posted to /load, so leave plenty of room.
+  idle_timeout = 60  # Seconds to keep an idle connection open, waiting for the next request.
+
+  def __init__(self, reader, writer):
+    self.reader = reader
+    self.writer = writer
+    self.command = None
+    self.path = None
+    self.request_version = None
+    self.headers = None
+    self.body = b""
+    self.close_connection = True
+    self.status = None
+    self.response_headers = []
+    self.wfile = io.BytesIO()
+    self.file_body = None
+
+  @classmethod
+  async def serve_connection(cls, reader, writer):
+    """Callback for asyncio.start_server; handles requests until the connection is closed."""
+    try:
+      while await cls(reader, writer).handle_one_request():
+        pass
+    except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+      pass
+    except asyncio.CancelledError:
+      pass  # The server is shutting down; just close the connection.
+    finally:
+      writer.close()
+
+  async def handle_one_request(self):
+    """Reads, handles, and responds to one request. Returns whether to keep reading requests."""
+    try:
+      head = await asyncio.wait_for(self.reader.readuntil(b"\r\n\r\n"), self.idle_timeout)
+    except (asyncio.IncompleteReadError, TimeoutError):
+      return False  # The client closed the connection or went quiet between requests.
+    request_line, _, rest = head.partition(b"\r\n")
+    words = request_line.decode("iso-8859-1").split()
+    if len(words) != 3 or not words[2].startswith("HTTP/"):
+      return await self.reject(HTTPStatus.BAD_REQUEST.value, "Bad request syntax")
+    self.command, self.path, self.request_version = words
+    self.headers = http.client.parse_headers(io.BytesIO(rest))
+    connection = (self.headers["Connection"] or "").lower()
+    if self.request_version == "HTTP/1.1":
+      self.close_connection = connection == "close"
+    else:
+      self.close_connection = connection != "keep-alive"
+    length = self.headers["Content-Length"]
+    if length:
+      if not (length.isascii() and length.isdigit()):
+        return await self.reject(HTTPStatus.BAD_REQUEST.value, "Bad Content-Length")
+      if int(length) > self.max_body_size:
+        return await self.reject(HTTPStatus.REQUEST_ENTITY_TOO_LARGE.value)
+      self.body = await self.reader.readexactly(int(length))
+
+    method = getattr(self, "do_" + self.command, None)
+    if method is None:
+      self.send_error(HTTPStatus.NOT_IMPLEMENTED.value, f"Unsupported method {self.command}")
+    else:
+      try:
+        await method()
+      except Exception:  # pylint: disable=broad-except # noqa: BLE001
+        print(sys.exc_info()[0])
+        print(sys.exc_info()[1])
+        traceback.print_tb(sys.exc_info()[2])
+        self.send_error(HTTPStatus.INTERNAL_SERVER_ERROR.value, "Internal server error")
+    await self.finish()
+    return not self.close_connection
+
+  async def reject(self, code, message=None):
+    """Responds with an error and closes the connection, since the rest of the request is unread."""
+    self.close_connection = True
+    self.send_error(code, message)
+    await self.finish()
+    return False
+
+  def send_response(self, code, message=None):
+    self.status = (int(code), message or HTTPStatus(code).phrase)
+    self.response_headers = [
+      ("Server", self.server_version),
+      ("Date", email.utils.formatdate(usegmt=True)),
+    ]
+
+  def send_header(self, keyword, value):
+    self.response_headers.append((keyword, value))
+
+  def end_headers(self):
+    pass
+
+  def send_error(self, code, message=None):
+    self.send_response(code)
+    explanation = html.escape(message or HTTPStatus(code).description)
+    body = f"<html><body><h1>Error {int(code)}</h1><p>{explanation}</p></body></html>"
+    self.send_header("Content-Type", "text/html;charset=utf-8")
+    self.wfile = io.BytesIO(body.encode("utf-8"))
+    self.wfile.seek(0, io.SEEK_END)
+    self.close_file()
+
+  def close_file(self):
+    if self.file_body is not None:
+      self.file_body.close()
+      self.file_body = None
+
+  async def finish(self):
+    if self.status is None:
+      self.send_error(HTTPStatus.INTERNAL_SERVER_ERROR.value, "No response")
+    body = self.wfile.getvalue()
+    length = len(body)
+    if self.file_body is not None:
+      length = os.fstat(self.file_body.fileno()).st_size
+    lines = [f"HTTP/1.1 {self.status[0]} {self.status[1]}"]
+    lines.extend(f"{keyword}: {value}" for keyword, value in self.response_headers)
+    lines.append(f"Content-Length: {length}")
+    if self.close_connection:
+      lines.append("Connection: close")
+    head = "\r\n".join(lines).encode("iso-8859-1") + b"\r\n\r\n"
+    if self.file_body is None:
+      self.writer.write(head + body)
+      await self.writer.drain()
+      return
+    try:
+      self.writer.write(head)
+      await self.writer.drain()
+      await asyncio.get_running_loop().sendfile(self.writer.transport, self.file_body)
+    finally:
+      self.close_file()
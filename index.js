@@ -4,6 +4,9 @@ function changeval(e) {
   let val = document.getElementById("gamechoice").value;
   document.getElementById("gametype").value = val;
 }
+pageSize = 50;
+pageOffset = 0;
+totalGames = 0;
 function createGame(gameData) {
   let table = document.getElementById("table");
   let tr = document.createElement("TR");
@@ -21,7 +24,15 @@ function createGame(gameData) {
   link.innerText = "Launch";
   gameLink.appendChild(link);
   tr.appendChild(gameLink);
-  table.appendChild(tr);
+  // Keep the rows sorted by game id, the same order the server uses for pages.
+  let before = null;
+  for (let child of table.children) {
+    if (child.gameId > tr.gameId) {
+      before = child;
+      break;
+    }
+  }
+  table.insertBefore(tr, before);
   map[tr.gameId] = tr;
 }
 function updateGame(tr, gameData) {
@@ -30,29 +41,46 @@ function updateGame(tr, gameData) {
     gameStatus.innerText = gameData.status;
   }
 }
-function deleteMissingGames(allIds) {
-  let table = document.getElementById("table");
-  let toRemove = [];
-  for (child of table.children) {
-    if (!allIds[child.gameId]) {
-      toRemove.push(child);
-    }
-  }
-  for (child of toRemove) {
-    table.removeChild(child);
+function removeGame(gameId) {
+  if (map[gameId] != undefined) {
+    map[gameId].remove();
+    delete map[gameId];
   }
 }
-function updateGames(gamesData) {
-  let allIds = {};
-  for (game of gamesData) {
-    allIds[game.game_id] = true;
+function changeGames(gamesData) {
+  for (let game of gamesData) {
     if (map[game.game_id] != undefined) {
       updateGame(map[game.game_id], game);
       continue;
     }
     createGame(game);
   }
-  deleteMissingGames(allIds);
+}
+function updateGames(gamesData) {
+  for (let gameId of Object.keys(map)) {
+    removeGame(gameId);
+  }
+  changeGames(gamesData);
+}
+function updatePaging() {
+  let first = totalGames ? pageOffset + 1 : 0;
+  let last = Math.min(pageOffset + pageSize, totalGames);
+  document.getElementById("pageinfo").innerText = first + "-" + last + " of " + totalGames;
+  document.getElementById("prevpage").disabled = pageOffset <= 0;
+  document.getElementById("nextpage").disabled = pageOffset + pageSize >= totalGames;
+}
+function subscribe() {
+  let gameType = document.getElementById("filter").value || null;
+  let msg = {type: "subscribe", game_type: gameType, offset: pageOffset, limit: pageSize};
+  ws.send(JSON.stringify(msg));
+}
+function changeFilter(e) {
+  pageOffset = 0;
+  subscribe();
+}
+function changePage(direction) {
+  pageOffset = Math.max(pageOffset + direction * pageSize, 0);
+  subscribe();
 }
 function onmsg(e) {
   let data = JSON.parse(e.data);
@@ -61,7 +89,17 @@ function onmsg(e) {
     document.getElementById("error").display = "block";
     return;
   }
-  updateGames(data.games);
+  if (data.type == "lobby") {
+    for (let gameId of data.removed) {
+      removeGame(gameId);
+    }
+    changeGames(data.changed);
+  } else {
+    updateGames(data.games);
+    pageOffset = data.offset;
+  }
+  totalGames = data.total;
+  updatePaging();
 }
 function init() {
   let l = window.location;
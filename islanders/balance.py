@@ -0,0 +1,243 @@
+"""Rearranging the resources and numbers on a board until the board is fair.
+
+A fair board follows a set of Constraints: for example, no 6 next to an 8, no corner that is too
+good to settle on, and no resource that is much easier to get than it should be. Every way that a
+board breaks a constraint adds to its penalty, and a fair board has a penalty of zero.
+
+The search swaps the numbers, resources, or whole tiles of two random tiles at a time, keeping
+swaps that do not make the board worse (and, early on, some that do, so that it does not get
+stuck). Only the tiles, corners, and resources touched by a swap are rescored, so each swap takes
+the same time no matter how big the board is.
+"""
+
+import math
+import random
+import time
+
+# Penalties for resource pips are fractions, so the search allows for rounding errors.
+EPSILON = 1e-9
+
+
+def pips(number):
+  """The number of ways to roll a number with two dice."""
+  return _PIPS[number or 0]
+
+
+_PIPS = [0] + [6 - abs(7 - number) for number in range(1, 13)]
+
+
+class Constraints:
+  """The rules that a fair board must follow.
+
+  separate is a collection of numbers that may not be next to each other. repeats and same_resources
+  are whether the same number or resource may be on two tiles that are next to each other. A
+  corner may have at most max_corner_pips pips, and each resource's pips must be within
+  pip_tolerance of its share of the board's pips, based on how many tiles it has. A limit of None
+  is not checked.
+  """
+
+  def __init__(
+    self,
+    *,
+    separate=(6, 8),
+    repeats=True,
+    same_resources=True,
+    max_corner_pips=None,
+    pip_tolerance=None,
+  ):
+    self.separate = frozenset(separate)
+    self.repeats = repeats
+    self.same_resources = same_resources
+    self.max_corner_pips = max_corner_pips
+    self.pip_tolerance = pip_tolerance
+
+
+# Constraints for the "Balanced Board" option.
+FAIR = Constraints(repeats=False, same_resources=False, max_corner_pips=12, pip_tolerance=2)
+
+
+class _Search:
+  def __init__(self, state, tile_locs, constraints):
+    self.constraints = constraints
+    topology = state.topology
+    land = [loc for loc, tile in state.tiles.items() if tile.is_land]
+    index = {loc: idx for idx, loc in enumerate(land)}
+    self.locations = land
+    self.movable = [index[loc] for loc in tile_locs]
+    self.types = [state.tiles[loc].tile_type for loc in land]
+    self.numbers = [state.tiles[loc].number for loc in land]
+    self.neighbors = [
+      [index[adj] for adj in topology.tile_neighbors[loc] if adj in index] for loc in land
+    ]
+    corners = {}
+    self.tile_corners = [
+      [corners.setdefault(corner, len(corners)) for corner in topology.tile_corners[loc]]
+      for loc in land
+    ]
+    self.corner_pips = [0] * len(corners)
+    for idx, tile_corners in enumerate(self.tile_corners):
+      for corner in tile_corners:
+        self.corner_pips[corner] += pips(self.numbers[idx])
+    self.totals = {}
+    counts = {}
+    for tile_type, number in zip(self.types, self.numbers):
+      if number:
+        self.totals[tile_type] = self.totals.get(tile_type, 0) + pips(number)
+        counts[tile_type] = counts.get(tile_type, 0) + 1
+    # Swaps never change how many numbered tiles each resource has, so neither do their shares.
+    total = sum(self.totals.values())
+    numbered = sum(counts.values())
+    self.shares = {tile_type: total * count / numbered for tile_type, count in counts.items()}
+
+  def pair_penalty(self, first, second):
+    constraints = self.constraints
+    num1, num2 = self.numbers[first], self.numbers[second]
+    if not num1 or not num2:
+      return 0
+    penalty = 0
+    if num1 in constraints.separate and num2 in constraints.separate:
+      penalty += 1
+    if not constraints.repeats and num1 == num2:
+      penalty += 1
+    if not constraints.same_resources and self.types[first] == self.types[second]:
+      penalty += 1
+    return penalty
+
+  def corner_penalty(self, corners):
+    limit = self.constraints.max_corner_pips
+    corner_pips = self.corner_pips
+    return sum(corner_pips[corner] - limit for corner in corners if corner_pips[corner] > limit)
+
+  def spread_penalty(self):
+    tolerance = self.constraints.pip_tolerance
+    if tolerance is None:
+      return 0
+    return sum(
+      max(abs(total - self.shares[tile_type]) - tolerance, 0)
+      for tile_type, total in self.totals.items()
+    )
+
+  def penalty(self):
+    """The penalty for the whole board."""
+    pairs = sum(
+      self.pair_penalty(idx, adj)
+      for idx, neighbors in enumerate(self.neighbors)
+      for adj in neighbors
+      if idx < adj
+    )
+    corners = 0
+    if self.constraints.max_corner_pips is not None:
+      corners = self.corner_penalty(range(len(self.corner_pips)))
+    return pairs + corners + self.spread_penalty()
+
+  def tile_penalty(self, idx):
+    """The penalty for a tile's neighbors and corners, not counting resource pips."""
+    penalty = sum(self.pair_penalty(idx, adj) for adj in self.neighbors[idx])
+    if self.constraints.max_corner_pips is not None:
+      penalty += self.corner_penalty(self.tile_corners[idx])
+    return penalty
+
+  def local_penalty(self, first, second):
+    """The penalty for everything next to either of two tiles."""
+    penalty = sum(self.pair_penalty(first, adj) for adj in self.neighbors[first])
+    penalty += sum(self.pair_penalty(second, adj) for adj in self.neighbors[second] if adj != first)
+    if self.constraints.max_corner_pips is not None:
+      corners = set(self.tile_corners[first]).union(self.tile_corners[second])
+      penalty += self.corner_penalty(corners)
+    return penalty + self.spread_penalty()
+
+  def set_tile(self, idx, tile_type, number):
+    old_type, old_number = self.types[idx], self.numbers[idx]
+    if old_number:
+      self.totals[old_type] -= pips(old_number)
+    if number:
+      self.totals[tile_type] += pips(number)
+    if number != old_number:
+      change = pips(number) - pips(old_number)
+      for corner in self.tile_corners[idx]:
+        self.corner_pips[corner] += change
+    self.types[idx], self.numbers[idx] = tile_type, number
+
+  def swap(self, first, second, move):
+    """Swaps the numbers, the resources, or both, of two tiles. Swapping twice undoes a swap."""
+    type1, num1 = self.types[first], self.numbers[first]
+    type2, num2 = self.types[second], self.numbers[second]
+    if not num1 or not num2:
+      move = "tile"  # The desert keeps having no number wherever it goes.
+    if move == "number":
+      self.set_tile(first, type1, num2)
+      self.set_tile(second, type2, num1)
+    elif move == "type":
+      self.set_tile(first, type2, num1)
+      self.set_tile(second, type1, num2)
+    else:
+      self.set_tile(first, type2, num2)
+      self.set_tile(second, type1, num1)
+
+  def run(self, seconds, rng):
+    penalty = self.penalty()
+    best = (penalty, list(self.types), list(self.numbers))
+    if len(self.movable) < 2:
+      return best
+    # Tiles that may be breaking a constraint. Half of the swaps move one of these tiles, so that
+    # the search finds the few problems on a big board quickly.
+    suspects = [idx for idx in self.movable if self.tile_penalty(idx)]
+    suspected = set(suspects)
+    movable = set(self.movable)
+    deadline = time.perf_counter() + seconds
+    temperature = 1.0
+    steps = 0
+    while best[0] > EPSILON:
+      steps += 1
+      if steps % 256 == 0 and time.perf_counter() > deadline:
+        break
+      temperature = max(temperature * 0.999, 0.05)
+      first, second = rng.sample(self.movable, 2)
+      if suspects and rng.random() < 0.5:
+        pos = rng.randrange(len(suspects))
+        suspects[pos], suspects[-1] = suspects[-1], suspects[pos]
+        if not self.tile_penalty(suspects[-1]):
+          suspected.remove(suspects.pop())
+          continue
+        first = suspects[-1]
+        if first == second:
+          continue
+      move = rng.choice(["number", "type"])
+      before = self.local_penalty(first, second)
+      self.swap(first, second, move)
+      delta = self.local_penalty(first, second) - before
+      if delta > 0 and rng.random() >= math.exp(-delta / temperature):
+        self.swap(first, second, move)
+        continue
+      penalty += delta
+      if penalty < best[0]:
+        best = (penalty, list(self.types), list(self.numbers))
+      for idx in (first, second, *self.neighbors[first], *self.neighbors[second]):
+        if idx in movable and idx not in suspected and self.tile_penalty(idx):
+          suspected.add(idx)
+          suspects.append(idx)
+    return best
+
+
+def unfairness(state, constraints):
+  """Returns the penalty for the board as it is. A board that follows the constraints scores 0."""
+  return _Search(state, [], constraints).penalty()
+
+
+def balance(state, tile_locs, constraints, *, seconds=1.0, rng=None):
+  """Rearranges the resources and numbers of the given land tiles to follow the constraints.
+
+  Other tiles are not changed, but they still count when checking the constraints. Gives up after
+  the given number of seconds, leaving the fairest board found so far. Returns True if the board
+  follows every constraint.
+  """
+  rng = random if rng is None else rng
+  search = _Search(state, tile_locs, constraints)
+  penalty, types, numbers = search.run(seconds, rng)
+  for loc, tile_type, number in zip(search.locations, types, numbers):
+    tile = state.tiles[loc]
+    if tile.tile_type != tile_type:
+      tile.tile_type = tile_type
+    if tile.number != number:
+      tile.number = number
+  return penalty < EPSILON
@@ -614,10 +614,8 @@ function drawHover(ctx) {
         drawType = "city";
       }
     }
-    if (drawType == null) {
-      if (cornerMatrix[hoverCorner[0]] != null && cornerMatrix[hoverCorner[0]][hoverCorner[1]] != null) {
-        drawType = "settlement";
-      }
+    if (drawType == null && isPlacement("settle", hoverCorner)) {
+      drawType = "settlement";
     }
     if (drawType != null) {
       drawPiece(hoverCorner, 'rgba(127, 127, 127, 0.5)', drawType, false, ctx);
@@ -647,6 +645,9 @@ function drawHover(ctx) {
       if (edgeType == "coastdown") {
         shipAbove = !shipAbove;
       }
+      if (!isPlacement(shipAbove ? "ship" : "road", hoverTileEdge.edge)) {
+        return;
+      }
       let drawType = "coast";
       drawType += shipAbove ? "ship" : "road";
       drawType += edgeType == "coastup" ? "up" : "down";
@@ -655,16 +656,26 @@ function drawHover(ctx) {
     }
   }
   if ((edgeType == null || !edgeType.startsWith("coast")) && hoverEdge != null) {
+    if (["knight", "fastknight"].includes(turnPhase) && !isPlacement("knight", hoverEdge.location)) {
+      return;
+    }
     if (["knight", "fastknight", "move_knights"].includes(turnPhase)) {
       if (hoverEdge.edge_type != "ship") {
         drawKnight(hoverEdge.location, 'rgba(127, 127, 127, 0.5)', 0, ctx);
       }
       return;
     }
+    if (["road", "ship"].includes(hoverEdge.edge_type) && !isPlacement(hoverEdge.edge_type, hoverEdge.location)) {
+      return;
+    }
     drawRoad(hoverEdge.location, 'rgba(127, 127, 127, 0.5)', hoverEdge.edge_type, null, null, false, ctx);
     return;
   }
 }
+function isPlacement(pieceType, location) {
+  // placements comes from the server, and only has locations where this player can build now.
+  return (placements[pieceType] ?? []).some(loc => locationsEqual(loc, location));
+}
 function drawRobber(ctx, loc, alpha, land) {
   if (loc == null) {
     return;
@@ -0,0 +1,63 @@
+"""Counters for the barbarians on the board, kept up to date as barbarians come and go.
+
+Finding out how many barbarians are left in the supply, which tiles have barbarians, or which
+corners are next to conquered tiles would otherwise mean looking at every tile on the board. Each
+tile tells the board it is on whenever its barbarians or its conquered status change, and the board
+passes that on to its Invasion (see IslandersState.add_tile), so only that tile's counters change.
+"""
+
+import collections
+
+TOTAL_BARBARIANS = 30
+
+
+class Invasion:
+  def __init__(self):
+    self.on_board = 0  # The number of barbarians on all tiles.
+    self.occupied = set()  # Locations of tiles with barbarians on them.
+    self.conquered = set()  # Locations of conquered tiles.
+    self.conquered_corners = collections.Counter()  # corner -> number of conquered tiles around it
+    # Land tiles that are next to water or the edge of the board. This only changes with the shape
+    # of the board, so it is set by IslandersState._compute_coast instead of kept up to date here.
+    self.coastal = frozenset()
+
+  def supply(self, captured):
+    """The number of barbarians that are neither on the board nor captured by players."""
+    return TOTAL_BARBARIANS - self.on_board - captured
+
+  def add_tile(self, tile):
+    self.barbarians_changed(tile, 0, tile.barbarians)
+    self.conquered_changed(tile, False, tile.conquered)
+
+  def remove_tile(self, tile):
+    self.barbarians_changed(tile, tile.barbarians, 0)
+    self.conquered_changed(tile, tile.conquered, False)
+
+  def barbarians_changed(self, tile, old, new):
+    self.on_board += new - old
+    if new:
+      self.occupied.add(tile.location)
+    else:
+      self.occupied.discard(tile.location)
+
+  def conquered_changed(self, tile, old, new):
+    if bool(old) == bool(new):
+      return
+    change = 1 if new else -1
+    if new:
+      self.conquered.add(tile.location)
+    else:
+      self.conquered.discard(tile.location)
+    for corner in tile.location.get_corner_locations():
+      self.conquered_corners[corner] += change
+      if not self.conquered_corners[corner]:
+        del self.conquered_corners[corner]
+
+  def copy(self):
+    invasion = Invasion.__new__(Invasion)
+    invasion.on_board = self.on_board
+    invasion.occupied = self.occupied.copy()
+    invasion.conquered = self.conquered.copy()
+    invasion.conquered_corners = self.conquered_corners.copy()
+    invasion.coastal = self.coastal
+    return invasion
@@ -81,6 +81,7 @@ landings = [];
 treasures = [];
 edges = [];
 edgeMatrix = [];
+placements = {};
 roads = [];
 roadMatrix = [];
 knights = [];
@@ -1358,7 +1359,10 @@ function clearerror() {
   }
 }
 function onmsg(event) {
-  var data = JSON.parse(event.data);
+  var data = decodeMessage(ws, JSON.parse(event.data));
+  if (data == null) {
+    return;
+  }
   if (data.type == "error") {
     document.getElementById("errorText").holdSeconds = 3;
     document.getElementById("errorText").style.opacity = 1.0;
@@ -1384,6 +1388,7 @@ function onmsg(event) {
   ports = data.ports;
   updateElems(corners, cornerMatrix, data.corners);
   updateElems(edges, edgeMatrix, data.edges);
+  placements = data.placements ?? {};
   robberLoc = data.robber;
   pirateLoc = data.pirate;
   targetTile = data.target_tile;
@@ -2383,6 +2388,7 @@ function continueInit(gameId) {
   window.onresize = resizeThings;
   ws = new WebSocket("ws://" + window.location.hostname + ":8081/" + gameId);
   ws.onmessage = onmsg;
+  ws.onopen = function() { enablePatches(ws); };
 }
 function onBodyClick(event) {
   // Ignore right/middle-click.
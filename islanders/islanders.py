@@ -1,14 +1,17 @@
 import abc
 import collections
+import functools
 import json
 from random import SystemRandom
 from typing import Optional
 import os
 
+import eventlog
 from game import (
   BaseGame,
   ValidatePlayer,
   CustomEncoder,
+  SpliceJson,
   InvalidInput,
   UnknownMove,
   InvalidMove,
@@ -16,6 +19,9 @@ from game import (
   TooManyPlayers,
   NotYourTurn,
 )
+from islanders import balance
+from islanders import invasion
+from islanders import islands
 
 random = SystemRandom()
 
@@ -69,6 +75,12 @@ class Event(_event):
       args = list(args) + defaults[-missing:]
     return super().__new__(cls, *args)
 
+  def for_player(self, player_idx):
+    text = self.public_text
+    if self.secret_text and self.visible_players and player_idx in self.visible_players:
+      text = self.secret_text
+    return {"event_type": self.event_type, "text": text}
+
 
 class GameOption:
   def __init__(self, name, forced=False, default=False, choices=None, value=None, hidden=False):
@@ -118,6 +130,7 @@ class Options(collections.OrderedDict):
     )
     self["gold"] = GameOption("Gold Trading", default=False, forced=True, hidden=True)
     self["friendly_robber"] = GameOption("Friendly Robber", default=False)
+    self["balanced_board"] = GameOption("Balanced Board", default=False)
     self["randomness"] = GameOption("Randomness", default=36, choices=list(range(37)))
     self["victory_points"] = GameOption("Victory Points", default=10, choices=list(range(8, 22)))
     self["immediate_dev"] = GameOption("", default=False, forced=True, hidden=True)
@@ -150,6 +163,9 @@ class Options(collections.OrderedDict):
         setattr(self[key], attr, val)
 
   def __getattr__(self, attr):
+    # Lets copy and pickle tell that special methods like __deepcopy__ are missing.
+    if attr not in self:
+      raise AttributeError(attr)
     return self[attr].value
 
 
@@ -376,14 +392,115 @@ def parse_location(location, location_type):
   return location_type(*location)
 
 
+class Topology:
+  """The tiles, corners, and edges of a board, and which of them touch each other.
+
+  The location classes create new locations every time they are asked for their neighbors. Since
+  the layout of a board does not change once it has been loaded, the topology computes every
+  neighbor list once, using a single location object for each tile, corner, and edge. It must not
+  be modified; boards with the same layout share one (see board_topology).
+  """
+
+  def __init__(self, tile_locations):
+    self.tile_locations = frozenset(tile_locations)
+    tiles = {loc: loc for loc in self.tile_locations}
+    corners = {}
+    edges = {}
+    # Neighboring tiles may not be on the board. Neighbor lists are in the same order as the
+    # location method that computes them, since rotations depend on that order.
+    self.tile_corners = {}  # tile -> get_corner_locations()
+    self.tile_edges = {}  # tile -> get_edge_locations()
+    self.tile_neighbors = {}  # tile -> get_adjacent_tiles()
+    for loc in sorted(self.tile_locations):
+      self.tile_corners[loc] = tuple(corners.setdefault(c, c) for c in loc.get_corner_locations())
+      self.tile_edges[loc] = tuple(edges.setdefault(e, e) for e in loc.get_edge_locations())
+      self.tile_neighbors[loc] = tuple(tiles.setdefault(t, t) for t in loc.get_adjacent_tiles())
+    self.corners = tuple(corners)  # every corner of every tile on the board
+    self.corner_tiles = {}  # corner -> get_tiles()
+    self.corner_edges = {}  # corner -> get_edges()
+    self.corner_neighbors = {}  # corner -> get_adjacent_corners()
+    for corner in self.corners:
+      self.corner_tiles[corner] = tuple(tiles.setdefault(t, t) for t in corner.get_tiles())
+      self.corner_edges[corner] = tuple(edges.setdefault(e, e) for e in corner.get_edges())
+      self.corner_neighbors[corner] = tuple(
+        corners.setdefault(c, c) for c in corner.get_adjacent_corners()
+      )
+    self.edges = tuple(edges)  # every edge touching a corner on the board
+    self.edge_corners = {}  # edge -> (corner_left, corner_right)
+    self.edge_tiles = {}  # edge -> get_adjacent_tiles(), sorted from top to bottom
+    self.edge_end_tiles = {}  # edge -> get_end_tiles()
+    for edge in self.edges:
+      self.edge_corners[edge] = (
+        corners.setdefault(edge.corner_left, edge.corner_left),
+        corners.setdefault(edge.corner_right, edge.corner_right),
+      )
+      self.edge_tiles[edge] = tuple(
+        tiles.setdefault(t, t) for t in sorted(edge.get_adjacent_tiles(), key=lambda t: (t.y, t.x))
+      )
+      self.edge_end_tiles[edge] = tuple(tiles.setdefault(t, t) for t in edge.get_end_tiles())
+    # Edges with a tile on both sides, which are the only places a road or ship can be built.
+    self.board_edges = tuple(
+      edge for edge in self.edges if all(t in self.tile_locations for t in self.edge_tiles[edge])
+    )
+    # Each location's shared object, so that pieces and roads do not need their own copies.
+    self.locations = {**tiles, **corners, **edges}
+
+
+@functools.lru_cache(maxsize=64)
+def board_topology(tile_locations):
+  """Returns the Topology for a frozenset of tile locations."""
+  return Topology(tile_locations)
+
+
+def _biconnected_blocks(start, neighbors, skip, discovered):
+  """Splits the edges reachable from start into biconnected blocks, ignoring the corner skip.
+
+  neighbors maps each corner to a list of (edge, other corner). discovered maps each corner that
+  has been visited to its discovery order, and is updated with the corners visited from start.
+  Returns a list of (corner, edges) for each block, where corner is the first corner of the block to
+  be visited. A block with only one edge is a bridge.
+  """
+  discovered[start] = len(discovered)
+  lowest = {start: discovered[start]}
+  edge_stack = []
+  blocks = []
+  stack = [(start, None, iter(neighbors[start]))]
+  while stack:
+    corner, parent_edge, remaining = stack[-1]
+    for edge, other_corner in remaining:
+      if edge == parent_edge or other_corner == skip:
+        continue
+      if other_corner not in discovered:
+        discovered[other_corner] = lowest[other_corner] = len(discovered)
+        edge_stack.append(edge)
+        stack.append((other_corner, edge, iter(neighbors[other_corner])))
+        break
+      if discovered[other_corner] < discovered[corner]:  # An edge back to an earlier corner.
+        edge_stack.append(edge)
+        lowest[corner] = min(lowest[corner], discovered[other_corner])
+    else:
+      stack.pop()
+      if not stack:
+        continue
+      parent = stack[-1][0]
+      lowest[parent] = min(lowest[parent], lowest[corner])
+      if lowest[corner] >= discovered[parent]:
+        block = []
+        while not block or block[-1] != parent_edge:
+          block.append(edge_stack.pop())
+        blocks.append((parent, block))
+  return blocks
+
+
 class Road:
   TYPES = ("road", "ship")
+  __slots__ = ("closed", "conquered", "location", "movable", "player", "road_type", "source")
 
   def __init__(
     self, location, road_type, player, *, closed=False, movable=True, source=None, conquered=False
   ):
     assert road_type in self.TYPES
-    self.location = EdgeLocation(*location)
+    self.location = location if isinstance(location, EdgeLocation) else EdgeLocation(*location)
     self.road_type = road_type
     self.player = player
     self.closed = closed
@@ -419,11 +536,24 @@ class Road:
       conquered=value.get("conquered", False),
     )
 
+  def copy(self):
+    road = Road.__new__(Road)
+    road.location = self.location
+    road.road_type = self.road_type
+    road.player = self.player
+    road.closed = self.closed
+    road.movable = self.movable
+    road.source = self.source
+    road.conquered = self.conquered
+    return road
+
   def __str__(self):
     return str(self.json_repr())
 
 
 class Knight:
+  __slots__ = ("location", "movement", "player", "source")
+
   def __init__(self, location, player, source, *, movement=0):
     self.location = EdgeLocation(*location)
     self.player = player
@@ -442,12 +572,21 @@ class Knight:
   def parse_json(value):
     return Knight(value["location"], value["player"], value["source"], movement=value["movement"])
 
+  def copy(self):
+    knight = Knight.__new__(Knight)
+    knight.location = self.location
+    knight.player = self.player
+    knight.source = self.source
+    knight.movement = self.movement
+    return knight
+
   def __str__(self):
     return str(self.json_repr())
 
 
 class Piece:
   TYPES = ("settlement", "city")
+  __slots__ = ("conquered", "location", "piece_type", "player")
 
   def __init__(self, x, y, piece_type, player, *, conquered=False):
     assert piece_type in self.TYPES
@@ -474,11 +613,32 @@ class Piece:
       conquered=value.get("conquered", False),
     )
 
+  def copy(self):
+    piece = Piece.__new__(Piece)
+    piece.location = self.location
+    piece.piece_type = self.piece_type
+    piece.player = self.player
+    piece.conquered = self.conquered
+    return piece
+
   def __str__(self):
     return str(self.json_repr())
 
 
 class Tile:
+  __slots__ = (
+    "_barbarians",
+    "_conquered",
+    "_is_land",
+    "_number",
+    "land_rotations",
+    "location",
+    "on_change",
+    "rotation",
+    "tile_type",
+    "variant",
+  )
+
   def __init__(
     self,
     x,
@@ -494,6 +654,7 @@ class Tile:
     land_rotations=None,
   ):
     self.location = TileLocation(x, y)
+    self.on_change = None  # Called with (tile, attr, old, new); see IslandersState.add_tile
     self.tile_type = tile_type
     self.is_land = is_land
     self.number = number
@@ -503,8 +664,58 @@ class Tile:
     self.conquered = conquered
     self.land_rotations = land_rotations or []
 
+  @property
+  def is_land(self):
+    return self._is_land
+
+  @is_land.setter
+  def is_land(self, value):
+    if self.on_change is not None:
+      self.on_change(self, "is_land", self._is_land, value)
+    self._is_land = value
+
+  @property
+  def number(self):
+    return self._number
+
+  @number.setter
+  def number(self, value):
+    if self.on_change is not None:
+      self.on_change(self, "number", self._number, value)
+    self._number = value
+
+  @property
+  def barbarians(self):
+    return self._barbarians
+
+  @barbarians.setter
+  def barbarians(self, value):
+    if self.on_change is not None:
+      self.on_change(self, "barbarians", self._barbarians, value)
+    self._barbarians = value
+
+  @property
+  def conquered(self):
+    return self._conquered
+
+  @conquered.setter
+  def conquered(self, value):
+    if self.on_change is not None:
+      self.on_change(self, "conquered", self._conquered, value)
+    self._conquered = value
+
   def json_repr(self):
-    return {attr: getattr(self, attr) for attr in self.__dict__}
+    return {
+      "location": self.location,
+      "tile_type": self.tile_type,
+      "is_land": self.is_land,
+      "number": self.number,
+      "rotation": self.rotation,
+      "variant": self.variant,
+      "barbarians": self.barbarians,
+      "conquered": self.conquered,
+      "land_rotations": self.land_rotations,
+    }
 
   @staticmethod
   def parse_json(value):
@@ -521,11 +732,28 @@ class Tile:
       land_rotations=value.get("land_rotations") or [],
     )
 
+  def copy(self):
+    tile = Tile.__new__(Tile)
+    tile.location = self.location
+    tile.tile_type = self.tile_type
+    tile._is_land = self._is_land  # pylint: disable=protected-access
+    tile.rotation = self.rotation
+    tile.variant = self.variant
+    # The copy is not on any board until it is added to one.
+    tile.on_change = None
+    tile._number = self._number  # pylint: disable=protected-access
+    tile._barbarians = self._barbarians  # pylint: disable=protected-access
+    tile._conquered = self._conquered  # pylint: disable=protected-access
+    tile.land_rotations = self.land_rotations
+    return tile
+
   def __str__(self):
     return str(self.json_repr())
 
 
 class Port:
+  __slots__ = ("location", "port_type", "rotation")
+
   def __init__(self, x, y, port_type, rotation=0):
     self.location = TileLocation(x, y)
     self.port_type = port_type
@@ -538,11 +766,31 @@ class Port:
   def parse_json(value):
     return Port(value["location"][0], value["location"][1], value["port_type"], value["rotation"])
 
+  def copy(self):
+    port = Port.__new__(Port)
+    port.location = self.location
+    port.port_type = self.port_type
+    port.rotation = self.rotation
+    return port
+
   def __str__(self):
     return str(self.json_repr())
 
 
 class Player:
+  __slots__ = (
+    "buried_treasure",
+    "captured_barbarians",
+    "cards",
+    "color",
+    "gold_traded",
+    "knights_played",
+    "longest_route",
+    "name",
+    "trade_ratios",
+    "unusable",
+  )
+
   def __init__(self, color, name):
     self.color = color
     self.name = name
@@ -557,7 +805,7 @@ class Player:
 
   def json_repr(self):
     defaultdict_attrs = ["cards", "trade_ratios", "unusable"]
-    data = {attr: getattr(self, attr) for attr in self.__dict__.keys() - set(defaultdict_attrs)}
+    data = {attr: getattr(self, attr) for attr in set(self.__slots__) - set(defaultdict_attrs)}
     for attr in defaultdict_attrs:
       data[attr] = dict(getattr(self, attr))
     data["trade_ratios"]["default"] = self.trade_ratios.default_factory()
@@ -570,7 +818,7 @@ class Player:
     for attr in defaultdict_attrs:
       getattr(player, attr).update(value[attr])
     value.setdefault("buried_treasure", 0)  # Backwards compatibility
-    for attr in set(player.__dict__.keys()) - set(defaultdict_attrs):
+    for attr in set(player.__slots__) - set(defaultdict_attrs):
       if attr in value:
         setattr(player, attr, value[attr])
     ratio_default = player.trade_ratios.pop("default", None)
@@ -578,6 +826,14 @@ class Player:
       player.trade_ratios.default_factory = lambda: ratio_default
     return player
 
+  def copy(self):
+    player = Player.__new__(Player)
+    for attr in self.__slots__:
+      setattr(player, attr, getattr(self, attr))
+    for attr in ["cards", "trade_ratios", "unusable"]:
+      setattr(player, attr, getattr(self, attr).copy())
+    return player
+
   def __str__(self):
     return str(self.json_repr())
 
@@ -635,7 +891,19 @@ class IslandersState:
       "placement_islands",
     }
   )
-  COMPUTED_ATTRIBUTES = frozenset({"port_corners", "corners_to_islands"})
+  COMPUTED_ATTRIBUTES = frozenset(
+    {
+      "port_corners",
+      "corners_to_islands",
+      "route_lengths",
+      "_topology",
+      "_number_index",
+      "_layout_cache",
+      "_board_version",
+      "_placement_cache",
+      "invasion",
+    }
+  )
   INDEXED_ATTRIBUTES = frozenset(
     {"discard_players", "collect_counts", "home_corners", "foreign_landings", "counter_offers"}
   )
@@ -661,12 +929,24 @@ class IslandersState:
     }
   )
   EXTRA_BUILD_ACTIONS = ("settle", "city", "buy_dev", "road", "ship", "end_extra_build")
+  # Turn phases in which the player can place a new piece on the board.
+  PLACEMENT_PHASES = ("main", "extra_build", "settle", "road", "dev_road", "knight", "fastknight")
 
   def __init__(self):
     # Player data is a sequential list of Player objects; players are identified by index.
     self.player_data: list[Player] = []
     # Board/Card State
     self.tiles: dict[TileLocation, Tile] = {}
+    self.invasion = invasion.Invasion()  # counters for the barbarians on these tiles
+    self._topology: Optional[Topology] = None  # computed from tiles when needed; see topology
+    # number -> locations of the tiles with that number, or empty when it must be computed again.
+    # It is cleared whenever a tile's number changes; see tiles_by_number and _tile_changed.
+    self._number_index = {}
+    self._layout_cache = None  # see _board_layout
+    # Changes whenever something that legal_placements depends on changes: pieces, roads, knights,
+    # the pirate, and which tiles are land or conquered.
+    self._board_version = 0
+    self._placement_cache = {}  # player -> the board they were computed for, legal_placements
     self.ports: dict[TileLocation, Port] = {}
     self.port_corners: dict[CornerLocation, str] = {}
     self.pieces: dict[CornerLocation, Piece] = {}
@@ -681,7 +961,9 @@ class IslandersState:
     self.longest_route_player: Optional[int] = None
     self.dice_roll: Optional[tuple[int, int]] = None
     self.dice_cards: Optional[list[tuple[int, int]]] = None
-    self.corners_to_islands: dict[CornerLocation, CornerLocation] = {}  # corner -> canonical corner
+    self.corners_to_islands = islands.Islands()  # corner -> canonical corner
+    # player -> longest route in each of their road networks, keyed by the network's layout
+    self.route_lengths: dict[int, dict[tuple, int]] = {}
     self.placement_islands: Optional[list[CornerLocation]] = None
     self.discoverable_tiles: list[str] = []
     self.discoverable_numbers: list[int] = []
@@ -714,7 +996,7 @@ class IslandersState:
     # Special values for counter-offers: not present in dictionary means they have not
     # yet made a counter-offer. An null/None counter-offer indicates that they have
     # rejected the trade offer. A counter-offer equal to the original means they accept.
-    self.event_log = collections.deque([], 50)
+    self.event_log = eventlog.Log(50)
     # Game Options
     self.options = Options()
 
@@ -838,10 +1120,63 @@ class IslandersState:
     ret["event_log"] = list(self.event_log)
     return ret
 
+  def clone(self):
+    """Returns a copy of the state that can be changed without changing the original.
+
+    This is much faster than copy.deepcopy, so it can be used to try out moves (see restore).
+    """
+    state = object.__new__(type(self))
+    self._copy_to(state)
+    return state
+
+  def restore(self, snapshot):
+    """Undoes any changes made since snapshot was cloned from this state.
+
+    The snapshot itself is not changed, so it can be restored again after trying another move.
+    """
+    self.__dict__.clear()
+    snapshot._copy_to(self)  # pylint: disable=protected-access
+
+  def _copy_to(self, state):
+    # Locations, tuples, the topology, and the entries of the computed caches are never changed in
+    # place, so they are shared. The options cannot change once the game has started.
+    state.__dict__.update(self.__dict__)
+    for attr, value in self.__dict__.items():
+      if isinstance(value, (list, dict, collections.deque)) and attr != "options":
+        setattr(state, attr, value.copy())
+    state.player_data = [player.copy() for player in self.player_data]
+    state.event_log = self.event_log.copy()
+    for attr in ["tiles", "ports", "pieces", "roads", "knights"]:
+      setattr(state, attr, {loc: obj.copy() for loc, obj in getattr(self, attr).items()})
+    state.invasion = self.invasion.copy()
+    state.corners_to_islands = self.corners_to_islands.copy()
+    # Tiles only report changes to the board they were added to, so a tile that was put into tiles
+    # without add_tile would leave the invasion counters and the number index out of date.
+    watched = all(getattr(tile.on_change, "__self__", None) is self for tile in self.tiles.values())
+    assert watched, "tiles must be added with add_tile"
+    for tile in state.tiles.values():
+      tile.on_change = state._tile_changed  # pylint: disable=protected-access
+    for attr in ["home_corners", "foreign_landings"]:
+      copied = getattr(state, attr)
+      for idx, corners in copied.items():
+        copied[idx] = corners.copy()
+
   def for_player(self, player_idx):
+    data = self.shared_json()
+    data.update(self.player_json(player_idx))
+    return data
+
+  def shared_json(self):
+    """The portion of the state that is identical for every player."""
     data = self.json_for_player()
+    del data["event_log"]
     if self.turn_phase == "bury" and len(self.action_stack) > 1:
       data["treasure"] = self.action_stack[-2]
+    return data
+
+  def player_json(self, player_idx):
+    """The portion of the state that differs between players; disjoint from shared_json()."""
+    data = {}
     if self.turn_phase == "treason" and self.turn_idx == player_idx:
       src_count, dest_count = self._calculate_treason_tiles()
       data["from_count"] = src_count
@@ -849,13 +1184,7 @@ class IslandersState:
     if player_idx is not None:
       data["you"] = player_idx
       data["cards"] = self.player_data[player_idx].cards
-    events = data.pop("event_log")
-    data["event_log"] = []
-    for event in events:
-      text = event.public_text
-      if event.secret_text and event.visible_players and player_idx in event.visible_players:
-        text = event.secret_text
-      data["event_log"].append({"event_type": event.event_type, "text": text})
+      data["placements"] = self.legal_placements(player_idx)
     return data
 
   def json_for_player(self):
@@ -867,25 +1196,15 @@ class IslandersState:
     del ret["player_data"]
     ret["dev_cards"] = len(self.dev_cards)
 
-    land_corners = set()
-    all_corners = set()
-    # TODO: instead of sending a list of corners, we should send something like
-    # a list of legal moves for tiles, corners, and edges.
-    for tile in self.tiles.values():
-      # Triple-count each corner and dedup.
-      for corner_loc in tile.location.get_corner_locations():
-        all_corners.add(corner_loc)
-        if not tile.is_land:
-          continue
-        land_corners.add(corner_loc)
+    land_corners, board_edges = self._board_layout()
     ret["corners"] = [{"location": loc} for loc in land_corners]
-    edges = {}
-    for corner in all_corners:
-      # Double-count each edge and dedup.
-      for edge in corner.get_edges():
-        edge_type = self._get_edge_type(edge)
+    edges = dict(board_edges)
+    # Roads and ships replace the edge type of any coast that they are built on.
+    for loc, road in self.roads.items():
+      if loc not in edges or edges[loc]["edge_type"] != road.road_type:
+        edge_type = self._get_edge_type(loc)
         if edge_type is not None:
-          edges[edge] = {"location": edge, "edge_type": edge_type}
+          edges[loc] = {"location": loc, "edge_type": edge_type}
     ret["edges"] = list(edges.values())
 
     ret["landings"] = []
@@ -901,6 +1220,100 @@ class IslandersState:
       ret["player_data"][idx]["points"] = self.player_points(idx, visible=not is_over)
     return ret
 
+  def _board_layout(self):
+    """Returns the corners on land, and the type of each edge, ignoring roads and ships.
+
+    These only change when tiles are discovered, so they are kept until a tile's land changes.
+    The returned objects are shared, and must not be modified.
+    """
+    key = (self.topology, self.options.seafarers, tuple(t.is_land for t in self.tiles.values()))
+    if self._layout_cache is None or self._layout_cache[0] != key:
+      topology = self.topology
+      land_corners = set()
+      for tile in self.tiles.values():
+        if tile.is_land:
+          # Triple-count each corner and dedup.
+          land_corners.update(topology.tile_corners[tile.location])
+      edges = {}
+      for edge in topology.board_edges:
+        edge_type = self._get_edge_type(edge, ignore_roads=True)
+        if edge_type is not None:
+          edges[edge] = {"location": edge, "edge_type": edge_type}
+      corners = [corner for corner in topology.corners if corner in land_corners]
+      self._layout_cache = (key, corners, edges)
+    return self._layout_cache[1], self._layout_cache[2]
+
+  def legal_placements(self, player_idx):
+    """Returns the locations where the player could build each type of piece right now.
+
+    Players get no locations unless it is their turn to build, and only get locations for the
+    pieces that the current turn phase lets them build. Only the location is checked; whether they
+    have enough resources and pieces left is up to the move handlers. The result is kept until the
+    board changes (see _board_version), and must not be modified.
+    """
+    placements = {"settle": [], "road": [], "ship": [], "knight": []}
+    acting_idx = self.extra_build_idx if self.turn_phase == "extra_build" else self.turn_idx
+    if self.game_phase == "victory" or self.turn_phase not in self.PLACEMENT_PHASES:
+      return placements
+    if player_idx != acting_idx:
+      return placements
+    key = (
+      self._board_version,
+      self.game_phase,
+      self.turn_phase,
+      tuple(self.placement_islands or ()),
+    )
+    cached = self._placement_cache.get(player_idx)
+    if cached is not None and cached[0] == key:
+      return cached[1]
+
+    def allowed(check, *args):
+      try:
+        check(*args)
+      except InvalidMove:
+        return False
+      return True
+
+    topology = self.topology
+    # Outside of the initial placement, new pieces must connect to the player's own pieces.
+    own_corners = {loc for loc, piece in self.pieces.items() if piece.player == player_idx}
+    road_corners = set()
+    for loc, road in self.roads.items():
+      if road.player == player_idx:
+        road_corners.update(topology.edge_corners[loc])
+    own_corners |= road_corners
+    land_corners, edges = self._board_layout()
+    if self.turn_phase in ["settle", "main", "extra_build"]:
+      settle_corners = land_corners if self.turn_phase == "settle" else road_corners
+      placements["settle"] = sorted(
+        loc for loc in settle_corners if allowed(self._check_settlement_location, loc, player_idx)
+      )
+    if self.turn_phase in ["road", "dev_road", "main", "extra_build"]:
+      # Skip edges that can never hold a road or ship before doing the full checks on the rest.
+      road_edges = {
+        edge
+        for corner in own_corners
+        for edge in topology.corner_edges[corner]
+        if edge in edges and edge not in self.roads
+      }
+      for road_type in Road.TYPES:
+        placements[road_type] = sorted(
+          edge
+          for edge in road_edges
+          if edges[edge]["edge_type"] in [road_type, "coastup", "coastdown"]
+          and allowed(self._check_road_building, edge, player_idx, road_type)
+          and (
+            self.turn_phase != "road"
+            or allowed(self._check_road_next_to_empty_settlement, edge, player_idx)
+          )
+        )
+    if self.turn_phase in ["knight", "fastknight"]:
+      placements["knight"] = [
+        edge for edge in topology.board_edges if allowed(self._check_knight_location, edge)
+      ]
+    self._placement_cache[player_idx] = (key, placements)
+    return placements
+
   def player_points(self, idx, visible):
     count = 0
     for piece in self.pieces.values():
@@ -972,7 +1385,7 @@ class IslandersState:
         self.next_action()
       return
     if self.turn_phase == "intrigue":
-      if not any(tile.barbarians for tile in self.tiles.values()):
+      if not self.invasion.occupied:
         self.action_stack.pop()
         if self.options.shuffle_discards and not self.dev_cards:
           self.reshuffle_dev_cards()
@@ -1304,25 +1717,52 @@ class IslandersState:
     return 19 - sum(p.cards[rsrc] for p in self.player_data)
 
   def calculate_resource_distribution(self, dice_roll):
-    # Figure out which players are due how many resources.
+    to_receive = self._production(sum(dice_roll))
+    self.collect_counts = to_receive.pop("anyrsrc", {})
+    return to_receive
+
+  def _production(self, number):
+    """Figures out which players are due how many of each tile type when number is rolled."""
     to_receive = collections.defaultdict(lambda: collections.defaultdict(int))
-    for tile in self.tiles.values():
-      if tile.number != sum(dice_roll):
-        continue
-      if self.robber == tile.location:
+    tile_corners = self.topology.tile_corners
+    for loc in self.tiles_by_number().get(number, ()):
+      tile = self.tiles[loc]
+      if self.robber == loc:
         continue
       if tile.conquered:
         continue
-      for corner_loc in tile.location.get_corner_locations():
+      for corner_loc in tile_corners[loc]:
         piece = self.pieces.get(corner_loc)
         if piece and piece.piece_type == "settlement":
           to_receive[tile.tile_type][piece.player] += 1
         elif piece and piece.piece_type == "city":
           to_receive[tile.tile_type][piece.player] += 2
-
-    self.collect_counts = to_receive.pop("anyrsrc", {})
     return to_receive
 
+  def tiles_by_number(self):
+    """Returns the locations of the tiles with each number, in board order."""
+    if not self._number_index:
+      for loc, tile in self.tiles.items():
+        if tile.number:
+          self._number_index.setdefault(tile.number, []).append(loc)
+    return self._number_index
+
+  def simulate_rolls(self, count, rng=None):
+    """Rolls the dice count times and adds up what each player would receive, without playing.
+
+    Every roll is distributed against the current board: the robber does not move, there are no
+    shortages or barbarians, and gold is counted as anyrsrc. Returns a Counter of how many times
+    each total was rolled, and a Counter of tile types received by each player.
+    """
+    rng = rng or random
+    totals = collections.Counter(rng.randint(1, 6) + rng.randint(1, 6) for _ in range(count))
+    received = [collections.Counter() for _ in self.player_data]
+    for total, times in totals.items():
+      for tile_type, receive_players in self._production(total).items():
+        for player, amount in receive_players.items():
+          received[player][tile_type] += amount * times
+    return totals, received
+
   def distribute_resources(self, dice_roll):
     to_receive = self.calculate_resource_distribution(dice_roll)
     self.shortage_resources = []
@@ -1507,6 +1947,7 @@ class IslandersState:
     self.check_friendly_robber(player_idx, adjacent_players, "pirate")
     self.event_log.append(Event("pirate", "{player%s} moved the pirate" % player_idx))
     self.pirate = pirate_loc
+    self._board_version += 1
     self.activate_robber(player_idx, adjacent_players)
 
   def activate_robber(self, current_player, adjacent_players):
@@ -1556,19 +1997,18 @@ class IslandersState:
 
   def hasten_invasion(self):
     if self.options.invasion_type == "barbarians":
-      remaining_barbarians = 30 - sum(t.barbarians for t in self.tiles.values())
-      remaining_barbarians -= sum(p.captured_barbarians for p in self.player_data)
-      to_place = min(remaining_barbarians, 3)
+      to_place = min(self.invasion.supply(self._captured_barbarians()), 3)
       rolls = []
       while len(rolls) < to_place:
         roll = random.randint(1, 6) + random.randint(1, 6)
         if roll not in rolls and roll != 7:
           rolls.append(roll)
-      # TODO: this will need to change for larger maps
-      center_locs = TileLocation(7, 5).get_adjacent_tiles() + [TileLocation(7, 5)]
+      center = self.center_tile()
+      center_locs = [center, *self.topology.tile_neighbors[center]]
+      tiles_by_number = self.tiles_by_number()
       for roll in rolls:
         matching_tiles = [
-          t for t in self.tiles.values() if t.location not in center_locs and t.number == roll
+          self.tiles[loc] for loc in tiles_by_number.get(roll, ()) if loc not in center_locs
         ]
         for tile in matching_tiles:
           if tile.barbarians >= 3:
@@ -1586,8 +2026,7 @@ class IslandersState:
     if not deserts:  # This should never happen.
       return
     for _ in range(count):
-      deserts.sort(key=lambda tile: tile.barbarians)
-      deserts[0].barbarians += 1
+      min(deserts, key=lambda tile: tile.barbarians).barbarians += 1
       self.invasion_countdown -= 1
     for tile in deserts:
       if tile.barbarians > 0:
@@ -1597,16 +2036,19 @@ class IslandersState:
   def invade(self, num):
     if self.invasion_countdown is None or self.invasion_countdown > 0:
       return
-    deserts = [tile for tile in self.tiles.values() if tile.tile_type == "norsrc"]
+    # Barbarians that have not invaded yet wait on the deserts.
+    occupied = self.invasion.occupied
+    deserts = [self.tiles[loc] for loc in occupied if self.tiles[loc].tile_type == "norsrc"]
     supply = sum(tile.barbarians for tile in deserts)
     if supply <= 0:
       return
 
-    matching = [tile for tile in self.tiles.values() if tile.number == num and tile.barbarians == 0]
+    matching = [self.tiles[loc] for loc in self.tiles_by_number().get(num, ())]
     eligible = []
     for tile in matching:
-      adjacents = tile.location.get_adjacent_tiles()
-      if any(adj in self.tiles and self.tiles[adj].barbarians > 0 for adj in adjacents):
+      if tile.barbarians:
+        continue
+      if any(adj in occupied for adj in self.topology.tile_neighbors[tile.location]):
         eligible.append(tile)
     # In case there are not enough barbarians to distribute, prioritize tiles closer to the desert.
     eligible.sort(key=lambda t: -t.location.x)
@@ -1618,11 +2060,11 @@ class IslandersState:
         break
       invaded.append(tile)
       tile.barbarians += 1
-      deserts.sort(key=lambda t: (-t.barbarians, t.location.y))
-      deserts[0].barbarians -= 1
+      desert = min(deserts, key=lambda t: (-t.barbarians, t.location.y))
+      desert.barbarians -= 1
       supply -= 1
-      if deserts[0].barbarians == 0:
-        cleared.append(deserts[0])
+      if desert.barbarians == 0:
+        cleared.append(desert)
     for tile in invaded:
       tile.conquered = True
       self.check_conquest(tile)
@@ -1648,6 +2090,7 @@ class IslandersState:
         if not piece.conquered:
           conquer_count[piece.piece_type] += 1
         piece.conquered = True
+        self._board_version += 1
         if piece.location in self.port_corners:
           self.recompute_ports(piece.player)
     conquer_text = " and ".join(f"{count} {kind}s" for kind, count in conquer_count.items())
@@ -1661,6 +2104,7 @@ class IslandersState:
       surrounding = [self.tiles[t] for t in road.location.get_adjacent_tiles() if t in self.tiles]
       if all(tile.conquered for tile in surrounding):
         road.conquered = True
+        self._board_version += 1
         players_to_check.add(road.player)
 
     for player in players_to_check:
@@ -1704,28 +2148,29 @@ class IslandersState:
       self.player_data[player].cards[resource] -= count
 
   def _check_road_building(self, location, player, road_type):
-    left_corner = location.corner_left
-    right_corner = location.corner_right
-    # Validate that the road does not go out of bounds.
-    if not all(loc in self.tiles for loc in location.get_end_tiles()):
+    topology = self.topology
+    # Validate that the road does not go out of bounds. Edges that are not in the topology do not
+    # touch any tile on the board.
+    end_tiles = topology.edge_end_tiles.get(location)
+    if end_tiles is None or not all(loc in self.tiles for loc in end_tiles):
       raise InvalidMove(f"You cannot place a {road_type} out of bounds.")
     # Validate that one side of the road is land.
     self._check_edge_type(location, road_type)
     # Validate that ships are not placed next to the pirate.
+    adjacent_tiles = topology.edge_tiles[location]
     if road_type == "ship":
-      adjacent_tiles = location.get_adjacent_tiles()
       if self.pirate in adjacent_tiles:
         raise InvalidMove("You cannot place a ship next to the pirate.")
     # Validate that this road is not surrounded by conquered tiles.
     # Note that both adjacent tiles are guaranteed to be in self.tiles because of _check_edge_type.
     if self.options.invasion_type == "barbarians":
-      if any(self.tiles[loc].conquered for loc in location.get_adjacent_tiles()):
+      if any(self.tiles[loc].conquered for loc in adjacent_tiles):
         raise InvalidMove(f"You cannot place a {road_type} next to a conquered tile.")
     else:
-      if all(self.tiles[loc].conquered for loc in location.get_adjacent_tiles()):
+      if all(self.tiles[loc].conquered for loc in adjacent_tiles):
         raise InvalidMove(f"You cannot place a {road_type} between two conquered tiles.")
     # Validate that this connects to either a settlement or another road.
-    for corner in [left_corner, right_corner]:
+    for corner in topology.edge_corners[location]:
       # Check whether this corner has one of the player's settlements.
       maybe_piece = self.pieces.get(corner)
       if maybe_piece:
@@ -1736,8 +2181,7 @@ class IslandersState:
           # Owned by another player - continue to the next corner.
           continue
       # If no settlement at this corner, check for other roads to this corner.
-      other_edges = corner.get_edges()
-      for edge in other_edges:
+      for edge in topology.corner_edges[corner]:
         if edge == location:
           continue
         if edge not in self.roads:
@@ -1760,16 +2204,16 @@ class IslandersState:
       raise InvalidMove("Your ship must be between two tiles, one of which must be water.")
     raise InvalidInput(f"Unknown road type {road_type}")
 
-  def _get_edge_type(self, edge_location):
+  def _get_edge_type(self, edge_location, ignore_roads=False):
     # First verify that there are tiles on both sides of this edge.
-    tile_locations = edge_location.get_adjacent_tiles()
-    if len(tile_locations) != 2:
+    tile_locations = self.topology.edge_tiles.get(edge_location)
+    if tile_locations is None:  # Not next to any corner of the board.
       return None
     if not all(loc in self.tiles for loc in tile_locations):
       return None
 
     # If there is a road/ship here, just return the type of that road/ship.
-    if edge_location in self.roads:
+    if not ignore_roads and edge_location in self.roads:
       return self.roads[edge_location].road_type
 
     # Calculate how many of the two tiles are land.
@@ -1786,8 +2230,8 @@ class IslandersState:
       return "road"
     if not any(are_lands):
       return "ship"
-    # For the coast, it matters whether the sea is on top or on bottom.
-    tile_locations.sort(key=lambda loc: loc.y)
+    # For the coast, it matters whether the sea is on top or on bottom. The topology's edge tiles
+    # are already sorted from top to bottom.
     if self.tiles[tile_locations[0]].is_land:
       return "coastdown"
     return "coastup"
@@ -1850,7 +2294,9 @@ class IslandersState:
     self.add_road(Road(loc, road_type, player))
 
   def _add_road(self, road):
+    road.location = self.topology.locations.get(road.location, road.location)
     self.roads[road.location] = road
+    self._board_version += 1
 
   def add_road(self, road):
     if road.road_type == "ship":
@@ -1909,23 +2355,82 @@ class IslandersState:
       self.longest_route_player = None
 
   def _calculate_longest_road(self, player):
-    # Get all corners of all roads for this player.
-    all_corners = set()
-    for road in self.roads.values():
-      if road.player != player:
+    # Split the player's roads into networks that a route cannot leave, and only search the
+    # networks that changed since the last time. Building a road or a settlement changes the one
+    # or two networks that it touches; every other network keeps its previous longest route.
+    corner_edges = collections.defaultdict(list)
+    for loc, road in self.roads.items():
+      if road.player == player and not road.conquered:
+        for corner in self.topology.edge_corners[loc]:
+          corner_edges[corner].append(loc)
+
+    old_lengths = self.route_lengths.get(player, {})
+    lengths = {}
+    for network, corners in self._route_networks(player, corner_edges):
+      pieces = {corner: self.pieces[corner].player for corner in corners if corner in self.pieces}
+      key = (
+        frozenset((edge, self.roads[edge].road_type) for edge in network),
+        frozenset(pieces.items()),
+      )
+      if key in old_lengths:
+        lengths[key] = old_lengths[key]
         continue
-      all_corners.add(road.location.corner_left)
-      all_corners.add(road.location.corner_right)
+      # For each corner where a longest route might start, do a DFS and find the depth.
+      starts = [
+        corner
+        for corner in corners
+        if not self._is_pass_through(player, corner_edges[corner], network, pieces.get(corner))
+      ]
+      starts = starts or corners[:1]  # The network is a single loop.
+      lengths[key] = max(self._dfs_depth(player, corner, set(), None, network) for corner in starts)
+    self.route_lengths[player] = lengths
+    return max(lengths.values(), default=0)
 
-    # For each corner, do a DFS and find the depth.
-    max_length = 0
-    for corner in all_corners:
-      seen = set()
-      max_length = max(max_length, self._dfs_depth(player, corner, seen, None))
+  def _route_networks(self, player, corner_edges):
+    """Groups the player's roads by which roads a single route could use together.
 
-    return max_length
+    Two roads are in the same network if they meet at a corner that a route can pass through:
+    one without another player's piece, where the roads are the same type or the player has a
+    settlement or city. Yields each network's roads and the corners they touch.
+    """
+    edge_corners = self.topology.edge_corners
+    remaining = {edge for edges in corner_edges.values() for edge in edges}
+    while remaining:
+      network = {remaining.pop()}
+      to_visit = list(network)
+      while to_visit:
+        edge = to_visit.pop()
+        road_type = self.roads[edge].road_type
+        for corner in edge_corners[edge]:
+          piece = self.pieces.get(corner)
+          if piece is not None and piece.player != player:
+            continue
+          for other in corner_edges[corner]:
+            if other not in remaining:
+              continue
+            if piece is None and self.roads[other].road_type != road_type:
+              continue
+            remaining.remove(other)
+            network.add(other)
+            to_visit.append(other)
+      corners = list({corner for edge in network for corner in edge_corners[edge]})
+      yield network, corners
+
+  def _is_pass_through(self, player, edges, network, piece_owner):
+    """Whether a corner joins exactly two roads in the network, and a route can go between them.
+
+    No longest route needs to start at such a corner: if it did not use the other road, it could
+    be made longer by starting with that road, and if it did, it is a loop that could start at
+    any of its other corners instead.
+    """
+    edges = [edge for edge in edges if edge in network]
+    if len(edges) != 2:
+      return False
+    if piece_owner is not None:
+      return piece_owner == player
+    return self.roads[edges[0]].road_type == self.roads[edges[1]].road_type
 
-  def _dfs_depth(self, player, corner, seen_edges, prev_edge):
+  def _dfs_depth(self, player, corner, seen_edges, prev_edge, network=None):
     # First, use the type of the piece at this corner to set a baseline. If it belongs to
     # another player, the route ends. If it belongs to this player, the next edge in the route
     # may be either a road or a ship. If there is no piece, then the type of the next edge
@@ -1948,10 +2453,12 @@ class IslandersState:
     # Next, get the three corners next to this corner. We can determine an edge from each one,
     # and we will throw away any edges that either do not belong to the player or that we have
     # seen before or that do not match our expected edge type or that are conquered.
-    unseen_edges = [edge for edge in corner.get_edges() if edge not in seen_edges]
+    topology = self.topology
     valid_edges = []
-    for edge in unseen_edges:
-      if edge not in self.roads:
+    for edge in topology.corner_edges[corner]:
+      if edge in seen_edges or edge not in self.roads:
+        continue
+      if network is not None and edge not in network:
         continue
       road = self.roads[edge]
       if road.player == player and road.road_type in valid_types and not road.conquered:
@@ -1959,9 +2466,10 @@ class IslandersState:
 
     max_depth = 0
     for edge in valid_edges:
-      other_corner = edge.corner_left if edge.corner_right == corner else edge.corner_right
+      left, right = topology.edge_corners[edge]
+      other_corner = left if right == corner else right
       seen_edges.add(edge)
-      sub_depth = self._dfs_depth(player, other_corner, seen_edges, edge)
+      sub_depth = self._dfs_depth(player, other_corner, seen_edges, edge, network)
       max_depth = max(max_depth, 1 + sub_depth)
       seen_edges.remove(edge)
     return max_depth
@@ -1982,66 +2490,69 @@ class IslandersState:
     raise InvalidMove("Ships must be connected to your ship network.")
 
   def recalculate_ships(self, source, player_idx):
-    self._ship_dfs_helper(source, player_idx, [], set(), source, None)
-
-  def _ship_dfs_helper(self, source, player_idx, path, seen, corner, prev):
-    seen.add(corner)
-    edges = corner.get_edges()
-    outgoing_edges = []
+    """Updates movable and closed for the player's ships that are connected to source.
 
-    # First, calculate all the outgoing edges.
-    for edge in edges:
-      # This is the edge we just walked down, ignore it.
-      if edge == prev:
-        continue
-      other_corner = edge.corner_left if edge.corner_right == corner else edge.corner_right
-      # If this edge does not have this player's ship on it, skip it.
-      maybe_ship = self.roads.get(edge)
-      if not maybe_ship or maybe_ship.road_type != "ship" or maybe_ship.player != player_idx:
-        continue
-      # Now we know there is a ship from corner to other_corner.
-      outgoing_edges.append((edge, other_corner))
-
-    # Then, mark this ship as either movable or unmovable based on number of outgoing edges.
-    if path:  # Skipped for the very first corner, since there is no previous edge.
-      if len(outgoing_edges) == 0:
-        self.roads[path[-1]].movable = True
-      else:
-        self.roads[path[-1]].movable = False
-
-    # Lastly, continue the DFS. Order matters: this may mark some ships as movable that were
-    # previous considered unmovable, overriding that decision (because of cycles).
-    for edge, other_corner in outgoing_edges:
-      if other_corner == source:
-        # Here, we have circled back around to the start. We must mark the two edges at the
-        # beginning and end of the path as movable. We do not touch the rest.
-        self.roads[path[0]].movable = True
-        self.roads[edge].movable = True
+    Only the ships reachable from source through the player's other ships are recalculated. A ship
+    is closed if it lies on a route from source to another of the player's settlements or cities.
+    A ship is movable if it is at the open end of a route, or if it is part of a loop that does not
+    pass through source. A loop that starts and ends at source is a route with two ends, so only
+    the first and last ships of that loop are movable.
+    """
+    topology = self.topology
+    neighbors = {}  # corner -> [(edge, other corner)] for every ship in this network
+    to_visit = [source]
+    while to_visit:
+      corner = to_visit.pop()
+      if corner in neighbors:
         continue
-      if other_corner in seen:
-        # Here, we have created a loop. Every ship on this loop may be movable.
-        start_idx = None
-        for idx, rloc in reversed(list(enumerate(path))):
-          if other_corner in [rloc[:2], rloc[2:]]:
-            start_idx = idx
-            break
-        else:
-          raise RuntimeError("What happened here? This shouldn't be physically possible.")
-        for idx in range(start_idx, len(path)):
-          self.roads[path[idx]].movable = True
-        self.roads[edge].movable = True
+      neighbors[corner] = []
+      # corner_edges and corner_neighbors are in the same order: edge i leads to neighbor i.
+      adjacent = zip(topology.corner_edges[corner], topology.corner_neighbors[corner])
+      for edge, other_corner in adjacent:
+        maybe_ship = self.roads.get(edge)
+        if not maybe_ship or maybe_ship.road_type != "ship" or maybe_ship.player != player_idx:
+          continue
+        neighbors[corner].append((edge, other_corner))
+        to_visit.append(other_corner)
+
+    blocks = _biconnected_blocks(source, neighbors, None, {})
+    # Ships on a loop that avoids source are the ones that stay on a loop once source is removed.
+    avoiding_source = set()
+    if any(len(block) > 1 for _, block in blocks):
+      discovered = {source: None}
+      for corner in neighbors:
+        if corner not in discovered:
+          for _, block in _biconnected_blocks(corner, neighbors, source, discovered):
+            if len(block) > 1:
+              avoiding_source.update(block)
+
+    # Each block hangs from the corner closest to source, and every other corner of the block hangs
+    # from it. A ship is on a route from source to another settlement exactly when its block is on
+    # the way from that settlement back to source.
+    hangs_from = {}  # corner -> index of the block that leads back to source
+    for idx, (head, block) in enumerate(blocks):
+      for edge in block:
+        ship = self.roads[edge]
+        if len(block) > 1:
+          ship.movable = edge in avoiding_source or source in topology.edge_corners[edge]
+        for corner in topology.edge_corners[edge]:
+          if corner != head:
+            hangs_from[corner] = idx
+            if len(block) == 1:  # A bridge can only move if nothing is connected beyond it.
+              ship.movable = len(neighbors[corner]) == 1
+
+    closed_blocks = set()
+    for corner in neighbors:
+      maybe_piece = self.pieces.get(corner)
+      if corner == source or not maybe_piece or maybe_piece.player != player_idx:
         continue
-      maybe_piece = self.pieces.get(other_corner)
-      if maybe_piece and maybe_piece.player == player_idx:
-        # Here, we know that there is a shipping route from one of the player's settlements to
-        # another. Every ship on this shipping route is considered closed.
-        for rloc in path + [edge]:
-          self.roads[rloc].closed = True
-      # Now we know this ship does not create a loop, so we continue to explore the far corner.
-      path.append(edge)
-      self._ship_dfs_helper(source, player_idx, path, seen, other_corner, edge)
-      path.pop()
-    seen.remove(corner)
+      route_corner = corner
+      while route_corner != source and hangs_from[route_corner] not in closed_blocks:
+        closed_blocks.add(hangs_from[route_corner])
+        route_corner = blocks[hangs_from[route_corner]][0]
+    for idx in closed_blocks:
+      for edge in blocks[idx][1]:
+        self.roads[edge].closed = True
 
   def handle_move_ship(self, from_location, to_location, player_idx):
     from_loc = parse_location(from_location, EdgeLocation)
@@ -2109,6 +2620,8 @@ class IslandersState:
           self.player_data[road.player].cards[tile.tile_type] += 1
         if tile.tile_type == "anyrsrc":
           collect_counts[road.player] += 1
+    for tile in discovered:
+      self._join_island(tile)
     if collect_counts:
       self.collect_counts.update(collect_counts)
       self.action_stack.append("collect")
@@ -2280,10 +2793,44 @@ class IslandersState:
         raise InvalidMove("You already placed your settlement; now you must build a road.")
     else:
       self._check_main_phase("settle", "build a settlement")
+    self._check_settlement_location(loc, player)
+    # Handle special settlement phase.
+    if self.turn_phase == "settle":
+      piece_type = self.options.placements[self.PLACEMENTS.index(self.game_phase)]
+      self.add_piece(Piece(loc.x, loc.y, piece_type, player))
+      self.event_log.append(Event(piece_type, "{player%s} built a %s" % (player, piece_type)))
+      self.action_stack.pop()
+      self.next_action()
+      if self.PLACEMENTS.index(self.game_phase) == len(self.options.placements) - 1:
+        self.give_second_resources(player, loc)
+      return
+    # Check player has enough settlements left.
+    settle_count = len(
+      [p for p in self.pieces.values() if p.player == player and p.piece_type == "settlement"]
+    )
+    if settle_count >= 5:
+      raise InvalidMove("You have no settlements remaining.")
+    # Check resources and deduct from player.
+    resources = [("rsrc1", 1), ("rsrc2", 1), ("rsrc3", 1), ("rsrc4", 1)]
+    self._remove_resources(resources, player, "build a settlement")
+
+    self.event_log.append(Event("settlement", "{player%s} built a settlement" % player))
+    self.add_piece(Piece(loc.x, loc.y, "settlement", player))
+    self.hasten_invasion()
+
+  def _check_settlement_location(self, loc, player):
+    topology = self.topology
+    if loc in topology.corner_tiles:
+      corner_tiles = topology.corner_tiles[loc]
+      corner_edges = topology.corner_edges[loc]
+      neighbors = topology.corner_neighbors[loc]
+    else:  # Not on the board.
+      corner_tiles, corner_edges = loc.get_tiles(), loc.get_edges()
+      neighbors = loc.get_adjacent_corners()
     # Check nothing else is already there.
     if loc in self.pieces:
       raise InvalidMove("You cannot settle on top of another player's settlement.")
-    for adjacent in loc.get_adjacent_corners():
+    for adjacent in neighbors:
       if adjacent in self.pieces:
         raise InvalidMove("You cannot place a settlement next to existing settlement.")
     # Handle special settlement phase.
@@ -2295,50 +2842,37 @@ class IslandersState:
           raise InvalidMove("You cannot place your starting %s in that area." % piece_type)
       else:
         on_land = False
-        for tile_loc in loc.get_tiles():
+        for tile_loc in corner_tiles:
           if tile_loc not in self.tiles:
             raise InvalidMove("You must place your %s in bounds." % piece_type)
           if self.tiles[tile_loc].is_land:
             on_land = True
         if not on_land:
           raise InvalidMove("You must place your starting %s on land." % piece_type)
-      self.add_piece(Piece(loc.x, loc.y, piece_type, player))
-      self.event_log.append(Event(piece_type, "{player%s} built a %s" % (player, piece_type)))
-      self.action_stack.pop()
-      self.next_action()
-      if self.PLACEMENTS.index(self.game_phase) == len(self.options.placements) - 1:
-        self.give_second_resources(player, loc)
       return
     # Check connected to one of the player's roads.
-    for edge_loc in loc.get_edges():
+    for edge_loc in corner_edges:
       maybe_road = self.roads.get(edge_loc)
       if maybe_road and maybe_road.player == player:
         break
     else:
       raise InvalidMove("You must place your settlement next to one of your roads.")
+    # Ships can reach corners that are surrounded by water.
+    if not any(tile in self.tiles and self.tiles[tile].is_land for tile in corner_tiles):
+      raise InvalidMove("You must place your settlement on land.")
     # Check that this is not a conquered corner.
+    conquered_tiles = self.invasion.conquered_corners[loc]
     if self.options.invasion_type == "barbarians":
-      if any(tile in self.tiles and self.tiles[tile].conquered for tile in loc.get_tiles()):
+      if conquered_tiles:
         raise InvalidMove("You cannot place your settlement next to a conquered tile.")
     else:
-      if all(tile in self.tiles and self.tiles[tile].conquered for tile in loc.get_tiles()):
+      if conquered_tiles == len(corner_tiles):
         raise InvalidMove("You cannot place your settlement on a conquered corner.")
-    # Check player has enough settlements left.
-    settle_count = len(
-      [p for p in self.pieces.values() if p.player == player and p.piece_type == "settlement"]
-    )
-    if settle_count >= 5:
-      raise InvalidMove("You have no settlements remaining.")
-    # Check resources and deduct from player.
-    resources = [("rsrc1", 1), ("rsrc2", 1), ("rsrc3", 1), ("rsrc4", 1)]
-    self._remove_resources(resources, player, "build a settlement")
-
-    self.event_log.append(Event("settlement", "{player%s} built a settlement" % player))
-    self.add_piece(Piece(loc.x, loc.y, "settlement", player))
-    self.hasten_invasion()
 
   def _add_piece(self, piece):
+    piece.location = self.topology.locations.get(piece.location, piece.location)
     self.pieces[piece.location] = piece
+    self._board_version += 1
 
   def add_piece(self, piece):
     self._add_piece(piece)
@@ -2367,10 +2901,14 @@ class IslandersState:
     if self.game_phase.startswith("place"):
       self.home_corners[piece.player].append(piece.location)
     else:
-      home_settled = [self.corners_to_islands[loc] for loc in self.home_corners[piece.player]]
-      foreign_landed = [self.corners_to_islands[loc] for loc in self.foreign_landings[piece.player]]
-      current_island = self.corners_to_islands[piece.location]
-      if current_island not in home_settled + foreign_landed:
+      home_settled = [self.corners_to_islands.get(loc) for loc in self.home_corners[piece.player]]
+      foreign_landed = [
+        self.corners_to_islands.get(loc) for loc in self.foreign_landings[piece.player]
+      ]
+      # Corners next to only the sea and tiles without numbers (e.g. the desert) are not part of
+      # any island, unless the scenario counts those tiles as connecting islands.
+      current_island = self.corners_to_islands.get(piece.location)
+      if current_island is not None and current_island not in home_settled + foreign_landed:
         self.event_log.append(Event("landing", "{player%s} settled on a new island" % piece.player))
         self.foreign_landings[piece.player].append(piece.location)
 
@@ -2513,8 +3051,7 @@ class IslandersState:
     self.next_action()
 
   def _handle_repelling_knight(self):
-    removable = [tile for tile in self.tiles.values() if tile.number and tile.barbarians]
-    if not removable:
+    if not any(self.tiles[loc].number for loc in self.invasion.occupied):
       raise InvalidMove("There are no barbarians that can be removed.")
     self.action_stack.append("expel")
     self.next_action()
@@ -2523,6 +3060,15 @@ class IslandersState:
     if self.turn_phase not in ["knight", "fastknight"]:
       raise InvalidMove("You cannot place any knights right now.")
     location = parse_location(loc, EdgeLocation)
+    self._check_knight_location(location)
+
+    self.knights[location] = Knight(location, player_idx, location)
+    self._board_version += 1
+    self.event_log.append(Event("knight", "{player%s} built a knight" % player_idx))
+    self.action_stack.pop()
+    self.next_action()
+
+  def _check_knight_location(self, location):
     if self.turn_phase == "knight":
       castles = [tile for tile in self.tiles.values() if tile.tile_type == "castle"]
       castle_edges = set(sum([tile.location.get_edge_locations() for tile in castles], []))
@@ -2535,11 +3081,6 @@ class IslandersState:
     if location in self.knights:
       raise InvalidMove("There is already a knight there.")
 
-    self.knights[location] = Knight(location, player_idx, location)
-    self.event_log.append(Event("knight", "{player%s} built a knight" % player_idx))
-    self.action_stack.pop()
-    self.next_action()
-
   def handle_move_knight(self, from_loc, to_loc, player_idx):
     if self.turn_phase != "move_knights":
       raise InvalidMove("You cannot move your knights right now.")
@@ -2562,6 +3103,7 @@ class IslandersState:
     knight.location = to_location
     knight.movement = orig_movement - distance
     self.knights[to_location] = knight
+    self._board_version += 1
 
   def _bfs_search(self, start, target):
     if start == target:
@@ -2605,24 +3147,24 @@ class IslandersState:
     """
     valid_dests = 0
     valid_srcs = 0
-    for tile in self.tiles.values():
-      if not tile.is_land or not tile.number:
-        continue  # Exclude both sea tiles and the castle/desert
-      adjacent = tile.location.get_adjacent_tiles()
-      if all(loc in self.tiles and self.tiles[loc].is_land for loc in adjacent):
-        continue  # Landlocked tiles cannot have barbarians
+    # Landlocked tiles cannot have barbarians.
+    for loc in self.invasion.coastal:
+      tile = self.tiles[loc]
+      if not tile.number:
+        continue  # Exclude the castle/desert
       if tile.barbarians < 3:
         valid_dests += 1
       if tile.barbarians > 0:
         valid_srcs += 1
 
-    tile_barbarians = sum(t.barbarians for t in self.tiles.values())
-    captured_barbarians = sum(p.captured_barbarians for p in self.player_data)
-    supply = 30 - captured_barbarians - tile_barbarians
+    supply = self.invasion.supply(self._captured_barbarians())
     dest_count = min(valid_dests, valid_srcs + supply, 2)
     src_count = min(valid_srcs, dest_count, 2)
     return src_count, dest_count
 
+  def _captured_barbarians(self):
+    return sum(player.captured_barbarians for player in self.player_data)
+
   def handle_treason(self, froma, fromb, toa, tob, player_idx):
     if self.turn_phase != "treason":
       raise InvalidMove("You cannot use the treason card right now.")
@@ -2670,7 +3212,7 @@ class IslandersState:
       if not self.tiles[source].barbarians:
         raise InvalidMove("You must remove barbarians from tiles with barbarians on them.")
     for dest in dests:
-      if all(loc in self.tiles and self.tiles[loc].is_land for loc in dest.get_adjacent_tiles()):
+      if self.tiles[dest].is_land and dest not in self.invasion.coastal:
         raise InvalidMove("You must place the barbarian on a coastal tile.")
       if not self.tiles[dest].number:
         raise InvalidMove("You must place the barbarian on a numbered tile.")
@@ -2767,6 +3309,7 @@ class IslandersState:
     losses = [knight for idx, knight in enumerate(surrounding) if idx % 3 == direction and knight]
     for loss in losses:
       del self.knights[loss.location]
+      self._board_version += 1
       self.player_data[loss.player].cards["gold"] += 3
     player_losses = collections.Counter(knight.player for knight in losses)
     for player, count in player_losses.items():
@@ -2840,12 +3383,14 @@ class IslandersState:
     for corner in tile.location.get_corner_locations():
       if corner in self.pieces:
         self.pieces[corner].conquered = False
+        self._board_version += 1
         if corner in self.port_corners:
           self._add_player_port(corner, self.pieces[corner].player)
     players_to_check = set()
     for edge in tile.location.get_edge_locations():
       if edge in self.roads:
         self.roads[edge].conquered = False
+        self._board_version += 1
         players_to_check.add(self.roads[edge].player)
 
     for player in players_to_check:
@@ -3084,7 +3629,33 @@ class IslandersState:
     )
 
   def add_tile(self, tile):
+    old_tile = self.tiles.get(tile.location)
+    if old_tile is not None:
+      self.invasion.remove_tile(old_tile)
+      old_tile.on_change = None
     self.tiles[tile.location] = tile
+    tile.on_change = self._tile_changed
+    self._board_version += 1
+    self.invasion.add_tile(tile)
+    self._topology = None
+    self._number_index.clear()
+
+  def _tile_changed(self, tile, attr, old, new):
+    """Keeps the counters and indexes of the board up to date when one of its tiles changes."""
+    if attr == "number":
+      self._number_index.clear()
+    elif attr == "barbarians":
+      self.invasion.barbarians_changed(tile, old, new)
+    elif attr == "conquered":
+      self.invasion.conquered_changed(tile, old, new)
+    if attr in ("is_land", "conquered"):
+      self._board_version += 1
+
+  @property
+  def topology(self):
+    if self._topology is None:
+      self._topology = board_topology(frozenset(self.tiles))
+    return self._topology
 
   def add_port(self, port):
     self.ports[port.location] = port
@@ -3093,7 +3664,7 @@ class IslandersState:
     # Go back and figure out which ones are corners.
     # TODO: unit test this function.
     for location, tile_data in self.tiles.items():
-      locs = location.get_adjacent_tiles()
+      locs = self.topology.tile_neighbors[location]
       exists = [loc in self.tiles for loc in locs]
       tile_rotation = tile_data.rotation
       if exists.count(True) > 4:
@@ -3109,10 +3680,19 @@ class IslandersState:
           tile_data.variant = "edgeright"
 
   def _compute_coast(self):
+    self.invasion.coastal = frozenset(
+      location
+      for location, tile_data in self.tiles.items()
+      if tile_data.is_land
+      and not all(
+        loc in self.tiles and self.tiles[loc].is_land
+        for loc in self.topology.tile_neighbors[location]
+      )
+    )
     for location, tile_data in self.tiles.items():
       if tile_data.is_land:
         continue
-      adjacent_tiles = [self.tiles.get(loc) for loc in location.get_adjacent_tiles()]
+      adjacent_tiles = [self.tiles.get(loc) for loc in self.topology.tile_neighbors[location]]
       lands = [
         idx
         for idx, tile in enumerate(adjacent_tiles)
@@ -3159,6 +3739,15 @@ class IslandersState:
     if empty:
       self.robber = empty[0].location
 
+  def center_tile(self):
+    """Returns the land tile closest to the middle of all of the land on the board."""
+    land = [loc for loc, tile in self.tiles.items() if tile.is_land]
+    mid_x = sum(loc.x for loc in land) / len(land)
+    mid_y = sum(loc.y for loc in land) / len(land)
+    # Tiles are 3 units apart horizontally, but only 2 units apart vertically, so one unit of height
+    # is sqrt(3) times as long as one unit of width.
+    return min(land, key=lambda loc: ((loc.x - mid_x) ** 2 + 3 * (loc.y - mid_y) ** 2, loc))
+
   def _compute_ports(self):
     self.port_corners.clear()
     for port in self.ports.values():
@@ -3212,19 +3801,18 @@ class IslandersState:
 
   def _compute_contiguous_islands(self):
     self.corners_to_islands.clear()
-    # Group the corners together into sets that each represent an island.
+    topology = self.topology
+    # Group the tiles and corners together into sets that each represent an island.
     seen_tiles = set()
-    islands = []
     for location, tile in self.tiles.items():
       if location in seen_tiles:
         continue
       if not self._is_connecting_tile(tile):
         continue
       seen_tiles.add(location)
-      islands.append(set())
-      for corner_loc in tile.location.get_corner_locations():
-        islands[-1].add(corner_loc)
-      loc_stack = tile.location.get_adjacent_tiles()
+      island_tiles = [location]
+      corners = set(topology.tile_corners[location])
+      loc_stack = list(topology.tile_neighbors[location])
       while loc_stack:
         next_loc = loc_stack.pop()
         if next_loc in seen_tiles:
@@ -3234,15 +3822,19 @@ class IslandersState:
         if not self._is_connecting_tile(self.tiles[next_loc]):
           continue
         seen_tiles.add(next_loc)
-        for corner_loc in next_loc.get_corner_locations():
-          islands[-1].add(corner_loc)
-        loc_stack.extend(next_loc.get_adjacent_tiles())
+        island_tiles.append(next_loc)
+        corners.update(topology.tile_corners[next_loc])
+        loc_stack.extend(topology.tile_neighbors[next_loc])
+      self.corners_to_islands.add_island(island_tiles, corners)
+
+  def _join_island(self, tile):
+    """Adds a tile that may have just become part of an island, e.g. by being discovered.
 
-    # Convert a group of sets into a map of corner -> canonical corner.
-    for corner_set in islands:
-      canonical_corner = min(corner_set)
-      for corner in corner_set:
-        self.corners_to_islands[corner] = canonical_corner
+    Tiles are never taken out of an island this way: a discovered tile that turns out to be water
+    stays on its island until the islands are computed again (see TreasureIslands.post_load).
+    """
+    if self._is_connecting_tile(tile):
+      self.corners_to_islands.add_tile(tile.location, tile.location.get_corner_locations())
 
   def recompute(self):
     self._compute_contiguous_islands()
@@ -3251,6 +3843,31 @@ class IslandersState:
     self._compute_ports()
 
 
+MapTemplate = collections.namedtuple(
+  "MapTemplate", ["tiles", "ports", "treasures", "pieces", "roads"]
+)
+
+
+@functools.lru_cache(maxsize=64)
+def map_template(filename):
+  """Parses a map file in this directory into a MapTemplate, reading each file only once.
+
+  The template's objects are shared between games; see Scenario.load_file for copying them.
+  """
+  with open(os.path.join(os.path.dirname(__file__), filename), encoding="ascii") as data:
+    json_data = json.load(data)
+  return MapTemplate(
+    tuple(Tile.parse_json(value) for value in json_data["tiles"]),
+    tuple(Port.parse_json(value) for value in json_data["ports"]),
+    tuple(
+      (CornerLocation(*value["location"]), value["treasure_type"])
+      for value in json_data.get("treasures", [])
+    ),
+    tuple(Piece.parse_json(value) for value in json_data.get("pieces", [])),
+    tuple(Road.parse_json(value) for value in json_data.get("roads", [])),
+  )
+
+
 class Scenario(metaclass=abc.ABCMeta):
   @classmethod
   @abc.abstractmethod
@@ -3262,17 +3879,26 @@ class Scenario(metaclass=abc.ABCMeta):
   def init(cls, state):
     raise NotImplementedError
 
-  @classmethod  # noqa: B027
+  @classmethod
   def mutate_options(cls, options):
-    pass
+    # Most maps have their resources and numbers placed by hand, so they cannot be balanced.
+    options["balanced_board"].force(False)
 
   @classmethod
-  def load_file(cls, state, filename):
-    with open(os.path.join(os.path.dirname(__file__), filename), encoding="ascii") as data:
-      json_data = json.load(data)
-      state.parse_tiles(json_data["tiles"])
-      state.parse_ports(json_data["ports"])
-      state.parse_treasures(json_data.get("treasures", []))
+  def load_file(cls, state, filename, *, pieces=False):
+    """Adds a map's tiles, ports, and treasures to the state, and its pieces and roads if asked."""
+    # pylint: disable=protected-access
+    template = map_template(filename)
+    for tile in template.tiles:
+      state.add_tile(tile.copy())
+    for port in template.ports:
+      state.add_port(port.copy())
+    state.treasures.update(template.treasures)
+    if pieces:
+      for piece in template.pieces:
+        state._add_piece(piece.copy())  # noqa: SLF001
+      for road in template.roads:
+        state._add_road(road.copy())  # noqa: SLF001
     state.recompute()
 
   @classmethod  # noqa: B027
@@ -3309,36 +3935,31 @@ class StandardMap(Scenario):
     else:
       corner_choice = random.choice([(7, 1), (-2, 4), (-2, 8)])
       state.init_numbers(corner_choice, EXTRA_NUMBERS)
+    if state.options.balanced_board:
+      balance.balance(state, land_locs, balance.FAIR, rng=random)
     state.shuffle_ports()
     state.recompute()
     state.init_dev_cards()
     state.init_robber()
 
+  @classmethod
+  def mutate_options(cls, options):
+    # Every tile and number is shuffled, so unlike other maps, this one can be balanced.
+    pass
+
 
 class BeginnerMap(Scenario):
   @classmethod
   def preview(cls, state):
     filename = "beginner4.json" if len(state.player_data) >= 4 else "beginner3.json"
-    with open(os.path.join(os.path.dirname(__file__), filename), encoding="ascii") as data:
-      json_data = json.load(data)
-      state.parse_tiles(json_data["tiles"])
-      state.parse_ports(json_data["ports"])
-      state.parse_pieces(json_data["pieces"])
-      state.parse_roads(json_data["roads"])
-    state.recompute()
+    cls.load_file(state, filename, pieces=True)
 
   @classmethod
   def init(cls, state):
     if len(state.player_data) < 3 or len(state.player_data) > 4:
       raise InvalidPlayer("Must have between 3 and 4 players.")
     filename = "beginner4.json" if len(state.player_data) == 4 else "beginner3.json"
-    with open(os.path.join(os.path.dirname(__file__), filename), encoding="ascii") as data:
-      json_data = json.load(data)
-      state.parse_tiles(json_data["tiles"])
-      state.parse_ports(json_data["ports"])
-      state.parse_pieces(json_data["pieces"])
-      state.parse_roads(json_data["roads"])
-    state.recompute()
+    cls.load_file(state, filename, pieces=True)
     state.init_dev_cards()
     state.init_robber()
     state.give_second_resources(0, CornerLocation(6, 4))
@@ -3351,6 +3972,7 @@ class BeginnerMap(Scenario):
 
   @classmethod
   def mutate_options(cls, options):
+    super().mutate_options(options)
     options["friendly_robber"].default = True
 
 
@@ -3377,6 +3999,7 @@ class SeafarerScenario(Scenario, metaclass=abc.ABCMeta):
 
   @classmethod
   def mutate_options(cls, options):
+    super().mutate_options(options)
     options["seafarers"].force(True)
     options["pirate"].force(True)
     options["foreign_island_points"].default = 2
@@ -3787,7 +4410,7 @@ class BarbariansAttack(Scenario):
   @classmethod
   def preview(cls, state):
     cls.load_file(state, "barbarians4.json")
-    center = TileLocation(7, 5)
+    center = state.center_tile()
     center_tiles = [center] + center.get_adjacent_tiles()
     for tile in state.tiles.values():
       if tile.is_land and tile.number:
@@ -3801,7 +4424,7 @@ class BarbariansAttack(Scenario):
     if len(state.player_data) < 3 or len(state.player_data) > 4:
       raise InvalidPlayer("Must have between 3 and 4 players.")
     cls.load_file(state, "barbarians4.json")
-    center = TileLocation(7, 5)
+    center = state.center_tile()
     center_locs = [center] + center.get_adjacent_tiles()
     outer_locs = [
       loc for loc, tile in state.tiles.items() if tile.number and tile.location not in center_locs
@@ -3849,6 +4472,7 @@ class MapMakerState(IslandersState):
       else:
         num += 1
       self.tiles[loc].number = num
+      self._update_islands(self.tiles[loc])
       return
     if self.turn_idx == 1:
       # Ports
@@ -3891,10 +4515,18 @@ class MapMakerState(IslandersState):
     else:
       self.tiles[loc].is_land = False
       self.tiles[loc].number = None
+    self._update_islands(self.tiles[loc])
     for location in loc.get_adjacent_tiles():
       if location not in self.tiles:
         self.add_tile(Tile(location.x, location.y, "space", False, None))
 
+  def _update_islands(self, tile):
+    if tile.location in self.corners_to_islands.tiles and not self._is_connecting_tile(tile):
+      # The tile may have split its island in two, which cannot be undone one tile at a time.
+      self._compute_contiguous_islands()
+    else:
+      self._join_island(tile)
+
 
 class MapMaker(Scenario):
   @classmethod
@@ -3912,6 +4544,26 @@ class MapMaker(Scenario):
       state.player_data[2].name = "rotations"
 
 
+@functools.lru_cache(maxsize=64)
+def scenario_preview(game_class, scenario, num_players):
+  """Returns the board that players see in the lobby before the game starts.
+
+  Returns the board as JSON, without the player data or options, and each player's points. The
+  preview only depends on the number of players, so lobbies with the same scenario share it.
+  """
+  state = game_class()
+  state.player_data = [Player(None, None) for _ in range(num_players)]
+  try:
+    scenario.mutate_options(state.options)
+    scenario.preview(state)
+  except Exception:  # pylint: disable=broad-except # noqa: BLE001
+    state.add_tile(Tile(1, 1, "randomized", True, None))
+  data = state.for_player(None)
+  points = tuple(player["points"] for player in data.pop("player_data"))
+  del data["options"]
+  return json.dumps(data, cls=CustomEncoder), points
+
+
 class IslandersGame(BaseGame):
   # The order of this dictionary determines the method resolution order of the created class.
   SCENARIOS = collections.OrderedDict(  # noqa: RUF012
@@ -3943,6 +4595,9 @@ class IslandersGame(BaseGame):
     # player_sessions starts as a map of session to Player. once the game
     # starts, it becomes a map of session to player_index. TODO: cleanup.
     self.player_sessions = collections.OrderedDict()
+    # The encoded lobby state shared by all sessions; cleared whenever the lobby changes.
+    self._lobby_json = None
+    self.event_log_views = eventlog.Views(Event.for_player)
 
   def game_url(self, game_id):
     return f"/islanders/islanders.html?game_id={game_id}"
@@ -3980,45 +4635,84 @@ class IslandersGame(BaseGame):
 
   def for_player(self, session):
     if self.game is None:
-      player_idx = None
-      if session in self.player_sessions:
-        player_idx = list(self.player_sessions.keys()).index(session)
+      return SpliceJson(self.lobby_json(), self._lobby_overlay(session))
+
+    output = self.game.for_player(self.player_sessions.get(session))
+    self._add_connection_info(output)
+    return json.dumps(output, cls=CustomEncoder)
+
+  def for_players(self, sessions):
+    if self.game is None:
+      lobby = self.lobby_json()
+      # Only the host and the players have their own view; spectators share one.
+      overlays = {}
+      output = {}
+      for session in sessions:
+        key = session if session == self.host or session in self.player_sessions else None
+        if key not in overlays:
+          overlays[key] = SpliceJson(lobby, self._lobby_overlay(session))
+        output[session] = overlays[key]
+      return output
+    shared = self.game.shared_json()
+    self._add_connection_info(shared)
+    encoded = json.dumps(shared, cls=CustomEncoder)
+    # Spectators (and multiple tabs for the same player) share a single overlay.
+    overlays = {}
+    output = {}
+    for session in sessions:
+      player_idx = self.player_sessions.get(session)
+      if player_idx not in overlays:
+        overlays[player_idx] = SpliceJson(encoded, self.game.player_json(player_idx))
+      output[session] = overlays[player_idx]
+    return output
+
+  def event_views(self, sessions):
+    if self.game is None:
+      return {}
+    views = {}
+    for session in sessions:
+      player_idx = self.player_sessions.get(session)
+      if player_idx not in views:
+        views[player_idx] = self.event_log_views.view(self.game.event_log, player_idx)
+    return {session: views[self.player_sessions.get(session)] for session in sessions}
+
+  def lobby_json(self):
+    """Returns the encoded lobby state that every session sees before the game starts."""
+    if self._lobby_json is None:
       # TODO: update the javascript to handle undefined values for all of the attributes of
       # the state object that we don't have before the game starts.
-      tmp_game = self.game_class()
-      tmp_game.player_data = list(self.player_sessions.values())
-      try:
-        self.SCENARIOS[self.scenario].mutate_options(tmp_game.options)
-        self.SCENARIOS[self.scenario].preview(tmp_game)
-      except Exception:  # pylint: disable=broad-except # noqa: BLE001
-        tmp_game.add_tile(Tile(1, 1, "randomized", True, None))
-      data = tmp_game.for_player(None)
-      data.update(
-        {
-          "type": "game_state",
-          "host": self.host == session,
-          "you": player_idx,
-          "started": False,
-          "colors": sorted(self.COLORS - {p.color for p in self.player_sessions.values()}),
-        }
-      )
-
-      data["options"] = collections.OrderedDict([(key, self.choices[key]) for key in self.choices])
-      data["scenario"] = GameOption(
-        name="Scenario",
-        default=next(iter(self.SCENARIOS.keys())),
-        choices=list(self.SCENARIOS.keys()),
-        value=self.scenario,
+      board, points = scenario_preview(
+        self.game_class, self.SCENARIOS[self.scenario], len(self.player_sessions)
       )
+      player_data = [player.json_for_player(False) for player in self.player_sessions.values()]
+      for player_json, count in zip(player_data, points):
+        player_json["points"] = count
+      data = {
+        "player_data": player_data,
+        "started": False,
+        "colors": sorted(self.COLORS - {p.color for p in self.player_sessions.values()}),
+        "options": collections.OrderedDict([(key, self.choices[key]) for key in self.choices]),
+        "scenario": GameOption(
+          name="Scenario",
+          default=next(iter(self.SCENARIOS.keys())),
+          choices=list(self.SCENARIOS.keys()),
+          value=self.scenario,
+        ),
+      }
+      self._lobby_json = SpliceJson(board, data)
+    return self._lobby_json
 
-      return json.dumps(data, cls=CustomEncoder)
+  def _lobby_overlay(self, session):
+    player_idx = None
+    if session in self.player_sessions:
+      player_idx = list(self.player_sessions.keys()).index(session)
+    return {"host": self.host == session, "you": player_idx}
 
-    output = self.game.for_player(self.player_sessions.get(session))
+  def _add_connection_info(self, output):
     output["started"] = True
     is_connected = {idx: sess in self.connected for sess, idx in self.player_sessions.items()}
     for idx in range(len(output["player_data"])):
       output["player_data"][idx]["disconnected"] = not is_connected.get(idx, False)
-    return json.dumps(output, cls=CustomEncoder)
 
   def connect_user(self, session):
     self.connected.add(session)
@@ -4035,6 +4729,7 @@ class IslandersGame(BaseGame):
     if session in self.player_sessions:
       del self.player_sessions[session]
       self.update_player_count()
+      self._lobby_json = None
     if self.host == session:
       if not self.connected:
         self.host = None
@@ -4063,6 +4758,7 @@ class IslandersGame(BaseGame):
   def handle_join(self, session, data):
     if self.game is not None:
       raise InvalidPlayer("The game has already started.")
+    self._lobby_json = None
 
     unused_colors = self.COLORS - {player.color for player in self.player_sessions.values()}
     used_names = [player.name for player in self.player_sessions.values()]
@@ -4155,6 +4851,7 @@ class IslandersGame(BaseGame):
       raise InvalidMove("Unknown option(s) %s" % ", ".join(choices.keys() - self.choices.keys()))
     # Set any valid options specified by the user, except options that are forced by the ruleset.
     # Set any options not specified by the user to their default values.
+    self._lobby_json = None
     for option_name in self.choices:
       if self.choices[option_name].forced or option_name not in choices:
         self.choices[option_name].set(self.choices[option_name].default)
@@ -4170,6 +4867,7 @@ class IslandersGame(BaseGame):
     if scenario not in self.SCENARIOS:
       raise InvalidMove("Unknown scenario %s" % scenario)
 
+    self._lobby_json = None
     self.scenario = scenario
     self.game_class = self.get_game_class(self.scenario)
 
@@ -0,0 +1,78 @@
+"""Which corners of the board are on the same island, kept as a union-find of corners.
+
+Two land tiles are on the same island if they are next to each other, and tiles that are next to
+each other share two corners. So joining the corners of a tile that becomes land (e.g. when it is
+discovered) with the islands that those corners are already on is all it takes to keep the islands
+up to date, instead of walking every island on the board again.
+
+Each island is named by its smallest corner, so that the name does not depend on the order that
+its tiles were added. Tiles cannot be taken out of an island; see IslandersState for when the
+islands are computed again instead.
+"""
+
+
+class Islands:
+  """A mapping of corner -> the smallest corner on the same island, for corners on any island."""
+
+  def __init__(self):
+    # corner -> another corner on the same island that is closer to the smallest corner on it,
+    # which is its own parent. Corners point straight at the smallest corner after add_island.
+    self.parent = {}
+    self.tiles = set()  # The tiles whose corners are on an island.
+
+  def add_island(self, tiles, corners):
+    """Adds a whole island at once. None of its tiles or corners may be on an island yet."""
+    self.tiles.update(tiles)
+    name = min(corners)
+    for corner in corners:
+      self.parent[corner] = name
+
+  def add_tile(self, location, corners):
+    """Adds a tile to the islands, merging any islands that its corners are already on."""
+    if location in self.tiles:
+      return
+    self.tiles.add(location)
+    roots = {self.find(corner) for corner in corners if corner in self.parent}
+    name = min([*roots, *corners])
+    for root in roots:
+      self.parent[root] = name
+    for corner in corners:
+      if corner not in self.parent:
+        self.parent[corner] = name
+
+  def find(self, corner):
+    """Returns the smallest corner on the corner's island. The corner must be on an island."""
+    parent = self.parent
+    while parent[corner] != corner:
+      parent[corner] = parent[parent[corner]]
+      corner = parent[corner]
+    return parent[corner]  # The corner that is stored, in case the given corner is a tuple.
+
+  def get(self, corner, default=None):
+    parent = self.parent.get(corner)
+    if parent is None:
+      return default
+    if self.parent[parent] == parent:  # Always true right after add_island.
+      return parent
+    return self.find(corner)
+
+  def __getitem__(self, corner):
+    if corner not in self.parent:
+      raise KeyError(corner)
+    return self.find(corner)
+
+  def __contains__(self, corner):
+    return corner in self.parent
+
+  def __len__(self):
+    return len(self.parent)
+
+  def clear(self):
+    self.parent.clear()
+    self.tiles.clear()
+
+  def copy(self):
+    islands = Islands()
+    islands.parent = self.parent.copy()
+    islands.tiles = self.tiles.copy()
+    return islands
@@ -0,0 +1,115 @@
+"""Generating random islanders maps of any size, for load testing and for finding slow algorithms.
+
+A generated map is a hexagon of tiles with a ring of sea around the edge. Land is grown outwards
+from a few random tiles until it covers the requested fraction of the inside of the ring, so a map
+can be anything from one big continent to an archipelago. Resources, numbers, and ports are dealt in
+the same proportions as on the standard map.
+"""
+
+import collections
+import random
+
+from islanders import balance
+from islanders import islanders
+
+# The land tiles and ports of the standard map, which are repeated as many times as needed.
+LAND_TILES = (
+  ["rsrc1"] * 4 + ["rsrc2"] * 4 + ["rsrc3"] * 4 + ["rsrc4"] * 3 + ["rsrc5"] * 3 + ["norsrc"]
+)
+PORTS = ["3"] * 4 + islanders.RESOURCES
+
+
+def hexagon(radius):
+  """Returns the locations of every tile within radius steps of the center of a hexagon.
+
+  The hexagon is placed so that all of its locations are positive. The first location is the
+  center, and the rest are ordered by their distance from it.
+  """
+  center_x = 3 * radius + 1
+  center_y = 2 * radius + (1 if center_x % 6 == 1 else 2)
+  distances = {islanders.TileLocation(center_x, center_y): 0}
+  queue = collections.deque(distances)
+  while queue:
+    loc = queue.popleft()
+    if distances[loc] == radius:
+      continue
+    for adjacent in loc.get_adjacent_tiles():
+      if adjacent not in distances:
+        distances[adjacent] = distances[loc] + 1
+        queue.append(adjacent)
+  return list(distances)
+
+
+def _deal(deck, count, rng):
+  cards = (deck * (count // len(deck) + 1))[:count]
+  rng.shuffle(cards)
+  return cards
+
+
+def _grow_land(inside, count, islands, rng):
+  land = set()
+  frontier = rng.sample(inside, min(islands, count, len(inside)))
+  inside = set(inside)
+  while len(land) < count and frontier:
+    idx = rng.randrange(len(frontier))
+    frontier[idx], frontier[-1] = frontier[-1], frontier[idx]
+    loc = frontier.pop()
+    if loc in land:
+      continue
+    land.add(loc)
+    frontier.extend(adj for adj in loc.get_adjacent_tiles() if adj in inside and adj not in land)
+  return land
+
+
+def generate(state, radius, *, land=0.6, islands=1, ports=None, constraints=None, rng=None):
+  """Fills an empty state with a random map with the given radius, including the ring of sea.
+
+  land is the fraction of the tiles inside the ring that are land, grown from the given number of
+  islands (which may grow into each other). ports defaults to as many per land tile as on the
+  standard map. The land is then balanced to follow the constraints (by default, only that no 6 is
+  next to an 8). Returns True if it does.
+  """
+  if radius < 2:
+    raise ValueError("The map must have a radius of at least 2.")
+  rng = random if rng is None else rng
+  locations = hexagon(radius)
+  inside = locations[: len(locations) - 6 * radius]
+  land_locs = _grow_land(inside, round(land * len(inside)), islands, rng)
+
+  tile_types = _deal(LAND_TILES, len(land_locs), rng)
+  numbers = iter(_deal(islanders.TILE_NUMBERS, len(land_locs) - tile_types.count("norsrc"), rng))
+  for loc in locations:
+    if loc not in land_locs:
+      state.add_tile(islanders.Tile(loc.x, loc.y, "space", False, None))
+      continue
+    tile_type = tile_types.pop()
+    number = None if tile_type == "norsrc" else next(numbers)
+    state.add_tile(islanders.Tile(loc.x, loc.y, tile_type, True, number))
+  constraints = balance.Constraints() if constraints is None else constraints
+  fair = balance.balance(state, sorted(land_locs), constraints, rng=rng)
+
+  if ports is None:
+    ports = len(land_locs) * len(PORTS) // len(LAND_TILES)
+  coast = [
+    (loc, rotation)
+    for loc in locations
+    if loc not in land_locs
+    for rotation, adjacent in enumerate(loc.get_adjacent_tiles())
+    if adjacent in land_locs
+  ]
+  rng.shuffle(coast)
+  port_types = _deal(PORTS, ports, rng)
+  # Corners that are on or next to a port. Ports may not share or touch each other's corners.
+  taken = set()
+  for loc, rotation in coast:
+    if not port_types:
+      break
+    corners = loc.get_corners_for_rotation(rotation)
+    if loc in state.ports or taken.intersection(corners):
+      continue
+    for corner in corners:
+      taken.add(corner)
+      taken.update(corner.get_adjacent_corners())
+    state.add_port(islanders.Port(loc.x, loc.y, port_types.pop(), rotation))
+  state.recompute()
+  return fair
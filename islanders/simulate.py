@@ -0,0 +1,472 @@
+"""Playing islanders games with bots and no websockets, for benchmarks and load testing.
+
+Each player is a bot with a policy. Whenever it is a bot's turn to act, its policy lists the moves
+it would like to make, best first, and the bot sends them to IslandersState.handle one at a time
+until the game accepts one. Games can be played in parallel across a process pool, and the time
+spent handling each type of move is recorded in a histogram.
+
+The game's random number generator is replaced for the length of each game, so a game played with
+the same seed, scenario, and policies plays out the same way every time.
+"""
+
+import collections
+import concurrent.futures
+import random
+import time
+
+from game import GameException
+from islanders import islanders
+
+# These must match the resources removed by the move handlers.
+COSTS = {
+  "road": {"rsrc2": 1, "rsrc4": 1},
+  "ship": {"rsrc1": 1, "rsrc2": 1},
+  "settle": {"rsrc1": 1, "rsrc2": 1, "rsrc3": 1, "rsrc4": 1},
+  "city": {"rsrc3": 2, "rsrc5": 3},
+  "buy_dev": {"rsrc1": 1, "rsrc3": 1, "rsrc5": 1},
+}
+# Map Maker is for building new maps, and cannot be played.
+SCENARIOS = [name for name in islanders.IslandersGame.SCENARIOS if name != "Map Maker"]
+
+
+def acting_players(state):
+  """Returns the players that may make a move right now."""
+  if state.game_phase == "victory":
+    return []
+  if state.turn_phase == "discard":
+    return sorted(idx for idx, count in state.discard_players.items() if count)
+  if state.turn_phase == "collect":
+    if state.collect_idx is not None:
+      return [state.collect_idx]
+    return sorted(idx for idx, count in state.collect_counts.items() if count)
+  if state.turn_phase == "extra_build":
+    return [state.extra_build_idx]
+  return [state.turn_idx]
+
+
+def pips(state, corner):
+  """The number of ways to roll the numbers on the tiles next to a corner."""
+  total = 0
+  for loc in state.topology.corner_tiles[corner]:
+    tile = state.tiles.get(loc)
+    if tile is not None and tile.is_land and tile.number:
+      total += 6 - abs(7 - tile.number)
+  return total
+
+
+class RandomPolicy:
+  """Makes any move that it can afford, in a random order, and ends its turn when it runs out."""
+
+  def __init__(self, rng):
+    self.rng = rng
+
+  def moves(self, state, player_idx):
+    """Returns the moves the player would like to make, best first."""
+    phase = state.turn_phase
+    if phase == "settle":
+      return self.order(
+        state, [("settle", loc) for loc in state.legal_placements(player_idx)["settle"]]
+      )
+    if phase in ("road", "dev_road"):
+      placements = state.legal_placements(player_idx)
+      return self.order(state, [(t, loc) for t in ("road", "ship") for loc in placements[t]])
+    if phase in ("main", "extra_build"):
+      return self.build_moves(state, player_idx)
+    if phase == "dice":
+      return [*self.dev_moves(state, player_idx, ["knight"]), {"type": "roll_dice"}]
+    if phase == "discard":
+      count = state.discard_players[player_idx]
+      return [{"type": "discard", "selection": self.discard(state, player_idx, count)}]
+    if phase in ("collect", "collect1", "collect2", "collectpi"):
+      return self.collect_moves(state, player_idx)
+    if phase == "robber":
+      return self.robber_moves(state, player_idx)
+    if phase == "rob":
+      return [{"type": "rob", "player": idx} for idx in self.shuffled(state.rob_players)]
+    if phase in ("knight", "fastknight"):
+      knights = state.legal_placements(player_idx)["knight"]
+      return self.order(state, [("knight", loc) for loc in knights])
+    if phase == "move_knights":
+      return [*self.knight_moves(state, player_idx), {"type": "end_move_knights"}]
+    if phase == "bury":
+      return self.shuffled([{"type": "bury"}, {"type": "treasure"}])
+    if phase == "placeport":
+      return self.port_moves(state, player_idx)
+    if phase == "deplete":
+      tiles = state._depletable_tiles()  # noqa: SLF001 # pylint: disable=protected-access
+      return [{"type": "deplete", "location": list(loc)} for loc in self.shuffled(tiles)]
+    if phase in ("expel", "intrigue"):
+      tiles = sorted(state.invasion.occupied)
+      return [{"type": phase, "location": list(loc)} for loc in self.shuffled(tiles)]
+    if phase == "treason":
+      return self.treason_moves(state)
+    return []
+
+  def shuffled(self, items):
+    items = list(items)
+    self.rng.shuffle(items)
+    return items
+
+  def order(self, state, placements):  # pylint: disable=unused-argument
+    """Orders (move type, location) pairs by preference and turns them into moves."""
+    return [{"type": kind, "location": list(loc)} for kind, loc in self.shuffled(placements)]
+
+  def affordable(self, state, player_idx, move_type):
+    cards = state.player_data[player_idx].cards
+    return all(cards[rsrc] >= count for rsrc, count in COSTS[move_type].items())
+
+  def build_moves(self, state, player_idx):
+    placements = state.legal_placements(player_idx)
+    options = []
+    if self.affordable(state, player_idx, "city"):
+      for loc, piece in state.pieces.items():
+        if piece.player == player_idx and piece.piece_type == "settlement":
+          options.append(("city", loc))
+    for move_type in ("settle", "road", "ship"):
+      if self.affordable(state, player_idx, move_type):
+        options.extend((move_type, loc) for loc in placements[move_type])
+    moves = self.order(state, options)
+    if self.affordable(state, player_idx, "buy_dev") and state.dev_cards:
+      moves.insert(self.rng.randint(0, len(moves)), {"type": "buy_dev"})
+    if state.turn_phase == "extra_build":
+      return [*moves, {"type": "end_extra_build"}]
+    moves.extend(self.dev_moves(state, player_idx, islanders.PLAYABLE_DEV_CARDS))
+    moves.extend(self.trade_moves(state, player_idx))
+    return [*moves, {"type": "end_turn"}]
+
+  def dev_moves(self, state, player_idx, card_types):
+    player = state.player_data[player_idx]
+    if state.played_dev:
+      return []
+    moves = []
+    for card_type in card_types:
+      if player.cards[card_type] - player.unusable[card_type] < 1:
+        continue
+      move = {"type": "play_dev", "card_type": card_type}
+      if card_type == "yearofplenty":
+        move["selection"] = dict(collections.Counter(self.rng.choices(islanders.RESOURCES, k=2)))
+      elif card_type == "monopoly":
+        move["selection"] = {self.rng.choice(islanders.RESOURCES): 1}
+      moves.append(move)
+    return self.shuffled(moves)
+
+  def trade_moves(self, state, player_idx):
+    """Trades one resource that the player has plenty of for another, at random."""
+    player = state.player_data[player_idx]
+    spare = [
+      rsrc for rsrc in islanders.RESOURCES if player.cards[rsrc] >= player.trade_ratios[rsrc]
+    ]
+    if not spare or self.rng.random() < 0.5:
+      return []
+    give = self.rng.choice(spare)
+    want = self.rng.choice([rsrc for rsrc in islanders.RESOURCES if rsrc != give])
+    offer = {"give": {give: player.trade_ratios[give]}, "want": {want: 1}}
+    return [{"type": "trade_bank", "offer": offer}]
+
+  def discard(self, state, player_idx, count):
+    cards = state.player_data[player_idx].cards
+    hand = [rsrc for rsrc in islanders.RESOURCES for _ in range(cards[rsrc])]
+    return dict(collections.Counter(self.rng.sample(hand, count)))
+
+  def collect_moves(self, state, player_idx):
+    count = {"collect1": 1, "collectpi": 1, "collect2": 2}.get(state.turn_phase)
+    if count is None:
+      count = state.collect_counts[player_idx]
+    choices = [rsrc for rsrc in islanders.RESOURCES if rsrc not in state.shortage_resources]
+    if state.turn_phase == "collectpi":
+      choices = [rsrc for rsrc in ("rsrc1", "rsrc3", "rsrc4") if rsrc in choices]
+    moves = []
+    for _ in range(5):
+      selection = collections.Counter(self.rng.choices(choices, k=count))
+      moves.append({"type": "collect", "selection": dict(selection)})
+    # If the bank is running low, take whatever is left.
+    available = [
+      rsrc for rsrc in choices for _ in range(min(state.remaining_resources(rsrc), count))
+    ]
+    if len(available) >= count:
+      selection = collections.Counter(self.rng.sample(available, count))
+      moves.append({"type": "collect", "selection": dict(selection)})
+    return moves
+
+  def robber_moves(self, state, player_idx):  # pylint: disable=unused-argument
+    moves = []
+    for loc, tile in state.tiles.items():
+      if tile.is_land and state.options.robber and loc != state.robber:
+        moves.append({"type": "robber", "location": list(loc)})
+      if not tile.is_land and state.options.pirate and loc != state.pirate:
+        moves.append({"type": "pirate", "location": list(loc)})
+    return self.shuffled(moves)
+
+  def knight_moves(self, state, player_idx):
+    """Moves knights away from castles, since the turn cannot end with a knight next to one."""
+    topology = state.topology
+    castles = [loc for loc, tile in state.tiles.items() if tile.tile_type == "castle"]
+    castle_edges = {edge for loc in castles for edge in topology.tile_edges[loc]}
+    board_edges = set(topology.board_edges)
+    moves = []
+    for edge, knight in state.knights.items():
+      if knight.player != player_idx or edge not in castle_edges:
+        continue
+      # Knights may move three edges, or up to five by paying. Nearer edges are tried first.
+      distances = {knight.source: 0}
+      frontier = [knight.source]
+      for distance in range(1, 6):
+        frontier = [
+          dest
+          for loc in frontier
+          for corner in topology.edge_corners[loc]
+          for dest in topology.corner_edges.get(corner, ())
+          if dest not in distances and dest in board_edges
+        ]
+        distances.update((dest, distance) for dest in frontier)
+      moves.extend(
+        {"type": "move_knight", "from": list(edge), "to": list(dest)}
+        for dest in sorted(distances, key=distances.get)
+        if dest not in castle_edges and dest not in state.knights
+      )
+    return moves
+
+  def port_moves(self, state, player_idx):
+    taken = {port.port_type for port in state.ports.values()}
+    port_types = [rsrc for rsrc in islanders.RESOURCES if rsrc not in taken]
+    moves = []
+    for corner, piece in state.pieces.items():
+      if piece.player != player_idx:
+        continue
+      for loc in state.topology.corner_tiles[corner]:
+        tile = state.tiles.get(loc)
+        if tile is None or tile.is_land or loc in state.ports:
+          continue
+        moves.extend(
+          {"type": "placeport", "location": list(loc), "rotation": rotation, "port": port_type}
+          for rotation in range(6)
+          if corner in loc.get_corners_for_rotation(rotation)
+          for port_type in port_types
+        )
+    return self.shuffled(moves)
+
+  def treason_moves(self, state):
+    # pylint: disable=protected-access
+    src_count, dest_count = state._calculate_treason_tiles()  # noqa: SLF001
+    if dest_count == 0:
+      return [{"type": "treason", "froma": None, "fromb": None, "toa": None, "tob": None}]
+    sources, dests = [], []
+    for loc in sorted(state.invasion.coastal):
+      tile = state.tiles[loc]
+      if not tile.number:
+        continue
+      if tile.barbarians > 0:
+        sources.append(loc)
+      if tile.barbarians < 3:
+        dests.append(loc)
+    moves = []
+    for _ in range(20):
+      # A single barbarian is taken from fromb, and a single barbarian is sent to toa.
+      chosen = [None] * (2 - src_count) + self.rng.sample(sources, src_count)
+      rest = [loc for loc in dests if loc not in chosen]
+      if len(rest) < dest_count:
+        continue
+      chosen += self.rng.sample(rest, dest_count) + [None] * (2 - dest_count)
+      locs = [list(loc) if loc is not None else None for loc in chosen]
+      moves.append(dict(zip(["froma", "fromb", "toa", "tob"], locs), type="treason"))
+    return moves
+
+
+class GreedyPolicy(RandomPolicy):
+  """Builds the most valuable thing it can afford, on the most productive corners it can find.
+
+  It will trade with the bank for whatever it is missing to build a city or a settlement.
+  """
+
+  BUILD_ORDER = ("city", "settle", "buy_dev", "road", "ship")
+
+  def order(self, state, placements):
+    priority = {move_type: idx for idx, move_type in enumerate(self.BUILD_ORDER)}
+
+    def score(placement):
+      kind, loc = placement
+      if kind in ("road", "ship", "knight"):
+        value = max(pips(state, corner) for corner in state.topology.edge_corners[loc])
+      else:
+        value = pips(state, loc)
+      return (priority.get(kind, 0), -value, self.rng.random())
+
+    return [{"type": kind, "location": list(loc)} for kind, loc in sorted(placements, key=score)]
+
+  def build_moves(self, state, player_idx):
+    moves = super().build_moves(state, player_idx)
+    builds = [move for move in moves if move["type"] in COSTS]
+    others = [move for move in moves if move["type"] not in COSTS]
+    builds.sort(key=lambda move: self.BUILD_ORDER.index(move["type"]))
+    return builds + others
+
+  def trade_moves(self, state, player_idx):
+    player = state.player_data[player_idx]
+    for target in ("city", "settle"):
+      cost = COSTS[target]
+      missing = [rsrc for rsrc, count in cost.items() if player.cards[rsrc] < count]
+      if len(missing) != 1:
+        continue
+      for rsrc in islanders.RESOURCES:
+        ratio = player.trade_ratios[rsrc]
+        if rsrc not in missing and player.cards[rsrc] - cost.get(rsrc, 0) >= ratio:
+          offer = {"give": {rsrc: ratio}, "want": {missing[0]: 1}}
+          return [{"type": "trade_bank", "offer": offer}]
+    return []
+
+  def discard(self, state, player_idx, count):
+    cards = collections.Counter(
+      {rsrc: state.player_data[player_idx].cards[rsrc] for rsrc in islanders.RESOURCES}
+    )
+    selection = collections.Counter()
+    for _ in range(count):
+      rsrc = max(cards, key=lambda rsrc: (cards[rsrc], rsrc))
+      cards[rsrc] -= 1
+      selection[rsrc] += 1
+    return dict(selection)
+
+  def robber_moves(self, state, player_idx):
+    def score(move):
+      loc = islanders.TileLocation(*move["location"])
+      players = {
+        state.pieces[c].player for c in state.topology.tile_corners[loc] if c in state.pieces
+      }
+      tile = state.tiles[loc]
+      value = 6 - abs(7 - tile.number) if tile.number else 0
+      return (player_idx in players, -len(players), -value)
+
+    return sorted(super().robber_moves(state, player_idx), key=score)
+
+
+POLICIES = {"random": RandomPolicy, "greedy": GreedyPolicy}
+
+
+class Stats:
+  """How many moves were made in some games, and histograms of how long they took to handle."""
+
+  def __init__(self):
+    self.games = 0
+    self.finished = 0  # Games that ended in victory.
+    self.turns = 0
+    self.moves = 0
+    self.rejected = 0  # Moves that the game refused with a GameException.
+    self.stuck = collections.Counter()  # turn phase -> games where no bot could make a move
+    self.errors = collections.Counter()  # unexpected exception -> games it ended
+    self.seconds = 0  # Time spent handling moves, including rejected ones.
+    self.histograms = collections.defaultdict(collections.Counter)  # move type -> bucket -> count
+    self.move_seconds = collections.defaultdict(float)  # move type -> time spent on those moves
+    self.max_seconds = collections.defaultdict(float)  # move type -> slowest move
+
+  def record(self, move_type, seconds):
+    # Bucket b holds moves that took less than 2**b microseconds.
+    self.histograms[move_type][int(seconds * 1e6).bit_length()] += 1
+    self.move_seconds[move_type] += seconds
+    self.max_seconds[move_type] = max(self.max_seconds[move_type], seconds)
+
+  def merge(self, other):
+    for attr in ("games", "finished", "turns", "moves", "rejected", "seconds"):
+      setattr(self, attr, getattr(self, attr) + getattr(other, attr))
+    self.stuck.update(other.stuck)
+    self.errors.update(other.errors)
+    for move_type, histogram in other.histograms.items():
+      self.histograms[move_type].update(histogram)
+      self.move_seconds[move_type] += other.move_seconds[move_type]
+      self.max_seconds[move_type] = max(self.max_seconds[move_type], other.max_seconds[move_type])
+
+  def percentile(self, move_type, fraction):
+    """Returns an upper bound, in seconds, on how long the given fraction of moves took."""
+    histogram = self.histograms[move_type]
+    needed = fraction * sum(histogram.values())
+    seen = 0
+    for bucket in sorted(histogram):
+      seen += histogram[bucket]
+      if seen >= needed:
+        return 2**bucket / 1e6
+    return 0
+
+
+def play_game(scenario, policies, seed, max_moves=5000):
+  """Plays one game of the scenario, with one player for each policy name. Returns its Stats."""
+  rng = random.Random(seed)
+  game_random = islanders.random
+  islanders.random = random.Random(rng.random())
+  try:
+    game = islanders.IslandersGame()
+    colors = sorted(game.COLORS)
+    for idx, _ in enumerate(policies):
+      game.connect_user(f"bot{idx}")
+      game.handle_join(f"bot{idx}", {"name": f"bot{idx}", "color": colors[idx]})
+    game.handle_change_scenario("bot0", {"scenario": scenario})
+    try:
+      game.handle_start("bot0", {"options": {}})
+    except Exception as err:  # pylint: disable=broad-except # noqa: BLE001
+      stats = Stats()
+      stats.games = 1
+      stats.errors[f"start: {type(err).__name__}: {err}"] += 1
+      return stats
+    bots = {
+      idx: POLICIES[policies[int(session[3:])]](rng)
+      for session, idx in game.player_sessions.items()
+    }
+    return _play(game.game, bots, max_moves)
+  finally:
+    islanders.random = game_random
+
+
+def _play(state, bots, max_moves):
+  stats = Stats()
+  stats.games = 1
+  while stats.moves < max_moves and state.game_phase != "victory":
+    try:
+      moved = any(_move(state, idx, bots[idx], stats) for idx in acting_players(state))
+    except Exception as err:  # pylint: disable=broad-except # noqa: BLE001
+      stats.errors[f"{type(err).__name__}: {err}"] += 1
+      return stats
+    if not moved:
+      stats.stuck[state.turn_phase] += 1
+      return stats
+  stats.finished = int(state.game_phase == "victory")
+  return stats
+
+
+def _move(state, player_idx, bot, stats):
+  """Makes the bot's best move that the game accepts. Returns False if it rejects all of them."""
+  for move in bot.moves(state, player_idx):
+    start = time.perf_counter()
+    try:
+      for _ in state.handle(player_idx, move):
+        pass
+    except GameException:
+      stats.seconds += time.perf_counter() - start
+      stats.rejected += 1
+      continue
+    elapsed = time.perf_counter() - start
+    stats.seconds += elapsed
+    stats.moves += 1
+    stats.turns += move["type"] == "end_turn"
+    stats.record(move["type"], elapsed)
+    return True
+  return False
+
+
+def _play_game(args):
+  return play_game(*args)
+
+
+def play_games(scenario, policies, games, *, seed=0, workers=None, max_moves=5000):
+  """Plays games of a scenario in parallel and merges their Stats.
+
+  Each game gets its own seed, so the results do not depend on the number of workers. With one
+  worker, games are played in this process.
+  """
+  rng = random.Random(seed)
+  jobs = [(scenario, policies, rng.random(), max_moves) for _ in range(games)]
+  total = Stats()
+  if workers == 1:
+    for job in jobs:
+      total.merge(_play_game(job))
+    return total
+  with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+    for stats in pool.map(_play_game, jobs):
+      total.merge(stats)
+  return total
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+
+import collections
+import os
+import random
+import sys
+import unittest
+
+# Hack to allow the test to be run directly instead of invoking python from the base dir.
+if os.path.abspath(sys.path[0]) == os.path.dirname(os.path.abspath(__file__)):
+  sys.path[0] = os.path.dirname(sys.path[0])
+
+from islanders import balance
+from islanders import islanders
+
+# pylint: disable=invalid-name
+
+
+class BalanceTest(unittest.TestCase):
+  def setUp(self):
+    self.state = islanders.IslandersState()
+    islanders.Scenario.load_file(self.state, "standard4.json")
+    self.land = [loc for loc, tile in self.state.tiles.items() if tile.is_land]
+    self.rng = random.Random(0)
+    # Start with the worst board: every number in order, so the 6s and 8s are next to each other.
+    numbers = iter(sorted(islanders.TILE_NUMBERS))
+    for loc in self.land:
+      if self.state.tiles[loc].tile_type != "norsrc":
+        self.state.tiles[loc].number = next(numbers)
+
+  def neighbors(self, loc):
+    return [self.state.tiles[adj] for adj in loc.get_adjacent_tiles() if adj in self.land]
+
+
+class TestUnfairness(BalanceTest):
+  def testSeparate(self):
+    self.assertEqual(balance.unfairness(self.state, balance.Constraints(separate=())), 0)
+    pairs = 0
+    for loc in self.land:
+      if self.state.tiles[loc].number in (6, 8):
+        pairs += sum(tile.number in (6, 8) for tile in self.neighbors(loc))
+    self.assertGreater(pairs, 0)
+    self.assertEqual(balance.unfairness(self.state, balance.Constraints()), pairs // 2)
+
+  def testCornerPips(self):
+    constraints = balance.Constraints(separate=(), max_corner_pips=0)
+    self.assertEqual(balance.unfairness(self.state, constraints), 58 * 6)
+    constraints = balance.Constraints(separate=(), max_corner_pips=15)
+    self.assertEqual(balance.unfairness(self.state, constraints), 0)
+
+  def testResourcePips(self):
+    for loc in self.land:
+      tile = self.state.tiles[loc]
+      if tile.number is not None:
+        tile.number = 8 if tile.tile_type == "rsrc1" else 2
+    # rsrc1 has 4 of the 18 numbered tiles, and 20 of the 34 pips.
+    constraints = balance.Constraints(separate=(), pip_tolerance=1)
+    expected = (20 - 34 * 4 / 18 - 1) + sum(34 * count / 18 - count - 1 for count in [4, 4, 3, 3])
+    self.assertAlmostEqual(balance.unfairness(self.state, constraints), expected)
+
+
+class TestBalance(BalanceTest):
+  def testFair(self):
+    self.assertTrue(balance.balance(self.state, self.land, balance.FAIR, rng=self.rng))
+    self.assertEqual(balance.unfairness(self.state, balance.FAIR), 0)
+    for loc in self.land:
+      tile = self.state.tiles[loc]
+      if tile.number is None:
+        self.assertEqual(tile.tile_type, "norsrc")
+        continue
+      for other in self.neighbors(loc):
+        with self.subTest(loc=loc, other=other.location):
+          self.assertNotEqual(tile.number, other.number)
+          self.assertNotEqual(tile.tile_type, other.tile_type)
+
+  def testKeepsTiles(self):
+    before = collections.Counter(self.state.tiles[loc].tile_type for loc in self.land)
+    numbers = collections.Counter(self.state.tiles[loc].number for loc in self.land)
+    balance.balance(self.state, self.land, balance.FAIR, rng=self.rng)
+    self.assertEqual(
+      collections.Counter(self.state.tiles[loc].tile_type for loc in self.land), before
+    )
+    self.assertEqual(
+      collections.Counter(self.state.tiles[loc].number for loc in self.land), numbers
+    )
+
+  def testOnlyMovesGivenTiles(self):
+    fixed = self.land[:6]
+    before = {loc: (self.state.tiles[loc].tile_type, self.state.tiles[loc].number) for loc in fixed}
+    self.assertTrue(balance.balance(self.state, self.land[6:], balance.Constraints(), rng=self.rng))
+    self.assertEqual(
+      {loc: (self.state.tiles[loc].tile_type, self.state.tiles[loc].number) for loc in fixed},
+      before,
+    )
+
+  def testImpossible(self):
+    constraints = balance.Constraints(separate=range(2, 13))
+    self.assertFalse(balance.balance(self.state, self.land, constraints, seconds=0.2, rng=self.rng))
+    # It still leaves the best board that it found, with the desert away from the coast.
+    self.assertEqual(balance.unfairness(self.state, constraints), 42 - 6)
+    desert = next(loc for loc in self.land if self.state.tiles[loc].tile_type == "norsrc")
+    self.assertEqual(len(self.neighbors(desert)), 6)
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+
+import collections
+import json
+import os
+import random
+import sys
+import unittest
+
+# Hack to allow the test to be run directly instead of invoking python from the base dir.
+if os.path.abspath(sys.path[0]) == os.path.dirname(os.path.abspath(__file__)):
+  sys.path[0] = os.path.dirname(sys.path[0])
+
+from game import CustomEncoder, GameException
+from islanders import invasion
+from islanders import islanders
+from islanders import simulate
+
+# pylint: disable=invalid-name
+
+
+def expected_counters(state):
+  """Computes the invasion counters from scratch by looking at every tile."""
+  conquered_corners = collections.Counter()
+  for loc, tile in state.tiles.items():
+    if tile.conquered:
+      conquered_corners.update(loc.get_corner_locations())
+  return {
+    "on_board": sum(tile.barbarians for tile in state.tiles.values()),
+    "occupied": {loc for loc, tile in state.tiles.items() if tile.barbarians},
+    "conquered": {loc for loc, tile in state.tiles.items() if tile.conquered},
+    "conquered_corners": conquered_corners,
+  }
+
+
+class InvasionTestMixin:
+  def assertCounters(self, state):
+    counters = state.invasion
+    actual = {name: getattr(counters, name) for name in expected_counters(state)}
+    self.assertEqual(actual, expected_counters(state))
+    on_change = state._tile_changed  # noqa: SLF001 # pylint: disable=protected-access
+    self.assertTrue(all(tile.on_change == on_change for tile in state.tiles.values()))
+
+
+class CountersTest(InvasionTestMixin, unittest.TestCase):
+  def setUp(self):
+    self.state = islanders.IslandersState()
+    self.state.options.invasion_type = "barbarians"
+    islanders.Scenario.load_file(self.state, "barbarians4.json")
+    self.state.recompute()
+    self.coastal = sorted(self.state.invasion.coastal)
+
+  def testCoastal(self):
+    self.assertTrue(self.coastal)
+    for loc, tile in self.state.tiles.items():
+      neighbors = [self.state.tiles.get(adj) for adj in loc.get_adjacent_tiles()]
+      landlocked = all(adj is not None and adj.is_land for adj in neighbors)
+      with self.subTest(loc=loc):
+        self.assertEqual(loc in self.state.invasion.coastal, tile.is_land and not landlocked)
+
+  def testChanges(self):
+    first, second = self.state.tiles[self.coastal[0]], self.state.tiles[self.coastal[1]]
+    first.barbarians = 3
+    first.conquered = True
+    second.barbarians = 1
+    self.assertCounters(self.state)
+    self.assertEqual(self.state.invasion.supply(2), invasion.TOTAL_BARBARIANS - 6)
+    first.barbarians -= 1
+    first.conquered = False
+    second.barbarians = 0
+    self.assertCounters(self.state)
+    self.assertEqual(self.state.invasion.occupied, {first.location})
+
+  def testReplacedTile(self):
+    old = self.state.tiles[self.coastal[0]]
+    old.barbarians = 3
+    old.conquered = True
+    self.state.add_tile(islanders.Tile(*old.location, "rsrc1", True, 6))
+    self.assertIsNone(old.on_change)
+    old.barbarians = 0
+    self.assertCounters(self.state)
+    self.assertEqual(self.state.invasion.on_board, 0)
+
+  def testCloneAndLoad(self):
+    tile = self.state.tiles[self.coastal[0]]
+    tile.barbarians = 3
+    tile.conquered = True
+    snapshot = self.state.clone()
+    tile.barbarians = 1
+    tile.conquered = False
+    self.assertCounters(snapshot)
+    self.assertEqual(snapshot.invasion.on_board, 3)
+    self.state.restore(snapshot)
+    self.assertCounters(self.state)
+    self.assertEqual(self.state.invasion.conquered, {tile.location})
+
+    loaded = islanders.IslandersState.parse_json(
+      json.loads(json.dumps(self.state.json_repr(), cls=CustomEncoder))
+    )
+    self.assertCounters(loaded)
+    self.assertEqual(loaded.invasion.coastal, self.state.invasion.coastal)
+
+
+class PlayedGameTest(InvasionTestMixin, unittest.TestCase):
+  def play(self, scenario, moves):
+    """Plays a game with random bots, checking the counters after every move."""
+    rng = random.Random(0)
+    game_random = islanders.random
+    islanders.random = random.Random(1)
+    try:
+      game = islanders.IslandersGame()
+      for idx, color in enumerate(sorted(game.COLORS)[:4]):
+        game.connect_user(f"bot{idx}")
+        game.handle_join(f"bot{idx}", {"name": f"bot{idx}", "color": color})
+      game.handle_change_scenario("bot0", {"scenario": scenario})
+      game.handle_start("bot0", {"options": {}})
+      state = game.game
+      bots = {idx: simulate.RandomPolicy(rng) for idx in range(4)}
+      placed = 0
+      for _ in range(moves):
+        for idx in simulate.acting_players(state):
+          if self.move(state, idx, bots[idx]):
+            break
+        else:
+          break
+        placed = max(placed, state.invasion.on_board)
+        self.assertCounters(state)
+      return placed
+    finally:
+      islanders.random = game_random
+
+  def move(self, state, player_idx, bot):
+    for move in bot.moves(state, player_idx):
+      try:
+        list(state.handle(player_idx, move))
+      except GameException:
+        continue
+      return True
+    return False
+
+  def testBarbariansAttack(self):
+    self.assertGreater(self.play("Barbarians Attack", 1500), 0)
+
+  def testDesertRiders(self):
+    self.assertGreater(self.play("Desert Riders", 1500), 0)
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -3,8 +3,8 @@
 import collections
 import json
 import os
+import random
 import sys
-import threading
 import unittest
 from unittest import mock
 
@@ -12,6 +12,7 @@ from unittest import mock
 if os.path.abspath(sys.path[0]) == os.path.dirname(os.path.abspath(__file__)):
   sys.path[0] = os.path.dirname(sys.path[0])
 
+from islanders import balance
 from islanders import islanders
 import game
 import server
@@ -126,6 +127,24 @@ class TestInitBoard(unittest.TestCase):
     self.assertTrue(state.robber)
     self.assertEqual(state.tiles[state.robber].tile_type, "norsrc")
 
+  def testMapFilesAreCopied(self):
+    first = islanders.IslandersState()
+    second = islanders.IslandersState()
+    islanders.TestMap.load_file(first, "test.json", pieces=True)
+    first.tiles[(4, 4)].number = 2
+    first.ports[(7, 1)].port_type = "rsrc5"
+    first.roads[(6, 4, 8, 4)].player = 1
+    islanders.TestMap.load_file(second, "test.json")
+
+    self.assertEqual(second.tiles[(4, 4)].number, 6)
+    self.assertEqual(second.ports[(7, 1)].port_type, "3")
+    self.assertIsNot(first.tiles[(4, 4)], second.tiles[(4, 4)])
+    self.assertEqual(len(first.pieces), 2)
+    self.assertFalse(second.pieces)
+    self.assertFalse(second.roads)
+    islanders.TestMap.load_file(second, "test.json", pieces=True)
+    self.assertEqual(second.roads[(6, 4, 8, 4)].player, 0)
+
 
 class TestLoadState(unittest.TestCase):
   def testLoadState(self):
@@ -215,6 +234,12 @@ class TestLoadState(unittest.TestCase):
       self.assertCountEqual(obja.__dict__.keys(), objb.__dict__.keys(), path)
       for key in obja.__dict__:
         self.assertIn(key, objb.__dict__, path + f".{key}")
+        if key == "_board_version":  # Counts changes, so it depends on how the board was built.
+          continue
+        self.recursiveAssertEqual(getattr(obja, key), getattr(objb, key), path + f".{key}")
+      return
+    if getattr(obja, "__slots__", ()) and not isinstance(obja, tuple):  # Objects with slots
+      for key in obja.__slots__:
         self.recursiveAssertEqual(getattr(obja, key), getattr(objb, key), path + f".{key}")
       return
     if isinstance(obja, dict):  # Any subclass of dictionary
@@ -240,12 +265,9 @@ class TestLoadState(unittest.TestCase):
 
 class BreakpointTestMixin(unittest.TestCase):
   def breakpoint(self):
-    t = threading.Thread(target=server.ws_main, args=(server.GLOBAL_LOOP,))
-    t.start()
     server.GAMES["test"] = game.GameHandler("test", islanders.IslandersGame)
     server.GAMES["test"].game = self.g
     server.main(8001)
-    t.join()
 
   def handle(self, player_idx, data):
     return [*self.c.handle(player_idx, data)]  # Loop through generator results
@@ -344,6 +366,48 @@ class CornerComputationTest(unittest.TestCase):
     self.assertEqual(len(islands), len(set(islands)))
 
 
+class TopologyTest(unittest.TestCase):
+  def setUp(self):
+    self.c = islanders.IslandersState()
+    islanders.StandardMap.load_file(self.c, "standard4.json")
+
+  def testMatchesLocations(self):
+    topology = self.c.topology
+    self.assertEqual(topology.tile_locations, self.c.tiles.keys())
+    for loc in self.c.tiles:
+      self.assertEqual(list(topology.tile_corners[loc]), loc.get_corner_locations())
+      self.assertEqual(list(topology.tile_edges[loc]), loc.get_edge_locations())
+      self.assertEqual(list(topology.tile_neighbors[loc]), loc.get_adjacent_tiles())
+    for corner in topology.corners:
+      self.assertEqual(list(topology.corner_tiles[corner]), corner.get_tiles())
+      self.assertEqual(list(topology.corner_edges[corner]), corner.get_edges())
+    for edge in topology.edges:
+      self.assertEqual(topology.edge_corners[edge], (edge.corner_left, edge.corner_right))
+      self.assertCountEqual(topology.edge_tiles[edge], edge.get_adjacent_tiles())
+    # One edge between each pair of neighboring tiles.
+    neighbors = [
+      t for loc in self.c.tiles for t in topology.tile_neighbors[loc] if t in self.c.tiles
+    ]
+    self.assertEqual(len(topology.board_edges), len(neighbors) // 2)
+
+  def testLocationsAreShared(self):
+    topology = self.c.topology
+    for corner in topology.corners:
+      for edge in topology.corner_edges[corner]:
+        self.assertIn(corner, topology.edge_corners[edge])
+        self.assertIs(next(c for c in topology.edge_corners[edge] if c == corner), corner)
+
+    other = islanders.IslandersState()
+    islanders.StandardMap.load_file(other, "standard4.json")
+    self.assertIs(other.topology, topology)
+
+  def testAddTile(self):
+    topology = self.c.topology
+    self.c.add_tile(islanders.Tile(-5, 5, "space", False, None))
+    self.assertIsNot(self.c.topology, topology)
+    self.assertIn((-5, 5), self.c.topology.tile_locations)
+
+
 class PlacementRestrictionsTest(unittest.TestCase):
   def handle(self, state, player_idx, data):
     return [*state.handle(player_idx, data)]
@@ -698,6 +762,72 @@ class TestLoadTestData(BaseInputHandlerTest):
     self.assertEqual(self.c.player_data[1].trade_ratios.default_factory(), 4)
 
 
+class TestCloneState(BaseInputHandlerTest):
+  TEST_FILE = "sea_test.json"
+
+  def dump(self, state):
+    return json.loads(json.dumps(state.json_repr(), cls=game.CustomEncoder))
+
+  def assertTilesWatched(self, state):
+    """Checks that every tile reports to the state, and that the state's indexes match its tiles."""
+    on_change = state._tile_changed  # noqa: SLF001 # pylint: disable=protected-access
+    self.assertTrue(all(tile.on_change == on_change for tile in state.tiles.values()))
+    by_number = collections.defaultdict(list)
+    for loc, tile in state.tiles.items():
+      if tile.number:
+        by_number[tile.number].append(loc)
+    self.assertEqual(state.tiles_by_number(), by_number)
+    occupied = {loc for loc, tile in state.tiles.items() if tile.barbarians}
+    self.assertEqual(state.invasion.occupied, occupied)
+    conquered = {loc for loc, tile in state.tiles.items() if tile.conquered}
+    self.assertEqual(state.invasion.conquered, conquered)
+
+  def testCloneIsIndependent(self):
+    before = self.dump(self.c)
+    clone = self.c.clone()
+    self.assertEqual(self.dump(clone), before)
+    self.assertTilesWatched(clone)
+    _ = [*clone.handle(0, {"type": "ship", "location": [3, 5, 5, 5]})]
+    _ = [*clone.handle(0, {"type": "end_turn"})]
+    self.assertEqual(clone.roads[(3, 5, 5, 5)].road_type, "ship")
+    self.assertEqual(self.dump(self.c), before)
+    self.assertNotIn((3, 5, 5, 5), self.c.roads)
+
+  def testCloneTilesReportToClone(self):
+    self.c.tiles_by_number()
+    clone = self.c.clone()
+    loc = next(loc for loc, tile in clone.tiles.items() if tile.number)
+    clone.tiles[loc].number = 12
+    clone.tiles[loc].barbarians = 2
+    clone.tiles[loc].conquered = True
+    self.assertTilesWatched(clone)
+    self.assertTilesWatched(self.c)
+    self.assertFalse(self.c.invasion.occupied)
+
+  def testTilesMustBeAdded(self):
+    tile = self.c.tiles[(1, 3)]
+    self.c.tiles[(1, 3)] = islanders.Tile(1, 3, tile.tile_type, tile.is_land, tile.number)
+    with self.assertRaisesRegex(AssertionError, "add_tile"):
+      self.c.clone()
+
+  def testRestore(self):
+    before = self.dump(self.c)
+    snapshot = self.c.clone()
+    self.handle(0, {"type": "ship", "location": [3, 5, 5, 5]})
+    self.c.roads[(3, 5, 5, 5)].movable = False
+    self.c.player_data[1].cards["rsrc3"] += 1
+    self.c.restore(snapshot)
+    self.assertEqual(self.dump(self.c), before)
+
+    # The same snapshot can be restored after trying a different move.
+    self.handle(0, {"type": "road", "location": [2, 4, 3, 5]})
+    self.c.restore(snapshot)
+    self.assertEqual(self.dump(self.c), before)
+    self.assertEqual(self.dump(snapshot), before)
+    self.assertTilesWatched(self.c)
+    self.assertTilesWatched(snapshot)
+
+
 class DebugRulesOffTest(BaseInputHandlerTest):
   def testDebugDisabledNormalGame(self):
     with mock.patch.object(self.c, "distribute_resources") as dist:
@@ -750,6 +880,106 @@ class TestGetEdgeType(BaseInputHandlerTest):
     self.assertEqual(self.c._get_edge_type(islanders.EdgeLocation(3, 5, 5, 5)), "ship")
     self.assertEqual(self.c._get_edge_type(islanders.EdgeLocation(2, 6, 3, 5)), "ship")
 
+  def testStateEdges(self):
+    edges = {edge["location"]: edge["edge_type"] for edge in self.c.json_for_player()["edges"]}
+    self.assertEqual(edges[(0, 4, 2, 4)], "road")
+    self.assertEqual(edges[(2, 4, 3, 3)], "coastdown")
+    self.assertEqual(edges[(2, 4, 3, 5)], "road")
+    self.assertEqual(edges[(2, 6, 3, 5)], "ship")
+    self.assertNotIn((0, 8, 2, 8), edges)
+
+    # Discovering land changes the edges and corners that are sent.
+    self.assertNotIn(((5, 5, 6, 4), "road"), edges.items())
+    self.c.tiles[(7, 5)].is_land = True
+    data = self.c.json_for_player()
+    edges = {edge["location"]: edge["edge_type"] for edge in data["edges"]}
+    self.assertEqual(edges[(5, 5, 6, 4)], "coastup")
+    self.assertIn({"location": (6, 4)}, data["corners"])
+
+
+class TestLegalPlacements(BaseInputHandlerTest):
+  TEST_FILE = "sea_test.json"
+
+  def setUp(self):
+    BaseInputHandlerTest.setUp(self)
+    self.c._add_road(Road([2, 4, 3, 5], "road", 0))
+    self.c._add_road(Road([0, 4, 2, 4], "road", 0))
+    self.c._add_road(Road([2, 6, 3, 5], "ship", 0))
+
+  def testPlacements(self):
+    placements = self.c.legal_placements(0)
+    self.assertEqual(placements["settle"], [(0, 4)])
+    # Roads to the left of (0, 4) would be out of bounds.
+    self.assertEqual(placements["road"], [(2, 4, 3, 3)])
+    self.assertEqual(placements["ship"], [(2, 6, 3, 7), (3, 5, 5, 5)])
+    self.assertEqual(placements["knight"], [])
+    self.assertEqual(self.c.player_json(0)["placements"], placements)
+
+  def testMatchesEveryLocation(self):
+    def allowed(check, *args):
+      try:
+        check(*args)
+      except InvalidMove:
+        return False
+      return True
+
+    topology = self.c.topology
+    for phase in ["main", "settle", "road", "dev_road", "knight", "fastknight"]:
+      with self.subTest(phase=phase):
+        self.c.game_phase = "place2" if phase in ["settle", "road"] else "main"
+        self.c.action_stack = [phase]
+        placements = self.c.legal_placements(0)
+        settle = []
+        if phase in ["main", "settle"]:
+          settle = [
+            loc for loc in topology.corners if allowed(self.c._check_settlement_location, loc, 0)
+          ]
+        self.assertCountEqual(placements["settle"], settle)
+        for road_type in ["road", "ship"]:
+          edges = []
+          if phase in ["main", "road", "dev_road"]:
+            edges = [
+              edge
+              for edge in topology.edges
+              if allowed(self.c._check_road_building, edge, 0, road_type)
+              and edge not in self.c.roads
+              and (phase != "road" or allowed(self.c._check_road_next_to_empty_settlement, edge, 0))
+            ]
+          self.assertCountEqual(placements[road_type], edges)
+        knights = []
+        if phase in ["knight", "fastknight"]:
+          knights = [
+            edge for edge in topology.edges if allowed(self.c._check_knight_location, edge)
+          ]
+        self.assertCountEqual(placements["knight"], knights)
+
+  def testConquestChangesPlacements(self):
+    placements = self.c.legal_placements(0)
+    self.c.tiles[(4, 4)].conquered = True
+    self.assertIsNot(self.c.legal_placements(0), placements)
+    self.c.tiles[(4, 4)].conquered = False
+    self.assertEqual(self.c.legal_placements(0), placements)
+
+  def testOtherPlayers(self):
+    self.assertEqual(
+      self.c.legal_placements(1), {"settle": [], "road": [], "ship": [], "knight": []}
+    )
+    self.c.action_stack = ["robber"]
+    self.assertEqual(self.c.legal_placements(0)["road"], [])
+
+  def testCachedUntilBoardChanges(self):
+    placements = self.c.legal_placements(0)
+    self.assertIs(self.c.legal_placements(0), placements)
+    self.c._add_road(Road([3, 5, 5, 5], "ship", 0))
+    self.assertEqual(self.c.legal_placements(0)["ship"], [(2, 6, 3, 7), (5, 5, 6, 4), (5, 5, 6, 6)])
+
+  def testNoSettlementsOnWater(self):
+    self.c._add_road(Road([3, 5, 5, 5], "ship", 0))
+    self.c._add_road(Road([5, 5, 6, 4], "ship", 0))
+    self.assertNotIn((6, 4), self.c.legal_placements(0)["settle"])
+    with self.assertRaisesRegex(InvalidMove, "on land"):
+      self.c._check_settlement_location(islanders.CornerLocation(6, 4), 0)
+
 
 class TestDistributeResources(BaseInputHandlerTest):
   def setUp(self):
@@ -788,6 +1018,40 @@ class TestDistributeResources(BaseInputHandlerTest):
     self.assertEqual(self.c.player_data[0].cards["rsrc3"], 10)
     self.assertEqual(self.c.player_data[1].cards["rsrc1"], 0)
 
+  def testNumberChanges(self):
+    self.assertEqual(
+      self.c.calculate_resource_distribution((4, 5)), {"rsrc3": {0: 3}, "rsrc1": {1: 2}}
+    )
+    self.c.tiles[(4, 6)].number = 2
+    self.assertEqual(self.c.calculate_resource_distribution((4, 5)), {"rsrc3": {0: 3}})
+    self.assertEqual(self.c.tiles_by_number()[2], [(4, 6)])
+    self.assertEqual(self.c.calculate_resource_distribution((1, 1)), {"rsrc1": {1: 2}})
+
+  def testNumberChangesOnOtherBoards(self):
+    expected = dict(self.c.tiles_by_number())
+    clone = self.c.clone()
+    clone.tiles[(4, 6)].number = 2
+    islanders.Tile(4, 6, "rsrc1", True, 3).number = 2
+    # The index is not thrown away when tiles on other boards change.
+    self.assertEqual(self.c._number_index, expected)  # noqa: SLF001 # pylint: disable=protected-access
+    self.assertEqual(clone.tiles_by_number()[2], [(4, 6)])
+    self.assertNotIn(2, self.c.tiles_by_number())
+
+  def testSimulateRolls(self):
+    rng = random.Random(1)
+    totals, received = self.c.simulate_rolls(1000, rng)
+    self.assertEqual(sum(totals.values()), 1000)
+
+    rng.seed(1)
+    expected = [collections.Counter(), collections.Counter()]
+    for _ in range(1000):
+      roll = (rng.randint(1, 6), rng.randint(1, 6))
+      for rsrc, receive_players in self.c.calculate_resource_distribution(roll).items():
+        for player, count in receive_players.items():
+          expected[player][rsrc] += count
+    self.assertEqual(received, expected)
+    self.assertEqual(self.c.player_data[0].cards["rsrc1"], 0, "simulation does not change cards")
+
 
 class TestDevCards(BaseInputHandlerTest):
   def setUp(self):
@@ -2599,6 +2863,22 @@ class TestShipOpenClosedCalculation(BaseInputHandlerTest):
       with self.subTest(loc=loc):
         self.assertTrue(self.c.roads[loc].closed)
 
+  def testLoopOffClosedRoute(self):
+    route_locs = [(2, 6, 3, 5), (2, 6, 3, 7)]
+    loop_locs = [(5, 5, 6, 4), (6, 4, 8, 4), (8, 4, 9, 5), (5, 5, 6, 6), (6, 6, 8, 6), (8, 6, 9, 5)]
+    for loc in [*route_locs, (3, 5, 5, 5), *loop_locs]:
+      self.c.add_road(Road(loc, "ship", 0))
+    self.c.add_piece(islanders.Piece(3, 7, "settlement", 0))
+
+    # Only the route between the two settlements is closed; the loop hanging off of it is not.
+    for loc in route_locs:
+      with self.subTest(loc=loc):
+        self.assertTrue(self.c.roads[loc].closed)
+    for loc in [(3, 5, 5, 5), *loop_locs]:
+      with self.subTest(loc=loc):
+        self.assertFalse(self.c.roads[loc].closed)
+        self.assertEqual(self.c.roads[loc].movable, loc in loop_locs)
+
   def testRecomputeMovableAfterShipMoveToDifferentNetwork(self):
     self.c.add_tile(islanders.Tile(-2, 6, "space", False, None))  # Avoid out of bound issues
     self.c.add_piece(islanders.Piece(9, 5, "settlement", 0))
@@ -3019,6 +3299,29 @@ class TestLongestRouteCalculation(BaseInputHandlerTest):
     val = self.c._dfs_depth(0, islanders.CornerLocation(8, 4), set(), None)
     self.assertEqual(val, 1, "conquered road doesn't count")
 
+  def testSettlementSplitsNetwork(self):
+    self.c._add_road(Road([8, 4, 9, 5], "road", 0))
+    self.c._add_road(Road([8, 6, 9, 5], "road", 0))
+    self.assertEqual(self.c._calculate_longest_road(0), 3)
+    self.assertEqual(sorted(self.c.route_lengths[0].values()), [3])
+    self.c.add_piece(islanders.Piece(9, 5, "settlement", 1))
+    self.assertEqual(self.c._calculate_longest_road(0), 2)
+    self.assertEqual(sorted(self.c.route_lengths[0].values()), [1, 2])
+
+  def testOnlyChangedNetworksAreSearched(self):
+    self.c._add_road(Road([8, 4, 9, 5], "road", 0))
+    self.c._add_road(Road([2, 6, 3, 7], "road", 0))
+    self.assertEqual(self.c._calculate_longest_road(0), 2)
+    self.assertEqual(sorted(self.c.route_lengths[0].values()), [1, 2])
+
+    self.c._add_road(Road([3, 7, 5, 7], "road", 0))
+    with mock.patch.object(self.c, "_dfs_depth", wraps=self.c._dfs_depth) as dfs:
+      self.assertEqual(self.c._calculate_longest_road(0), 2)
+    # The network at (8, 4) did not change, so only the network at (3, 7) was searched.
+    searched = set().union(*(call.args[4] for call in dfs.call_args_list))
+    self.assertEqual(searched, {(2, 6, 3, 7), (3, 7, 5, 7)})
+    self.assertEqual(sorted(self.c.route_lengths[0].values()), [2, 2])
+
 
 class TestLongestRouteAssignment(BreakpointTestMixin):
   def setUp(self):
@@ -4015,6 +4318,13 @@ class TestExpelBarbarians(BaseInputHandlerTest):
 class TestBarbarianInvasion(BaseInputHandlerTest):
   TEST_FILE = "barbarian_test.json"
 
+  def testCenterTile(self):
+    # Barbarians never invade the tiles around the center tile.
+    self.assertEqual(self.c.center_tile(), (7, 5))
+    for loc in [(1, 3), (1, 5), (1, 7), (4, 2), (4, 4), (4, 6), (4, 8), (7, 1)]:
+      self.c.tiles[loc].is_land = False
+    self.assertEqual(self.c.center_tile(), (10, 6))
+
   def testThreeBarbariansLand(self):
     with mock.patch.object(islanders.random, "randint", side_effect=[1, 2, 3, 5, 4, 6]):
       self.handle(1, {"type": "settle", "location": [9, 7]})
@@ -4841,6 +5151,88 @@ class TestUnstartedGame(unittest.TestCase):
     self.assertDictEqual(self.c.game.discard_players, {})
     self.assertDictEqual(self.c.game.counter_offers, {})
 
+  def testPreviewDependsOnPlayerCount(self):
+    for session in ["one", "two", "three", "four"]:
+      self.c.connect_user(session)
+    self.c.handle_change_scenario("one", {"scenario": "Beginner's Map"})
+    for idx, session in enumerate(["one", "two", "three", "four"]):
+      self.c.handle_join(session, {"name": f"player{idx}"})
+      data = json.loads(self.c.for_player(session))
+      with self.subTest(players=idx + 1):
+        self.assertEqual(len(data["pieces"]), 8 if idx == 3 else 6)
+        self.assertEqual([player["points"] for player in data["player_data"]], [2] * (idx + 1))
+        self.assertEqual(data["player_data"][idx]["name"], f"player{idx}")
+        self.assertEqual(data["you"], idx)
+        self.assertTrue(data["options"]["friendly_robber"]["value"])
+
+  def testForPlayersMatchesForPlayer(self):
+    for session in ["one", "two", "three", "four"]:
+      self.c.connect_user(session)
+    self.c.handle_join("one", {"name": "player1"})
+    self.c.handle_join("two", {"name": "player2"})
+    self.c.handle_join("three", {"name": "player3"})
+    sessions = ["one", "two", "three", "four", "five"]
+    for started in [False, True]:
+      if started:
+        self.c.handle_start("one", {"options": {}})
+      output = self.c.for_players(sessions)
+      self.assertCountEqual(output.keys(), sessions)
+      for session in sessions:
+        with self.subTest(started=started, session=session):
+          self.assertDictEqual(json.loads(output[session]), json.loads(self.c.for_player(session)))
+    self.assertEqual(output["four"], output["five"])
+    self.assertNotEqual(json.loads(output["one"])["you"], json.loads(output["two"])["you"])
+
+  def testLobbyUpdates(self):
+    for session in ["one", "two", "three"]:
+      self.c.connect_user(session)
+    self.c.handle_join("one", {"name": "player1", "color": "red"})
+    self.c.handle_join("two", {"name": "player2", "color": "blue"})
+    data = json.loads(self.c.for_players(["three"])["three"])
+    self.assertEqual([player["name"] for player in data["player_data"]], ["player1", "player2"])
+    self.assertNotIn("red", data["colors"])
+    self.assertFalse(data["host"])
+    self.assertIsNone(data["you"])
+
+    self.c.handle_join("two", {"name": "player2", "color": "saddlebrown"})
+    data = json.loads(self.c.for_player("two"))
+    self.assertEqual(data["player_data"][1]["color"], "saddlebrown")
+    self.assertIn("blue", data["colors"])
+
+    self.c.handle_select_option("one", {"options": {"friendly_robber": True}})
+    self.assertTrue(json.loads(self.c.for_player("two"))["options"]["friendly_robber"]["value"])
+    self.c.handle_change_scenario("one", {"scenario": "The Four Islands"})
+    data = json.loads(self.c.for_player("two"))
+    self.assertEqual(data["scenario"]["value"], "The Four Islands")
+    self.assertTrue(data["options"]["seafarers"]["value"])
+
+    self.c.disconnect_user("one")
+    data = json.loads(self.c.for_players(["two", "three"])["two"])
+    self.assertEqual([player["name"] for player in data["player_data"]], ["player2"])
+    self.assertEqual(data["host"], self.c.host == "two")
+    self.assertEqual(data["you"], 0)
+
+  def testEventViews(self):
+    sessions = ["one", "two", "three"]
+    for session in sessions:
+      self.c.connect_user(session)
+    self.c.handle_join("one", {"name": "player1"})
+    self.c.handle_join("two", {"name": "player2"})
+    self.assertEqual(self.c.event_views(sessions), {})
+    self.c.handle_start("one", {"options": {}})
+    self.c.game.event_log.append(
+      islanders.Event("rob", "{player0} stole", "{player0} stole it", [0])
+    )
+    views = self.c.event_views(sessions + ["four"])
+    self.assertIs(views["three"], views["four"])
+    # The players are shuffled when the game starts.
+    robber = "one" if self.c.player_sessions["one"] == 0 else "two"
+    other = "two" if robber == "one" else "one"
+    self.assertEqual(json.loads(views[robber].json())[-1]["text"], "{player0} stole it")
+    self.assertEqual(json.loads(views[other].json())[-1]["text"], "{player0} stole")
+    self.assertEqual(json.loads(views["three"].json())[-1]["text"], "{player0} stole")
+    self.assertNotIn("event_log", json.loads(self.c.for_player("one")))
+
 
 class TestGameOptions(unittest.TestCase):
   def setUp(self):
@@ -4917,6 +5309,18 @@ class TestGameOptions(unittest.TestCase):
     self.assertTrue(self.c.game.options.friendly_robber)
     self.assertFalse(self.c.game.options.debug)
 
+  def testBalancedBoard(self):
+    for session in ["one", "two", "three"]:
+      self.c.connect_user(session)
+      self.c.handle_join(session, {"name": session})
+    self.c.handle_change_scenario("one", {"scenario": "Beginner's Map"})
+    self.assertTrue(self.c.choices["balanced_board"].forced)
+    self.c.handle_change_scenario("one", {"scenario": "Standard Map"})
+    self.assertFalse(self.c.choices["balanced_board"].forced)
+
+    self.c.handle_start("one", {"options": {"balanced_board": True}})
+    self.assertEqual(balance.unfairness(self.c.game, balance.FAIR), 0)
+
   def testStartWithFourPlayers(self):
     self.c.connect_user("one")
     self.c.connect_user("two")
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+
+import glob
+import os
+import random
+import sys
+import unittest
+
+# Hack to allow the test to be run directly instead of invoking python from the base dir.
+if os.path.abspath(sys.path[0]) == os.path.dirname(os.path.abspath(__file__)):
+  sys.path[0] = os.path.dirname(sys.path[0])
+
+from islanders import islanders
+from islanders import islands
+from islanders import mapgen
+
+# pylint: disable=invalid-name
+
+
+def flood_fill(state):
+  """Computes corner -> smallest corner on the same island by walking every island's tiles."""
+  connecting = state._is_connecting_tile  # noqa: SLF001 # pylint: disable=protected-access
+  result = {}
+  seen = set()
+  for start, tile in state.tiles.items():
+    if start in seen or not connecting(tile):
+      continue
+    seen.add(start)
+    corners = set()
+    stack = [start]
+    while stack:
+      loc = stack.pop()
+      corners.update(loc.get_corner_locations())
+      for adj in loc.get_adjacent_tiles():
+        adj_tile = state.tiles.get(adj)
+        if adj in seen or adj_tile is None:
+          continue
+        if connecting(adj_tile):
+          seen.add(adj)
+          stack.append(adj)
+    result.update(dict.fromkeys(corners, min(corners)))
+  return result
+
+
+class IslandsMixin:
+  def assertIslands(self, state):
+    expected = flood_fill(state)
+    actual = state.corners_to_islands
+    self.assertEqual(len(actual), len(expected))
+    self.assertEqual({corner: actual[corner] for corner in expected}, expected)
+
+
+class IslandsTest(unittest.TestCase):
+  def testMerge(self):
+    index = islands.Islands()
+    index.add_tile("a", [(5, 1), (6, 1)])
+    index.add_tile("b", [(3, 1), (4, 1)])
+    self.assertEqual(index[(6, 1)], (5, 1))
+    self.assertNotEqual(index[(6, 1)], index[(4, 1)])
+    index.add_tile("c", [(4, 1), (6, 1), (7, 1)])
+    for corner in [(3, 1), (4, 1), (5, 1), (6, 1), (7, 1)]:
+      self.assertEqual(index[corner], (3, 1))
+    self.assertEqual(len(index), 5)
+    self.assertIsNone(index.get((8, 1)))
+    self.assertNotIn((8, 1), index)
+    with self.assertRaises(KeyError):
+      index[(8, 1)]  # pylint: disable=pointless-statement
+
+  def testCopy(self):
+    index = islands.Islands()
+    index.add_tile("a", [(5, 1)])
+    copied = index.copy()
+    copied.add_tile("b", [(3, 1), (5, 1)])
+    self.assertEqual(index[(5, 1)], (5, 1))
+    self.assertEqual(copied[(5, 1)], (3, 1))
+    self.assertNotIn((3, 1), index)
+
+
+class BoardIslandsTest(IslandsMixin, unittest.TestCase):
+  def testBundledMaps(self):
+    maps = os.path.join(os.path.dirname(islanders.__file__), "*[0-9].json")
+    for path in sorted(glob.glob(maps)):
+      filename = os.path.basename(path)
+      for connected in [True, False]:
+        with self.subTest(filename=filename, norsrc_is_connected=connected):
+          state = islanders.IslandersState()
+          state.options.norsrc_is_connected = connected
+          islanders.Scenario.load_file(state, filename)
+          self.assertIslands(state)
+
+  def testGeneratedMaps(self):
+    for seed in range(5):
+      state = islanders.IslandersState()
+      mapgen.generate(state, 8, land=0.5, islands=4, rng=random.Random(seed))
+      with self.subTest(seed=seed):
+        self.assertIslands(state)
+
+  def testDiscoveryJoinsIslands(self):
+    state = islanders.IslandersState()
+    state.options.norsrc_is_connected = False
+    mapgen.generate(state, 6, land=0.5, islands=3, rng=random.Random(0))
+    rng = random.Random(1)
+    land = [loc for loc, tile in state.tiles.items() if tile.number]
+    hidden = rng.sample(land, len(land) // 2)
+    numbers = {loc: state.tiles[loc].number for loc in hidden}
+    for loc in hidden:
+      state.tiles[loc].number = None
+    state.recompute()
+    self.assertIslands(state)
+    for loc in hidden:
+      state.tiles[loc].number = numbers[loc]
+      state._join_island(state.tiles[loc])  # noqa: SLF001 # pylint: disable=protected-access
+      self.assertIslands(state)
+
+  def testClone(self):
+    state = islanders.IslandersState()
+    islanders.Scenario.load_file(state, "islands3.json")
+    clone = state.clone()
+    state.add_tile(islanders.Tile(4, 2, "rsrc1", True, 6))
+    state._join_island(state.tiles[(4, 2)])  # noqa: SLF001 # pylint: disable=protected-access
+    self.assertIslands(state)
+    self.assertIslands(clone)
+
+
+class MapMakerIslandsTest(IslandsMixin, unittest.TestCase):
+  def testChangingTiles(self):
+    game = islanders.IslandersGame()
+    for idx, color in enumerate(["red", "blue"]):
+      game.connect_user(f"maker{idx}")
+      game.handle_join(f"maker{idx}", {"name": f"maker{idx}", "color": color})
+    game.handle_change_scenario("maker0", {"scenario": "Map Maker"})
+    game.handle_start("maker0", {"options": {}})
+    state = game.game
+    rng = random.Random(0)
+    for _ in range(300):
+      loc = rng.choice(list(state.tiles))
+      state.turn_idx = rng.choice([0, 0, 0, 1])
+      state.handle(state.turn_idx, {"type": "robber", "location": list(loc)})
+      self.assertIslands(state)
+    self.assertGreater(len(state.corners_to_islands), 0)
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+
+import collections
+import os
+import random
+import sys
+import unittest
+
+# Hack to allow the test to be run directly instead of invoking python from the base dir.
+if os.path.abspath(sys.path[0]) == os.path.dirname(os.path.abspath(__file__)):
+  sys.path[0] = os.path.dirname(sys.path[0])
+
+from islanders import islanders
+from islanders import mapgen
+
+# pylint: disable=invalid-name
+
+
+class TestHexagon(unittest.TestCase):
+  def testSizes(self):
+    for radius in range(1, 6):
+      with self.subTest(radius=radius):
+        locations = mapgen.hexagon(radius)
+        self.assertEqual(len(locations), 3 * radius * (radius + 1) + 1)
+        self.assertEqual(len(set(locations)), len(locations))
+        self.assertGreaterEqual(min(loc.x for loc in locations), 1)
+        self.assertGreaterEqual(min(loc.y for loc in locations), 1)
+
+  def testCenterFirst(self):
+    locations = mapgen.hexagon(2)
+    self.assertCountEqual(locations[1:7], locations[0].get_adjacent_tiles())
+
+
+class TestGenerate(unittest.TestCase):
+  def generate(self, radius, seed=0, **kwargs):
+    state = islanders.IslandersState()
+    for idx in range(3):
+      state.add_player(f"color{idx}", f"player{idx}")
+    self.assertTrue(mapgen.generate(state, radius, rng=random.Random(seed), **kwargs))
+    return state
+
+  def testLand(self):
+    state = self.generate(8, land=0.5, islands=4)
+    inside = mapgen.hexagon(7)
+    land = [loc for loc, tile in state.tiles.items() if tile.is_land]
+    self.assertEqual(len(state.tiles), len(mapgen.hexagon(8)))
+    self.assertEqual(len(land), round(len(inside) / 2))
+    self.assertLessEqual(set(land), set(inside))
+    deck = mapgen.LAND_TILES * (len(land) // len(mapgen.LAND_TILES) + 1)
+    self.assertEqual(
+      collections.Counter(state.tiles[loc].tile_type for loc in land),
+      collections.Counter(deck[: len(land)]),
+    )
+    for loc in land:
+      with self.subTest(loc=loc):
+        tile = state.tiles[loc]
+        self.assertEqual(tile.number is None, tile.tile_type == "norsrc")
+
+  def testSeparatedNumbers(self):
+    state = self.generate(6, land=0.9)
+    for loc, tile in state.tiles.items():
+      if tile.number not in (6, 8):
+        continue
+      for adjacent in loc.get_adjacent_tiles():
+        with self.subTest(loc=loc, adjacent=adjacent):
+          self.assertNotIn(getattr(state.tiles.get(adjacent), "number", None), (6, 8))
+
+  def testPorts(self):
+    state = self.generate(6, ports=8)
+    self.assertEqual(len(state.ports), 8)
+    self.assertEqual(len(state.port_corners), 16)
+    for port in state.ports.values():
+      with self.subTest(port=port.location):
+        self.assertFalse(state.tiles[port.location].is_land)
+        facing = port.location.get_adjacent_tiles()[port.rotation]
+        self.assertTrue(state.tiles[facing].is_land)
+        corners = port.location.get_corners_for_rotation(port.rotation)
+        nearby = {adjacent for corner in corners for adjacent in corner.get_adjacent_corners()}
+        others = set(state.port_corners) - set(corners)
+        self.assertFalse(nearby & others)
+
+  def testSameSeedSameMap(self):
+    first = self.generate(5, seed=3, islands=2)
+    second = self.generate(5, seed=3, islands=2)
+    self.assertEqual(
+      [(t.location, t.tile_type, t.number) for t in first.tiles.values()],
+      [(t.location, t.tile_type, t.number) for t in second.tiles.values()],
+    )
+    self.assertEqual(
+      [(p.location, p.port_type, p.rotation) for p in first.ports.values()],
+      [(p.location, p.port_type, p.rotation) for p in second.ports.values()],
+    )
+
+  def testCenter(self):
+    state = self.generate(6, land=1)
+    self.assertEqual(state.center_tile(), mapgen.hexagon(6)[0])
+
+  def testPlaySettlements(self):
+    state = self.generate(10, land=0.4, islands=6)
+    state.init_dev_cards()
+    state.init_robber()
+    while state.game_phase != "main":
+      player = state.turn_idx
+      settle = state.legal_placements(player)["settle"]
+      list(state.handle(player, {"type": "settle", "location": settle[len(settle) // 2]}))
+      road = state.legal_placements(player)["road"]
+      list(state.handle(player, {"type": "road", "location": road[0]}))
+    self.assertEqual(len(state.pieces), 6)
+    self.assertEqual(len(state.roads), 6)
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import unittest
+
+# Hack to allow the test to be run directly instead of invoking python from the base dir.
+if os.path.abspath(sys.path[0]) == os.path.dirname(os.path.abspath(__file__)):
+  sys.path[0] = os.path.dirname(sys.path[0])
+
+from islanders import islanders
+from islanders import simulate
+
+# pylint: disable=invalid-name
+
+
+class TestSelfPlay(unittest.TestCase):
+  def testGamesFinish(self):
+    stats = simulate.play_games("Standard Map", ["greedy", "random", "greedy"], 2, workers=1)
+    self.assertEqual(stats.games, 2)
+    self.assertEqual(stats.finished, 2)
+    self.assertFalse(stats.errors)
+    self.assertFalse(stats.stuck)
+    self.assertEqual(sum(sum(hist.values()) for hist in stats.histograms.values()), stats.moves)
+
+  def testSeafarers(self):
+    stats = simulate.play_game("The Four Islands", ["greedy", "greedy", "random"], 3)
+    self.assertEqual(stats.finished, 1)
+    self.assertGreater(stats.histograms["ship"].total(), 0)
+
+  def testSameSeedSameGame(self):
+    first = simulate.play_game("Beginner's Map", ["random", "random", "random"], 7)
+    second = simulate.play_game("Beginner's Map", ["random", "random", "random"], 7)
+    self.assertEqual((first.moves, first.turns), (second.moves, second.turns))
+    self.assertEqual(
+      {move_type: hist.total() for move_type, hist in first.histograms.items()},
+      {move_type: hist.total() for move_type, hist in second.histograms.items()},
+    )
+
+  def testRandomIsRestored(self):
+    game_random = islanders.random
+    simulate.play_game("Standard Map", ["random", "random"], 0, max_moves=50)
+    self.assertIs(islanders.random, game_random)
+
+  def testMaxMoves(self):
+    stats = simulate.play_game("Standard Map", ["random", "random", "random"], 0, max_moves=50)
+    self.assertEqual(stats.moves, 50)
+    self.assertEqual(stats.finished, 0)
+
+
+class TestStats(unittest.TestCase):
+  def testMergeAndPercentile(self):
+    first = simulate.Stats()
+    first.games = 1
+    for seconds in [0.00001, 0.00001, 0.00001]:
+      first.record("roll_dice", seconds)
+    second = simulate.Stats()
+    second.games = 1
+    second.record("roll_dice", 0.001)
+    second.stuck["discard"] += 1
+    first.merge(second)
+
+    self.assertEqual(first.games, 2)
+    self.assertEqual(first.stuck, {"discard": 1})
+    self.assertEqual(first.histograms["roll_dice"].total(), 4)
+    self.assertAlmostEqual(first.max_seconds["roll_dice"], 0.001)
+    self.assertAlmostEqual(first.move_seconds["roll_dice"], 0.00103)
+    # 10us is in the bucket below 16us, and 1000us is in the bucket below 1024us.
+    self.assertAlmostEqual(first.percentile("roll_dice", 0.5), 16e-6)
+    self.assertAlmostEqual(first.percentile("roll_dice", 0.99), 1024e-6)
+
+
+if __name__ == "__main__":
+  unittest.main()
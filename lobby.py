@@ -0,0 +1,121 @@
+"""The list of games shown on the index page.
+
+Games report their status to the Lobby whenever they push a new state, and the Lobby only tells
+index websockets about games that actually changed. Each websocket sees one page of the games,
+optionally limited to one game type. When it connects it gets a snapshot of that page, followed by
+messages with just the games that were added, changed, or removed from it.
+"""
+
+import bisect
+import collections
+import json
+
+import game
+
+
+class Subscription:
+  def __init__(self, websocket, game_type=None, offset=0, limit=None):
+    self.outbox = game.Outbox(websocket, 0)
+    self.game_type = game_type
+    self.offset = offset
+    self.limit = limit
+    self.shown = {}  # game_id -> the entry the websocket last received
+    self.total = 0
+
+  def matches(self, entry):
+    return self.game_type is None or entry["game_type"] == self.game_type
+
+  def page(self, games, game_ids):
+    game_ids = game_ids.get(self.game_type, ())
+    end = None if self.limit is None else self.offset + self.limit
+    return {game_id: games[game_id] for game_id in game_ids[self.offset : end]}, len(game_ids)
+
+  def snapshot(self, games, game_ids):
+    self.shown, self.total = self.page(games, game_ids)
+    message = {
+      "type": "games",
+      "games": list(self.shown.values()),
+      "total": self.total,
+      "offset": self.offset,
+    }
+    self.outbox.put("raw", json.dumps(message))
+
+  def refresh(self, games, game_ids, entry, moved):
+    """Tells the websocket about a change to the given game, if it affects this page.
+
+    moved is set when the game was added or removed, which may change which games are on the page.
+    Otherwise, only the game itself changed, and that only matters if it is on the page.
+    """
+    if not self.matches(entry):
+      return
+    if not moved:
+      if entry["game_id"] not in self.shown:
+        return
+      changed, removed = [entry], []
+      self.shown[entry["game_id"]] = entry
+    else:
+      shown, total = self.page(games, game_ids)
+      changed = [entry for game_id, entry in shown.items() if self.shown.get(game_id) != entry]
+      removed = [game_id for game_id in self.shown if game_id not in shown]
+      if not changed and not removed and total == self.total:
+        return
+      self.shown, self.total = shown, total
+    message = {"type": "lobby", "changed": changed, "removed": removed, "total": self.total}
+    self.outbox.put("raw", json.dumps(message))
+
+
+class Lobby:
+  PAGE_SIZE = 50
+
+  def __init__(self):
+    self.games = {}  # game_id -> {"game_id", "game_type", "status", "url"}
+    # game_type, or None for all games -> the sorted ids of those games
+    self.game_ids = collections.defaultdict(list)
+    self.subscriptions = {}  # websocket -> Subscription
+
+  def game_list(self):
+    return [self.games[game_id] for game_id in self.game_ids[None]]
+
+  def update(self, entry):
+    game_id = entry["game_id"]
+    old = self.games.get(game_id)
+    if old == entry:
+      return
+    if old is not None and old["game_type"] != entry["game_type"]:
+      self.remove(game_id)
+      old = None
+    self.games[game_id] = dict(entry)
+    if old is None:
+      for key in (None, entry["game_type"]):
+        bisect.insort(self.game_ids[key], game_id)
+    self.publish(self.games[game_id], moved=old is None)
+
+  def set_status(self, game_id, status):
+    entry = self.games.get(game_id)
+    if entry is not None and entry["status"] != status:
+      self.update({**entry, "status": status})
+
+  def remove(self, game_id):
+    entry = self.games.pop(game_id, None)
+    if entry is None:
+      return
+    for key in (None, entry["game_type"]):
+      game_ids = self.game_ids[key]
+      del game_ids[bisect.bisect_left(game_ids, game_id)]
+    self.publish(entry, moved=True)
+
+  def publish(self, entry, moved):
+    for subscription in self.subscriptions.values():
+      subscription.refresh(self.games, self.game_ids, entry, moved)
+
+  def subscribe(self, websocket, game_type=None, offset=0, limit=PAGE_SIZE):
+    """Starts (or changes) the page of games sent to this websocket, and sends a snapshot of it."""
+    self.unsubscribe(websocket)
+    subscription = Subscription(websocket, game_type, offset, limit)
+    self.subscriptions[websocket] = subscription
+    subscription.snapshot(self.games, self.game_ids)
+
+  def unsubscribe(self, websocket):
+    subscription = self.subscriptions.pop(websocket, None)
+    if subscription is not None:
+      subscription.outbox.close()
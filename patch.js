@@ -0,0 +1,108 @@
+// Client side of the delta protocol (see delta.py) and of the event log (see eventlog.py). Call
+// enablePatches(ws) once the websocket is open, then pass every parsed message through
+// decodeMessage before using it.
+patchState = null;
+patchSeq = null;
+resyncPending = false;
+patchEvents = null;  // The event log entries, if the game sends them separately from its state.
+patchEventSeq = null;  // The sequence number of patchEvents[0].
+
+function enablePatches(socket) {
+  patchState = null;
+  patchSeq = null;
+  resyncPending = false;
+  patchEvents = null;
+  patchEventSeq = null;
+  socket.send(JSON.stringify({type: "protocol", patches: true, events: true}));
+}
+
+function unescapePointer(token) {
+  return token.replaceAll("~1", "/").replaceAll("~0", "~");
+}
+
+function applyPatch(doc, ops) {
+  for (let op of ops) {
+    if (op.path == "") {
+      doc = op.value;
+      continue;
+    }
+    let tokens = op.path.split("/").slice(1).map(unescapePointer);
+    let parent = doc;
+    for (let token of tokens.slice(0, -1)) {
+      parent = parent[token];
+    }
+    let last = tokens[tokens.length-1];
+    if (Array.isArray(parent)) {
+      if (op.op == "add") {
+        parent.splice(last == "-" ? parent.length : parseInt(last), 0, op.value);
+      } else if (op.op == "remove") {
+        parent.splice(parseInt(last), 1);
+      } else {
+        parent[parseInt(last)] = op.value;
+      }
+    } else if (op.op == "remove") {
+      delete parent[last];
+    } else {
+      parent[last] = op.value;
+    }
+  }
+  return doc;
+}
+
+function requestResync(socket) {
+  patchState = null;
+  if (!resyncPending) {
+    resyncPending = true;
+    socket.send(JSON.stringify({type: "resync"}));
+  }
+  return null;
+}
+
+function updateEvents(socket, data) {
+  if (patchEvents == null || data.seq == data.first) {
+    patchEvents = [];
+    patchEventSeq = data.seq;
+  } else if (data.seq < patchEventSeq || data.seq > patchEventSeq + patchEvents.length) {
+    return requestResync(socket);
+  }
+  patchEvents = patchEvents.slice(0, data.seq - patchEventSeq).concat(data.entries);
+  // Forget the entries that the server no longer has.
+  if (data.first > patchEventSeq) {
+    patchEvents = patchEvents.slice(data.first - patchEventSeq);
+    patchEventSeq = data.first;
+  }
+  return null;
+}
+
+// Returns the full game state for snapshot/patch messages, or null if the message should be
+// dropped (in which case a resync has been requested). Event log messages are kept until the next
+// state, which gets the whole log as its event_log. Other messages are returned unchanged.
+function decodeMessage(socket, data) {
+  if (data.type == "events") {
+    return updateEvents(socket, data);
+  }
+  if (data.type == "snapshot") {
+    patchState = data.state;
+    patchSeq = data.seq;
+    resyncPending = false;
+  } else if (data.type == "patch") {
+    if (patchState == null || data.seq != patchSeq + 1) {
+      return requestResync(socket);
+    }
+    try {
+      patchState = applyPatch(patchState, data.ops);
+    } catch (err) {
+      console.log("failed to apply patch: " + err);
+      return requestResync(socket);
+    }
+    patchSeq = data.seq;
+  } else {
+    return data;
+  }
+  // The caller is free to modify what we return; keep our copy pristine for the next patch.
+  let state = structuredClone(patchState);
+  if (patchEvents != null) {
+    state.event_log = patchEvents.slice();
+  }
+  return state;
+}
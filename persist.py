@@ -0,0 +1,158 @@
+"""Saving games to disk so that they survive a server restart.
+
+Each game has a snapshot file, holding its full saved state (json_str), and a log file. After each
+move, the change to the saved state is appended to the log as a patch (see delta.Diff). Games use
+SystemRandom, so the moves alone could not be replayed to get the same dice rolls and card draws.
+Once the log has grown long enough, a new snapshot is written and the log is started over.
+
+Recovering a game reads its snapshot, applies the patches in the log, and parses the result with
+the game class's parse_json. Games that cannot be saved yet (json_str returns "{}", e.g. before the
+game starts), or whose parse_json is not implemented, are not written to disk.
+"""
+
+import json
+import os
+
+import delta
+
+SNAPSHOT_INTERVAL = 100
+
+
+class Journal:
+  """The snapshot and move log for one game."""
+
+  def __init__(self, directory, game_id, game_type, snapshot_interval=SNAPSHOT_INTERVAL):
+    self.snapshot_path = os.path.join(directory, game_id + ".snapshot")
+    self.log_path = os.path.join(directory, game_id + ".log")
+    self.game_type = game_type
+    self.snapshot_interval = snapshot_interval
+    self.seq = 0
+    self.state = None  # The last saved state, as parsed JSON.
+    self.state_size = 0
+    self.log = None
+    self.log_entries = 0
+    self.log_bytes = 0
+
+  def record(self, game, session=None, move=None):
+    """Saves any changes to the game's state. move is the move that caused them, if any."""
+    state_str = game.json_str()
+    if state_str == "{}":
+      return
+    state = json.loads(state_str)
+    if self.state is None:
+      self.snapshot(state_str, state)
+      return
+    ops = delta.Diff(self.state, state)
+    if not ops:
+      return
+    self.seq += 1
+    entry = json.dumps({"seq": self.seq, "session": session, "move": move, "ops": ops})
+    self.log.write(entry + "\n")
+    self.log.flush()
+    self.state = state
+    self.state_size = len(state_str)
+    self.log_entries += 1
+    self.log_bytes += len(entry) + 1
+    if self.log_entries >= self.snapshot_interval or self.log_bytes > self.state_size:
+      self.snapshot(state_str, state)
+
+  def snapshot(self, state_str, state):
+    """Writes a new snapshot and starts a new, empty log."""
+    tmp_path = self.snapshot_path + ".tmp"
+    with open(tmp_path, "w", encoding="ascii") as snapshot:
+      header = json.dumps({"game_type": self.game_type, "seq": self.seq})
+      snapshot.write(header + "\n" + state_str)
+      snapshot.flush()
+      os.fsync(snapshot.fileno())
+    os.replace(tmp_path, self.snapshot_path)
+    # If we crash before the log is truncated, recovery skips the entries already in the snapshot.
+    if self.log is not None:
+      self.log.close()
+    self.log = open(self.log_path, "w", encoding="ascii")  # pylint: disable=consider-using-with # noqa: SIM115
+    self.state = state
+    self.state_size = len(state_str)
+    self.log_entries = 0
+    self.log_bytes = 0
+
+  def load(self):
+    """Reads the game's snapshot and log. Returns the saved state as a JSON string, or None."""
+    try:
+      with open(self.snapshot_path, encoding="ascii") as snapshot:
+        header = json.loads(snapshot.readline())
+        state_str = snapshot.read()
+    except FileNotFoundError:
+      return None
+    self.game_type = header["game_type"]
+    self.seq = header["seq"]
+    self.state = json.loads(state_str)
+    self.state_size = len(state_str)
+    try:
+      with open(self.log_path, encoding="ascii") as log:
+        for line in log:
+          try:
+            entry = json.loads(line)
+          except ValueError:
+            break  # The last entry was only partially written before a crash.
+          self.log_bytes += len(line)
+          if entry["seq"] <= self.seq:
+            continue  # We crashed after writing a snapshot, but before starting the new log.
+          self.state = delta.Apply(self.state, entry["ops"])
+          self.seq = entry["seq"]
+          self.log_entries += 1
+      os.truncate(self.log_path, self.log_bytes)
+    except FileNotFoundError:
+      pass
+    self.log = open(self.log_path, "a", encoding="ascii")  # pylint: disable=consider-using-with # noqa: SIM115
+    if self.log_entries:
+      state_str = json.dumps(self.state)
+    return state_str
+
+  def close(self):
+    if self.log is not None:
+      self.log.close()
+      self.log = None
+
+
+class Store:
+  """All of the saved games in one directory."""
+
+  def __init__(self, directory, game_types, snapshot_interval=SNAPSHOT_INTERVAL):
+    self.directory = directory
+    self.game_types = game_types  # game type name -> BaseGame subclass
+    self.snapshot_interval = snapshot_interval
+    self._savable = {}
+    os.makedirs(directory, exist_ok=True)
+
+  def savable(self, game_type):
+    """Whether games of this type can be recreated from their json_str."""
+    if game_type not in self._savable:
+      # parse_json returns None for games that have not implemented it yet.
+      self._savable[game_type] = self.game_types[game_type].parse_json("{}") is not None
+    return self._savable[game_type]
+
+  def journal(self, game_id, game_type):
+    """Returns a new Journal for the game, or None if this type of game cannot be saved."""
+    if game_type is not None and not self.savable(game_type):
+      return None
+    return Journal(self.directory, game_id, game_type, self.snapshot_interval)
+
+  def recover(self):
+    """Returns a list of (game_id, game_type, game, journal) for every saved game."""
+    recovered = []
+    for name in sorted(os.listdir(self.directory)):
+      game_id, ext = os.path.splitext(name)
+      if ext != ".snapshot":
+        continue
+      journal = self.journal(game_id, None)
+      try:
+        state_str = journal.load()
+        game = self.game_types[journal.game_type].parse_json(state_str)
+      except Exception as err:  # pylint: disable=broad-except # noqa: BLE001
+        print(f"Could not recover game {game_id}: {err}")
+        journal.close()
+        continue
+      if game is None:
+        journal.close()
+        continue
+      recovered.append((game_id, journal.game_type, game, journal))
+    return recovered
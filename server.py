@@ -2,14 +2,13 @@
 
 import argparse
 import asyncio
+from concurrent import futures
+import contextlib
 from http import HTTPStatus
-from http.server import HTTPServer, BaseHTTPRequestHandler
 import json
 import os
 import random
-from socketserver import ThreadingMixIn
 import string
-import threading
 import urllib
 import uuid
 import websockets
@@ -20,12 +19,22 @@ from islanders import islanders
 from mansion import mansion
 from powerplant import powerplant
 import game as game_handler
+import httpserver
+import lobby
+import persist
+import shard
+import static
 
 
 ROOT_DIR = os.path.abspath(os.path.dirname(__file__))
-GLOBAL_LOOP = asyncio.get_event_loop()
+WS_PORT = 8081  # TODO: this is hard-coded into various .js files.
 GLOBAL_WS_SERVER = None
-INDEX_WEBSOCKETS = set()
+ROUTER = None  # shard.Router, when running as the front for several worker processes
+FRAME_INTERVAL = None
+MAX_BACKLOG = None
+EXECUTOR = None  # Runs game logic off the event loop, if set
+STORE = None  # persist.Store to save games in, if set
+LOBBY = lobby.Lobby()
 GAMES = {}
 GAME_TYPES = {
   "islanders": islanders.IslandersGame,
@@ -33,16 +42,25 @@ GAME_TYPES = {
   "mansion": mansion.MansionGame,
   "powerplant": powerplant.PowerPlantGame,
 }
+STATIC_FILES = static.StaticFiles(
+  [
+    ROOT_DIR + "/eldritch/images",
+    ROOT_DIR + "/eldritch",
+    ROOT_DIR + "/islanders",
+    ROOT_DIR + "/islanders/images",
+    ROOT_DIR + "/islanders/sounds",
+    ROOT_DIR + "/mansion",
+    ROOT_DIR + "/powerplant",
+    ROOT_DIR + "/powerplant/images",
+    ROOT_DIR,
+  ]
+)
 # Check to make sure abstract base classes are satisfied.
 [game_class() for game_class in GAME_TYPES.values()]  # pylint: disable=expression-not-assigned
 
 
-class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
-  pass
-
-
-class MyHandler(BaseHTTPRequestHandler):
-  def do_GET(self):
+class MyHandler(httpserver.RequestHandler):
+  async def do_GET(self):
     parsed_url = urllib.parse.urlparse(self.path)
     path = parsed_url.path
     args = urllib.parse.parse_qs(parsed_url.query)
@@ -53,34 +71,36 @@ class MyHandler(BaseHTTPRequestHandler):
       self.send_error(HTTPStatus.BAD_REQUEST.value, f"Unknown game_id {game_id_arg[0]}")
       return
     if game and path.rstrip("/") in game.get_urls():
-      game.handle_get(GLOBAL_LOOP, self, path.rstrip("/"), args)
+      await game.handle_get(self, path.rstrip("/"), args)
+      return
+    if path.rstrip("/") == "/games":
+      self.send_response(HTTPStatus.OK.value)
+      self.send_header("Content-Type", "application/json")
+      self.end_headers()
+      self.wfile.write(json.dumps(GameList()).encode("ascii"))
       return
+    self.send_static(path)
 
+  def send_static(self, path):
     if path == "/":  # noqa: SIM108
       filepath = "/".join([ROOT_DIR, "index.html"])
     else:
       filepath = "/".join([ROOT_DIR, path])
     filepath = os.path.abspath(filepath)
-    allowable_dirs = [
-      ROOT_DIR + "/eldritch/images",
-      ROOT_DIR + "/eldritch",
-      ROOT_DIR + "/islanders",
-      ROOT_DIR + "/islanders/images",
-      ROOT_DIR + "/islanders/sounds",
-      ROOT_DIR + "/mansion",
-      ROOT_DIR + "/powerplant",
-      ROOT_DIR + "/powerplant/images",
-      ROOT_DIR,
-    ]
-    if os.path.dirname(filepath) not in allowable_dirs:
-      print(f"dirname is {os.path.dirname(filepath)} but roots are {allowable_dirs}")
+    if not STATIC_FILES.allowed(filepath):
+      print(f"dirname is {os.path.dirname(filepath)} but roots are {STATIC_FILES.allowed_dirs}")
       self.send_error(HTTPStatus.FORBIDDEN.value, f"Access to {path} forbidden")
       return
-    if not os.path.exists(filepath):
+    asset = STATIC_FILES.get(filepath)
+    if asset is None:
       self.send_error(HTTPStatus.NOT_FOUND.value, f"File {path} not found")
       return
 
-    self.send_response(HTTPStatus.OK.value)
+    encoding, data = asset.select(self.headers["Accept-Encoding"])
+    if asset.not_modified(self.headers, encoding):
+      self.send_response(HTTPStatus.NOT_MODIFIED.value)
+    else:
+      self.send_response(HTTPStatus.OK.value)
 
     session = None
     cookie_str = self.headers["Cookie"]
@@ -95,25 +115,35 @@ class MyHandler(BaseHTTPRequestHandler):
       new_session = f"session={uuid.uuid4()}"
       self.send_header("Set-Cookie", new_session)
       print(f"setting session cookie {new_session}")
-    if filepath.endswith((".jpg", ".jpeg", ".png")):
-      self.send_header("Cache-Control", "public, max-age=604800")
+    self.send_header("Cache-Control", STATIC_FILES.cache_control(asset))
+    self.send_header("ETag", asset.etag_for(encoding))
+    self.send_header("Last-Modified", asset.last_modified)
+    if asset.variants:
+      self.send_header("Vary", "Accept-Encoding")
+    if self.status[0] == HTTPStatus.NOT_MODIFIED.value:
+      self.end_headers()
+      return
 
+    self.send_header("Content-Type", asset.content_type)
+    if encoding is not None:
+      self.send_header("Content-Encoding", encoding)
     self.end_headers()
 
-    with open(filepath, "rb") as reader:
-      self.wfile.write(reader.read())
+    if data is None:
+      # Closed by the request handler once the file has been sent.
+      self.file_body = open(filepath, "rb")  # pylint: disable=consider-using-with # noqa: SIM115
+    else:
+      self.wfile.write(data)
 
-  def do_POST(self):
+  async def do_POST(self):
     parsed_url = urllib.parse.urlparse(self.path)
     path = parsed_url.path
     args = urllib.parse.parse_qs(parsed_url.query)
-    data = b""
-    if self.headers["content-length"]:
-      data = self.rfile.read(int(self.headers["content-length"]))
+    data = self.body
 
     if path.rstrip("/") == "/new":
       # TODO: extract a content encoding from content-type header.
-      CreateGame(self, urllib.parse.parse_qs(data.decode("ascii", "strict")))
+      CreateGame(self, urllib.parse.parse_qs(data.decode("ascii", "strict")), args.get("game_id"))
       return
 
     game_id_arg = args.get("game_id", [])
@@ -130,10 +160,68 @@ class MyHandler(BaseHTTPRequestHandler):
       self.send_error(HTTPStatus.NOT_FOUND.value, f"Unknown path {path}")
       return
 
-    game.handle_post(GLOBAL_LOOP, self, path.rstrip("/"), args, data)
+    await game.handle_post(self, path.rstrip("/"), args, data)
+
+
+class FrontHandler(MyHandler):
+  """Serves static files and the lobby, and forwards everything else to the worker processes."""
+
+  async def do_GET(self):
+    parsed_url = urllib.parse.urlparse(self.path)
+    if parsed_url.path.rstrip("/") == "/games":
+      self.send_response(HTTPStatus.OK.value)
+      self.send_header("Content-Type", "application/json")
+      self.end_headers()
+      self.wfile.write(json.dumps(await LobbyList()).encode("ascii"))
+      return
+    game_id_arg = urllib.parse.parse_qs(parsed_url.query).get("game_id", [])
+    if not game_id_arg:
+      await super().do_GET()
+      return
+    worker = await FindWorker(game_id_arg[0])
+    if worker is None:
+      self.send_error(HTTPStatus.BAD_REQUEST.value, f"Unknown game_id {game_id_arg[0]}")
+      return
+    await ROUTER.proxy_http(self, worker)
+
+  async def do_POST(self):
+    parsed_url = urllib.parse.urlparse(self.path)
+    if parsed_url.path.rstrip("/") == "/new":
+      worker = ROUTER.least_loaded()
+      game_id = GenerateId(2)
+      if not game_id:
+        self.send_error(
+          HTTPStatus.INTERNAL_SERVER_ERROR,
+          "no unique game ids left. probably. i didn't try very hard",
+        )
+        return
+      ROUTER.reserve(game_id)
+      self.path = f"{parsed_url.path}?game_id={game_id}"
+      try:
+        if await ROUTER.proxy_http(self, worker) == 301:
+          ROUTER.add_game(game_id, worker)
+      finally:
+        ROUTER.release(game_id)
+      return
+
+    game_id_arg = urllib.parse.parse_qs(parsed_url.query).get("game_id", [])
+    if not game_id_arg:
+      self.send_error(HTTPStatus.BAD_REQUEST.value, "Missing required param game_id")
+      return
+    worker = await FindWorker(game_id_arg[0])
+    if worker is None:
+      self.send_error(HTTPStatus.BAD_REQUEST.value, f"Game not found: {game_id_arg[0]}")
+      return
+    await ROUTER.proxy_http(self, worker)
+
 
+async def FindWorker(game_id):
+  if ROUTER.owner(game_id) is None:
+    await ROUTER.game_list()  # Refresh our view of which worker has which game.
+  return ROUTER.owner(game_id)
 
-def CreateGame(http_handler, data):
+
+def CreateGame(http_handler, data, requested_id=None):
   if not data.get("type"):
     http_handler.send_error(HTTPStatus.BAD_REQUEST.value, "Missing game type")
     return
@@ -141,26 +229,63 @@ def CreateGame(http_handler, data):
   if game_type not in GAME_TYPES:
     http_handler.send_error(HTTPStatus.BAD_REQUEST.value, f"Unknown game type {game_type}")
     return
-  generated_id = GenerateId(2)
+  if requested_id:
+    # The front process picks ids for its workers so that they are unique across all of them.
+    generated_id = requested_id[0] if requested_id[0] not in GAMES else None
+  else:
+    generated_id = GenerateId(2)
   if not generated_id:
     http_handler.send_error(
       HTTPStatus.INTERNAL_SERVER_ERROR, "no unique game ids left. probably. i didn't try very hard"
     )
     return
-  GAMES[generated_id] = game_handler.GameHandler(generated_id, GAME_TYPES[game_type])
+  AddGame(generated_id, game_type)
   http_handler.send_response(301)
   http_handler.send_header("Location", GAMES[generated_id].game_url())
   http_handler.end_headers()
   print(f"Created new game of type {game_type} with id {generated_id}")
 
 
+def AddGame(game_id, game_type, game=None):
+  journal = STORE.journal(game_id, game_type) if STORE is not None else None
+  GAMES[game_id] = game_handler.GameHandler(
+    game_id,
+    GAME_TYPES[game_type],
+    FRAME_INTERVAL,
+    MAX_BACKLOG,
+    executor=EXECUTOR,
+    lobby=LOBBY,
+    journal=journal,
+  )
+  if game is not None:
+    GAMES[game_id].game = game
+  LOBBY.update(
+    {
+      "game_id": game_id,
+      "game_type": game_type,
+      "status": GAMES[game_id].game_status(),
+      "url": GAMES[game_id].game_url(),
+    }
+  )
+
+
+def LoadGames(save_dir):
+  global STORE  # pylint: disable=global-statement # noqa: PLW0603
+  STORE = persist.Store(save_dir, GAME_TYPES)
+  recovered = STORE.recover()
+  for game_id, game_type, game, journal in recovered:
+    AddGame(game_id, game_type, game)
+    GAMES[game_id].journal = journal
+  print(f"Loaded {len(recovered)} games from {save_dir}")
+
+
 def GenerateId(length):
   generated = None
   for _ in range(5):
     chars = [random.choice(string.ascii_lowercase) for _ in range(length)]
     generated = "".join(chars)
     # TODO: concurrency
-    if generated not in GAMES:
+    if generated not in GAMES and (ROUTER is None or ROUTER.available(generated)):
       return generated
   return None
 
@@ -174,6 +299,13 @@ async def HandleWebsocket(websocket, path):
   if game_id == "":
     await SendGames(websocket)
     return
+  if ROUTER is not None:
+    worker = await FindWorker(game_id)
+    if worker is None:
+      await PushError(websocket, f"Unknown game {game_id}")
+      return
+    await ROUTER.proxy_websocket(websocket, path, worker)
+    return
   game = GAMES.get(game_id)
   if game is None:
     await PushError(websocket, f"Unknown game {game_id}")
@@ -204,64 +336,122 @@ async def GameLoop(websocket, session, game):
     await game.disconnect_user(session, websocket)
 
 
+def GameList():
+  # Games update their lobby entries under their own locks, so read those instead of the games.
+  return LOBBY.game_list()
+
+
+async def LobbyList():
+  if ROUTER is not None:
+    return await ROUTER.game_list()
+  return GameList()
+
+
 async def SendGames(websocket):
-  game_data = []
-  for game_id, game in GAMES.items():
-    game_data.append({"game_id": game_id, "status": game.game_status(), "url": game.game_url()})
-  await websocket.send(json.dumps({"games": game_data}))
-  INDEX_WEBSOCKETS.add(websocket)
+  LOBBY.subscribe(websocket)
   try:
-    async for _ in websocket:
-      pass
+    async for raw in websocket:
+      try:
+        data = json.loads(raw)
+        offset = max(int(data.get("offset") or 0), 0)
+        limit = data.get("limit", LOBBY.PAGE_SIZE)
+        limit = None if limit is None else max(int(limit), 1)
+      except (AttributeError, TypeError, ValueError) as err:
+        await PushError(websocket, str(err))
+        continue
+      if data.get("type") != "subscribe":
+        await PushError(websocket, f"Unknown message type {data.get('type')}")
+        continue
+      LOBBY.subscribe(websocket, data.get("game_type"), offset, limit)
   except websockets.exceptions.ConnectionClosed:
     pass
   finally:
-    INDEX_WEBSOCKETS.remove(websocket)
-
+    LOBBY.unsubscribe(websocket)
 
-async def SendGameUpdates():
-  while True:
-    game_data = []
-    for game_id, game in GAMES.items():
-      game_data.append({"game_id": game_id, "status": game.game_status(), "url": game.game_url()})
-    coroutines = [ws.send(json.dumps({"games": game_data})) for ws in INDEX_WEBSOCKETS]
-    asyncio.gather(*coroutines)
-    await asyncio.sleep(1)
 
-
-def ws_main(loop):
-  port = 8081  # TODO: this is hard-coded into various .js files.
+async def Serve(http_port, ws_port=WS_PORT, host="", handler_class=MyHandler):
   global GLOBAL_WS_SERVER  # pylint: disable=global-statement # noqa: PLW0603
-  asyncio.set_event_loop(loop)
-  asyncio.ensure_future(SendGameUpdates())  # noqa: RUF006
-  start_server = websockets.server.serve(HandleWebsocket, "", port)
-  GLOBAL_WS_SERVER = loop.run_until_complete(start_server)
-  print(f"Websocket server started on port {port}")
-  loop.run_forever()
-
-
-def main(port):
+  http_server = await asyncio.start_server(handler_class.serve_connection, host, http_port)
+  print(f"Started server on port {http_port}")
+  GLOBAL_WS_SERVER = await websockets.server.serve(HandleWebsocket, host, ws_port)
+  print(f"Websocket server started on port {ws_port}")
+  watchers = []
+  if ROUTER is not None:
+    watchers = [asyncio.create_task(ROUTER.watch_lobby(worker, LOBBY)) for worker in ROUTER.workers]
   try:
-    server = ThreadingHTTPServer(("", port), MyHandler)
-    print(f"Started server on port {port}")
-    server.serve_forever()
+    async with http_server:
+      await http_server.serve_forever()
+  finally:
+    for watcher in watchers:
+      watcher.cancel()
+    GLOBAL_WS_SERVER.close()
+    await GLOBAL_WS_SERVER.wait_closed()
+
+
+def RunWorker(http_port, ws_port, save_dir=None):
+  if save_dir:
+    LoadGames(save_dir)
+  with contextlib.suppress(KeyboardInterrupt):  # The front process handles shutting down.
+    asyncio.run(Serve(http_port, ws_port, "127.0.0.1"))
+
+
+def main(port, num_workers=0, worker_port=9000, threads=0, save_dir=None):
+  global ROUTER, EXECUTOR  # pylint: disable=global-statement # noqa: PLW0603
+  if threads:
+    EXECUTOR = futures.ThreadPoolExecutor(threads, thread_name_prefix="game")
+  workers = []
+  if num_workers:
+    for idx in range(num_workers):
+      workers.append(shard.Worker(idx, worker_port + 2 * idx, worker_port + 2 * idx + 1))
+      # Each worker saves its games in its own directory, since it loads all of them on startup.
+      worker_dir = os.path.join(save_dir, f"worker{idx}") if save_dir else None
+      workers[-1].start(RunWorker, worker_dir)
+    ROUTER = shard.Router(workers)
+  elif save_dir:
+    LoadGames(save_dir)
+  STATIC_FILES.preload()
+  try:
+    asyncio.run(Serve(port, handler_class=FrontHandler if ROUTER else MyHandler))
   except (KeyboardInterrupt, Exception) as err:  # pylint: disable=broad-except
     if isinstance(err, KeyboardInterrupt):
       print("keyboard interrupt received; shutting down")
     else:
       print(f"{err} {err.__class__} occurred; shutting down")
-    server.socket.close()
-    GLOBAL_WS_SERVER.close()
-    fut = asyncio.run_coroutine_threadsafe(GLOBAL_WS_SERVER.wait_closed(), GLOBAL_LOOP)
-    fut.result(10)
-    GLOBAL_LOOP.stop()
+  finally:
+    for worker in workers:
+      worker.stop()
 
 
 if __name__ == "__main__":
   parser = argparse.ArgumentParser()
   parser.add_argument("--http-port", type=int, help="HTTP port", metavar="PORT", default=8001)
+  parser.add_argument(
+    "--max-fps", type=float, help="Limit on intermediate states sent per second (0 for no limit)"
+  )
+  parser.add_argument(
+    "--max-backlog", type=int, help="States to queue for a slow client before dropping old ones"
+  )
+  parser.add_argument(
+    "--workers", type=int, default=0, help="Number of worker processes to host games in"
+  )
+  parser.add_argument(
+    "--worker-port",
+    type=int,
+    default=9000,
+    metavar="PORT",
+    help="First of the localhost ports used by worker processes (two per worker)",
+  )
+  parser.add_argument(
+    "--threads",
+    type=int,
+    default=0,
+    help="Run game logic in a pool of this many threads so that one game cannot stall the others",
+  )
+  parser.add_argument(
+    "--save-dir", help="Directory to save games in; saved games are loaded on startup"
+  )
   flags = parser.parse_args()
-  t2 = threading.Thread(target=ws_main, args=(GLOBAL_LOOP,))
-  t2.start()
-  main(flags.http_port)
-  t2.join()
+  if flags.max_fps:
+    FRAME_INTERVAL = 1 / flags.max_fps
+  MAX_BACKLOG = flags.max_backlog
+  main(flags.http_port, flags.workers, flags.worker_port, flags.threads, flags.save_dir)
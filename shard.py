@@ -0,0 +1,171 @@
+"""Hosting games across several worker processes.
+
+In sharded mode, the front process serves static files and the lobby, and forwards every HTTP
+request and websocket for a game to the worker process that owns that game. The front keeps its
+lobby up to date by subscribing to each worker's lobby. Each worker is an ordinary server listening
+on localhost. New games go to the worker with the fewest games, and games never move between
+workers, so routing only needs the game_id.
+"""
+
+import asyncio
+import json
+import multiprocessing
+
+import websockets
+import websockets.client
+
+# Headers that describe a single hop and must not be forwarded by a proxy.
+HOP_HEADERS = {"connection", "keep-alive", "content-length", "transfer-encoding", "upgrade"}
+
+
+class Worker:
+  def __init__(self, idx, http_port, ws_port):
+    self.idx = idx
+    self.http_port = http_port
+    self.ws_port = ws_port
+    self.games = set()
+    self.process = None
+
+  def start(self, target, *args):
+    """Starts the worker process, which should call target(http_port, ws_port, *args)."""
+    self.process = multiprocessing.Process(
+      target=target,
+      args=(self.http_port, self.ws_port, *args),
+      name=f"worker{self.idx}",
+      daemon=True,
+    )
+    self.process.start()
+
+  def stop(self):
+    if self.process is not None and self.process.is_alive():
+      self.process.terminate()
+      self.process.join(5)
+
+
+async def Fetch(port, method, path, headers=(), body=b""):
+  """Makes a single HTTP request to a worker. Returns the status, reason, headers, and body."""
+  reader, writer = await asyncio.open_connection("127.0.0.1", port)
+  try:
+    lines = [f"{method} {path} HTTP/1.1", "Host: 127.0.0.1", "Connection: close"]
+    lines.extend(f"{key}: {value}" for key, value in headers if key.lower() not in HOP_HEADERS)
+    lines.append(f"Content-Length: {len(body)}")
+    writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("iso-8859-1") + body)
+    await writer.drain()
+    response = await reader.read()
+  finally:
+    writer.close()
+  head, _, data = response.partition(b"\r\n\r\n")
+  status_line, *header_lines = head.decode("iso-8859-1").split("\r\n")
+  _, status, reason = status_line.split(" ", 2)
+  response_headers = [tuple(line.split(": ", 1)) for line in header_lines]
+  return int(status), reason, response_headers, data
+
+
+class Router:
+  """Keeps track of which worker owns each game."""
+
+  def __init__(self, workers):
+    self.workers = workers
+    self.owners = {}  # game_id -> Worker
+    self.reserved = set()  # game ids being created on some worker
+
+  def owner(self, game_id):
+    return self.owners.get(game_id)
+
+  def available(self, game_id):
+    return game_id not in self.owners and game_id not in self.reserved
+
+  def reserve(self, game_id):
+    """Holds game_id until the worker creating it answers, so it is not handed out twice."""
+    self.reserved.add(game_id)
+
+  def release(self, game_id):
+    self.reserved.discard(game_id)
+
+  def least_loaded(self):
+    return min(self.workers, key=lambda worker: len(worker.games))
+
+  def add_game(self, game_id, worker):
+    self.owners[game_id] = worker
+    worker.games.add(game_id)
+
+  async def proxy_http(self, http_handler, worker):
+    """Forwards the request in http_handler to the worker and copies back its response."""
+    status, reason, headers, data = await Fetch(
+      worker.http_port,
+      http_handler.command,
+      http_handler.path,
+      http_handler.headers.items(),
+      http_handler.body,
+    )
+    http_handler.send_response(status, reason)
+    for key, value in headers:
+      if key.lower() not in HOP_HEADERS | {"server", "date"}:
+        http_handler.send_header(key, value)
+    http_handler.end_headers()
+    http_handler.wfile.write(data)
+    return status
+
+  async def proxy_websocket(self, websocket, path, worker):
+    """Relays messages between a client websocket and the worker until either side closes."""
+    headers = {}
+    if "Cookie" in websocket.request_headers:
+      headers["Cookie"] = websocket.request_headers["Cookie"]
+    uri = f"ws://127.0.0.1:{worker.ws_port}{path}"
+    async with websockets.client.connect(uri, extra_headers=headers) as upstream:
+      pumps = [
+        asyncio.create_task(Pump(websocket, upstream)),
+        asyncio.create_task(Pump(upstream, websocket)),
+      ]
+      _, pending = await asyncio.wait(pumps, return_when=asyncio.FIRST_COMPLETED)
+      for task in pending:
+        task.cancel()
+
+  async def game_list(self):
+    """Returns the lobby listing of every game on every worker."""
+    responses = await asyncio.gather(
+      *[Fetch(worker.http_port, "GET", "/games") for worker in self.workers], return_exceptions=True
+    )
+    game_data = []
+    for worker, response in zip(self.workers, responses):
+      if isinstance(response, Exception) or response[0] != 200:
+        continue
+      for data in json.loads(response[3]):
+        self.add_game(data["game_id"], worker)
+        game_data.append(data)
+    return game_data
+
+  async def watch_lobby(self, worker, lobby):
+    """Mirrors the games on a worker into the front's lobby for as long as the front runs."""
+    uri = f"ws://127.0.0.1:{worker.ws_port}/"
+    while True:
+      try:
+        async with websockets.client.connect(uri) as upstream:
+          await upstream.send(json.dumps({"type": "subscribe", "limit": None}))
+          async for message in upstream:
+            data = json.loads(message)
+            if data.get("type") == "games":
+              current = {entry["game_id"] for entry in data["games"]}
+              removed = [game_id for game_id in worker.games if game_id not in current]
+              changed = data["games"]
+            elif data.get("type") == "lobby":
+              removed, changed = data["removed"], data["changed"]
+            else:
+              continue
+            for game_id in removed:
+              lobby.remove(game_id)
+            for entry in changed:
+              self.add_game(entry["game_id"], worker)
+              lobby.update(entry)
+      except (OSError, websockets.exceptions.WebSocketException):
+        pass
+      # The worker may still be starting up, or may have restarted; try again shortly.
+      await asyncio.sleep(1)
+
+
+async def Pump(source, dest):
+  try:
+    async for message in source:
+      await dest.send(message)
+  except websockets.exceptions.ConnectionClosed:
+    pass
@@ -0,0 +1,151 @@
+"""In-memory cache for static assets.
+
+Files are read (and compressed, where that helps) once and kept in an LRU cache bounded by total
+size. Each file, and each compressed variant of it, gets an ETag so browsers can revalidate with a
+conditional request and get a 304 instead of the whole file. Large files that are already
+compressed (images, sounds) are not kept in memory; the server sends them straight from disk with
+sendfile.
+
+Brotli variants are used if the optional brotli module is installed.
+"""
+
+import collections
+import email.utils
+import gzip
+import hashlib
+import mimetypes
+import os
+from stat import S_ISREG
+
+try:
+  import brotli
+except ImportError:
+  brotli = None
+
+PRELOAD_EXTENSIONS = {".html", ".js", ".css", ".json", ".png", ".jpg", ".jpeg", ".svg", ".mp3"}
+COMPRESSIBLE_TYPES = {"application/javascript", "application/json", "image/svg+xml"}
+MIN_COMPRESS_SIZE = 1024
+LONG_CACHE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+
+
+class Asset:
+  def __init__(self, filepath, stat):
+    self.filepath = filepath
+    self.mtime = stat.st_mtime
+    self.size = stat.st_size
+    self.content_type = mimetypes.guess_type(filepath)[0] or "application/octet-stream"
+    self.last_modified = email.utils.formatdate(stat.st_mtime, usegmt=True)
+    self.data = None
+    self.variants = {}  # content encoding -> compressed data
+    self.etag = f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+
+  def compressible(self):
+    return self.content_type.startswith("text/") or self.content_type in COMPRESSIBLE_TYPES
+
+  def load(self):
+    with open(self.filepath, "rb") as reader:
+      self.data = reader.read()
+    self.etag = f'"{hashlib.sha1(self.data).hexdigest()[:20]}"'  # noqa: S324
+    if self.compressible() and self.size >= MIN_COMPRESS_SIZE:
+      self.variants["gzip"] = gzip.compress(self.data, mtime=0)
+      if brotli is not None:
+        self.variants["br"] = brotli.compress(self.data)
+
+  def memory(self):
+    return len(self.data or b"") + sum(len(variant) for variant in self.variants.values())
+
+  def select(self, accept_encoding):
+    """Returns the content encoding (or None) and the data to send for this Accept-Encoding."""
+    accepted = {
+      token.split(";")[0].strip() for token in (accept_encoding or "").split(",") if token.strip()
+    }
+    for encoding in ["br", "gzip"]:
+      if encoding in self.variants and encoding in accepted:
+        return encoding, self.variants[encoding]
+    return None, self.data
+
+  def etag_for(self, encoding):
+    """Returns the ETag of the variant with this content encoding (None for the file itself)."""
+    if encoding is None:
+      return self.etag
+    # Strong validators must differ between representations, so tag the encoding on.
+    return f'{self.etag[:-1]}-{encoding}"'
+
+  def not_modified(self, headers, encoding=None):
+    if headers["If-None-Match"]:
+      etag = self.etag_for(encoding)
+      return etag in [tag.strip() for tag in headers["If-None-Match"].split(",")]
+    if headers["If-Modified-Since"]:
+      try:
+        since = email.utils.parsedate_to_datetime(headers["If-Modified-Since"])
+      except (TypeError, ValueError):
+        return False
+      return int(self.mtime) <= since.timestamp()
+    return False
+
+
+class StaticFiles:
+  """Serves files from a fixed set of directories, caching their contents in memory."""
+
+  def __init__(self, allowed_dirs, max_bytes=64 * 1024 * 1024, sendfile_threshold=256 * 1024):
+    self.allowed_dirs = [os.path.abspath(path) for path in allowed_dirs]
+    self.max_bytes = max_bytes
+    self.sendfile_threshold = sendfile_threshold
+    self.assets = collections.OrderedDict()  # filepath -> Asset, least recently used first
+    self.total_bytes = 0
+    self.hits = 0
+    self.misses = 0
+
+  def allowed(self, filepath):
+    return os.path.dirname(filepath) in self.allowed_dirs
+
+  def preload(self):
+    for dirpath in self.allowed_dirs:
+      if not os.path.isdir(dirpath):
+        continue
+      for name in sorted(os.listdir(dirpath)):
+        if os.path.splitext(name)[1].lower() in PRELOAD_EXTENSIONS:
+          self.get(os.path.join(dirpath, name))
+
+  def get(self, filepath):
+    """Returns the Asset for an allowed file, or None if it does not exist.
+
+    The file is re-read if it has changed on disk since it was cached.
+    """
+    try:
+      stat = os.stat(filepath)
+    except OSError:
+      stat = None
+    if stat is None or not S_ISREG(stat.st_mode):
+      self.forget(filepath)
+      return None
+    asset = self.assets.get(filepath)
+    if asset is not None and asset.mtime == stat.st_mtime and asset.size == stat.st_size:
+      self.hits += 1
+      self.assets.move_to_end(filepath)
+      return asset
+    self.misses += 1
+    self.forget(filepath)
+    asset = Asset(filepath, stat)
+    if asset.compressible() or asset.size < self.sendfile_threshold:
+      asset.load()
+      self.assets[filepath] = asset
+      self.total_bytes += asset.memory()
+      self.evict()
+    return asset
+
+  def forget(self, filepath):
+    asset = self.assets.pop(filepath, None)
+    if asset is not None:
+      self.total_bytes -= asset.memory()
+
+  def evict(self):
+    while self.total_bytes > self.max_bytes and len(self.assets) > 1:
+      _, asset = self.assets.popitem(last=False)
+      self.total_bytes -= asset.memory()
+
+  def cache_control(self, asset):
+    if asset.filepath.endswith(LONG_CACHE_EXTENSIONS):
+      return "public, max-age=604800"
+    # Everything else may change when the server is updated; make browsers revalidate.
+    return "no-cache"
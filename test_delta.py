@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+
+import asyncio
+import copy
+import json
+import unittest
+from unittest import mock
+
+import delta
+import game
+from islanders import islanders
+
+
+class DiffTest(unittest.TestCase):
+  def assertRoundTrip(self, old, new):
+    ops = delta.Diff(old, new)
+    self.assertEqual(delta.Apply(copy.deepcopy(old), ops), new)
+    return ops
+
+  def testNoChange(self):
+    self.assertEqual(self.assertRoundTrip({"a": [1, {"b": 2}]}, {"a": [1, {"b": 2}]}), [])
+
+  def testDictChanges(self):
+    ops = self.assertRoundTrip({"a": 1, "b": 2, "c": {"d": 3}}, {"a": 1, "c": {"d": 4}, "e": 5})
+    self.assertCountEqual(
+      ops,
+      [
+        {"op": "remove", "path": "/b"},
+        {"op": "replace", "path": "/c/d", "value": 4},
+        {"op": "add", "path": "/e", "value": 5},
+      ],
+    )
+
+  def testTypeChanges(self):
+    self.assertEqual(len(self.assertRoundTrip({"a": 1}, {"a": True})), 1)
+    self.assertEqual(len(self.assertRoundTrip({"a": [1]}, {"a": {"0": 1}})), 1)
+    self.assertEqual(len(self.assertRoundTrip({"a": None}, {"a": 0})), 1)
+    self.assertRoundTrip([1, 2], {"x": 1})
+
+  def testListChanges(self):
+    self.assertRoundTrip([1, 2, 3], [1, 2, 3, 4, 5])
+    self.assertRoundTrip([1, 2, 3, 4, 5], [1, 9])
+    self.assertRoundTrip([], [1])
+    self.assertRoundTrip([{"a": 1}, {"a": 2}], [{"a": 1}, {"a": 3}, {"a": 4}])
+
+  def testListShift(self):
+    old = [{"text": str(idx)} for idx in range(50)]
+    new = old[2:] + [{"text": "50"}, {"text": "51"}]
+    ops = self.assertRoundTrip(old, new)
+    # Two removals from the front and two appends instead of 50 replacements.
+    self.assertEqual(len(ops), 4)
+
+  def testEscaping(self):
+    ops = self.assertRoundTrip({"a/b": 1, "c~d": 2}, {"a/b": 2, "c~d": 3})
+    self.assertCountEqual([op["path"] for op in ops], ["/a~1b", "/c~0d"])
+
+
+class StreamTest(unittest.TestCase):
+  def testSnapshotsAndPatches(self):
+    stream = delta.Stream()
+    first = json.dumps({"a": 1, "b": "x" * 100})
+    msg = json.loads(stream.encode(first, json.loads(first)))
+    self.assertEqual(msg["type"], "snapshot")
+    self.assertEqual(msg["seq"], 1)
+    self.assertIsNone(stream.encode(first, json.loads(first)))
+
+    second = json.dumps({"a": 2, "b": "x" * 100})
+    msg = json.loads(stream.encode(second, json.loads(second)))
+    self.assertEqual(msg["type"], "patch")
+    self.assertEqual(msg["seq"], 2)
+    self.assertEqual(msg["ops"], [{"op": "replace", "path": "/a", "value": 2}])
+
+  def testLargePatchSendsSnapshot(self):
+    stream = delta.Stream()
+    stream.encode("[1]", [1])
+    msg = json.loads(stream.encode("[2]", [2]))
+    self.assertEqual(msg["type"], "snapshot")
+    self.assertEqual(msg["state"], [2])
+
+  def testPeriodicSnapshot(self):
+    stream = delta.Stream()
+    template = {"a": 0, "b": "x" * 100}
+    types = []
+    for idx in range(delta.SNAPSHOT_INTERVAL + 2):
+      template["a"] = idx
+      message = json.dumps(template)
+      types.append(json.loads(stream.encode(message, json.loads(message)))["type"])
+    self.assertEqual(types.count("snapshot"), 2)
+    self.assertEqual(types[-1], "snapshot")
+
+  def testSharedPatches(self):
+    streams = [delta.Stream() for _ in range(3)]
+    first = json.dumps({"a": 1, "b": "x" * 100})
+    second = json.dumps({"a": 2, "b": "x" * 100})
+    for stream in streams:
+      stream.encode(first, json.loads(first))
+    patches = {}
+    with mock.patch.object(delta, "Diff", wraps=delta.Diff) as diff:
+      messages = [stream.encode(second, json.loads(second), patches) for stream in streams]
+      self.assertEqual(diff.call_count, 1)
+      # A stream that was sent a different state gets its own patch.
+      other = delta.Stream()
+      other.encode(second, json.loads(second))
+      self.assertIsNone(other.encode(second, json.loads(second), patches))
+      self.assertEqual(diff.call_count, 2)
+    self.assertEqual(
+      [json.loads(msg)["ops"] for msg in messages],
+      [[{"op": "replace", "path": "/a", "value": 2}]] * 3,
+    )
+
+
+class FakeWebsocket:
+  def __init__(self):
+    self.sent = []
+
+  async def send(self, message):
+    self.sent.append(json.loads(message))
+
+
+class HandlerTest(unittest.TestCase):
+  def setUp(self):
+    self.handler = game.GameHandler("test", islanders.IslandersGame)
+    self.plain = FakeWebsocket()
+    self.patched = FakeWebsocket()
+    asyncio.run(self.connect(self.plain))
+    asyncio.run(self.connect(self.patched))
+    self.handle(self.patched, {"type": "protocol", "patches": True})
+
+  async def connect(self, websocket):
+    await self.handler.connect_user("one", websocket)
+    await self.handler.flush()
+
+  async def _handle(self, websocket, data):
+    await self.handler.handle(websocket, "one", json.dumps(data))
+    await self.handler.flush()
+
+  def handle(self, websocket, data):
+    asyncio.run(self._handle(websocket, data))
+
+  def testPatchesMatchFullState(self):
+    self.assertEqual(self.patched.sent[-1]["type"], "snapshot")
+    state = self.patched.sent[-1]["state"]
+    self.assertEqual(state, self.plain.sent[-1])
+
+    # Both joins pick a color: a random first color could match the second, making it a no-op.
+    count = len(self.patched.sent)
+    self.handle(self.plain, {"type": "join", "name": "player1", "color": "red"})
+    self.handle(self.plain, {"type": "join", "name": "player1", "color": "blue"})
+    self.assertEqual(len(self.patched.sent), count + 2)
+    self.assertEqual(len(self.plain.sent), len(self.patched.sent))
+    for msg in self.patched.sent[-2:]:
+      self.assertEqual(msg["type"], "patch")
+      state = delta.Apply(state, msg["ops"])
+    self.assertEqual(state, self.plain.sent[-1])
+
+  def testResync(self):
+    self.handle(self.plain, {"type": "join", "name": "player1"})
+    count = len(self.plain.sent)
+    self.handle(self.patched, {"type": "resync"})
+    self.assertEqual(len(self.plain.sent), count)
+    self.assertEqual(self.patched.sent[-1]["type"], "snapshot")
+    self.assertEqual(self.patched.sent[-1]["state"], self.plain.sent[-1])
+
+  def testSpectatorsSharePatches(self):
+    spectators = [FakeWebsocket() for _ in range(3)]
+    for websocket in spectators:
+      asyncio.run(self.connect(websocket))
+      self.handle(websocket, {"type": "protocol", "patches": True})
+    with mock.patch.object(delta, "Diff", wraps=delta.Diff) as diff:
+      self.handle(self.plain, {"type": "join", "name": "player1", "color": "red"})
+    # The other patched websocket was sent the same states as the spectators.
+    self.assertEqual(diff.call_count, 1)
+    for websocket in spectators:
+      self.assertEqual(websocket.sent[-1], self.patched.sent[-1])
+      self.assertEqual(websocket.sent[-1]["type"], "patch")
+
+  def testOptOut(self):
+    self.handle(self.patched, {"type": "protocol", "patches": False})
+    self.handle(self.plain, {"type": "join", "name": "player1"})
+    self.assertEqual(self.patched.sent[-1], self.plain.sent[-1])
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+
+import asyncio
+import json
+import unittest
+
+import eventlog
+import game
+
+# pylint: disable=invalid-name
+
+
+class LogTest(unittest.TestCase):
+  def testSequenceNumbers(self):
+    log = eventlog.Log(3)
+    for entry in "abcde":
+      log.append(entry)
+    self.assertEqual(list(log), ["c", "d", "e"])
+    self.assertEqual(log[-1], "e")
+    self.assertEqual(log.first_seq, 2)
+    self.assertEqual(log.next_seq, 5)
+
+  def testClearKeepsNumbering(self):
+    log = eventlog.Log()
+    log.append("a")
+    log.append("b")
+    log.clear()
+    self.assertEqual(len(log), 0)
+    log.append("c")
+    self.assertEqual(log.first_seq, 2)
+
+  def testCopy(self):
+    log = eventlog.Log(2)
+    log.append("a")
+    copied = log.copy()
+    copied.append("b")
+    copied.append("c")
+    self.assertEqual(list(log), ["a"])
+    self.assertEqual(list(copied), ["b", "c"])
+    self.assertEqual(copied.first_seq, 1)
+
+
+class ViewsTest(unittest.TestCase):
+  def setUp(self):
+    self.log = eventlog.Log(4)
+    self.rendered = []
+    self.views = eventlog.Views(self.render)
+
+  def render(self, entry, audience):
+    self.rendered.append((entry, audience))
+    return f"{entry} for {audience}"
+
+  def entries(self, view):
+    return json.loads(view.json())
+
+  def testRendersEachEntryOnce(self):
+    self.log.append("a")
+    self.log.append("b")
+    view = self.views.view(self.log, 0)
+    self.assertEqual(self.entries(view), ["a for 0", "b for 0"])
+    self.log.append("c")
+    self.assertIs(self.views.view(self.log, 0), view)
+    self.assertIs(self.views.view(self.log, 0), view)
+    self.assertEqual(self.entries(view), ["a for 0", "b for 0", "c for 0"])
+    self.assertEqual(self.rendered, [("a", 0), ("b", 0), ("c", 0)])
+
+  def testAudiences(self):
+    self.log.append("a")
+    self.assertEqual(self.entries(self.views.view(self.log, 0)), ["a for 0"])
+    self.assertEqual(self.entries(self.views.view(self.log, None)), ["a for None"])
+
+  def testDroppedEntries(self):
+    view = self.views.view(self.log, 0)
+    for entry in "abcdef":
+      self.log.append(entry)
+    self.views.view(self.log, 0)
+    self.assertEqual(self.entries(view), ["c for 0", "d for 0", "e for 0", "f for 0"])
+    self.assertEqual(len(self.rendered), 4)
+    self.log.clear()
+    self.views.view(self.log, 0)
+    self.assertEqual(self.entries(view), [])
+
+  def testNewLog(self):
+    self.log.append("a")
+    view = self.views.view(self.log, 0)
+    log = eventlog.Log()
+    self.assertIsNot(self.views.view(log, 0), view)
+    self.assertEqual(self.entries(self.views.view(log, 0)), [])
+
+  def testSince(self):
+    self.log.append("a")
+    view = self.views.view(self.log, 0)
+    message = json.loads(view.since(None))
+    self.assertEqual(message, {"type": "events", "first": 0, "seq": 0, "entries": ["a for 0"]})
+    revision = view.revision
+    self.assertIsNone(view.since(revision))
+    for entry in "bcde":
+      self.log.append(entry)
+    self.views.view(self.log, 0)
+    message = json.loads(view.since(revision))
+    self.assertEqual(message["first"], 1)
+    self.assertEqual(message["seq"], 1)
+    self.assertEqual(message["entries"], ["b for 0", "c for 0", "d for 0", "e for 0"])
+
+  def testOpenEntries(self):
+    still_open = []
+    views = eventlog.Views(lambda entry, audience: entry, is_open=lambda e: e in still_open)
+    first, second = ["a"], ["b"]
+    still_open.append(first)
+    self.log.append(first)
+    self.log.append(second)
+    view = views.view(self.log, None)
+    revision = view.revision
+    # An entry that is not the newest one is still rendered again while it is open.
+    first.append("c")
+    self.log.append(["d"])
+    views.view(self.log, None)
+    message = json.loads(view.since(revision))
+    self.assertEqual(message["seq"], 0)
+    self.assertEqual(message["entries"], [["a", "c"], ["b"], ["d"]])
+    # It is rendered once more after it closes, and then no more.
+    revision = view.revision
+    first.append("e")
+    still_open.clear()
+    views.view(self.log, None)
+    self.assertEqual(json.loads(view.since(revision))["entries"][0], ["a", "c", "e"])
+    revision = view.revision
+    first.append("f")
+    second.append("g")
+    views.view(self.log, None)
+    self.assertIsNone(view.since(revision))
+
+
+class FakeGame(game.BaseGame):
+  def __init__(self):
+    self.log = eventlog.Log(5)
+    self.views = eventlog.Views(lambda entry, audience: entry)
+
+  def game_url(self, game_id):
+    return f"/fake?game_id={game_id}"
+
+  def connect_user(self, session):
+    pass
+
+  def disconnect_user(self, session):
+    pass
+
+  def json_str(self):
+    return "{}"
+
+  def for_player(self, session):
+    return json.dumps({"count": self.log.next_seq})
+
+  def event_views(self, sessions):
+    view = self.views.view(self.log, None)
+    return {session: view for session in sessions}
+
+  def handle(self, session, data):
+    for _ in range(data["count"]):
+      self.log.append(self.log.next_seq)
+      yield None
+
+  @classmethod
+  def parse_json(cls, data):  # pylint: disable=unused-argument
+    return cls()
+
+
+class FakeWebsocket:
+  def __init__(self):
+    self.sent = []
+
+  async def send(self, message):
+    self.sent.append(json.loads(message))
+
+
+class HandlerTest(unittest.TestCase):
+  def setUp(self):
+    self.handler = game.GameHandler("test", FakeGame)
+    self.plain = FakeWebsocket()
+    self.events = FakeWebsocket()
+    self.send(self.handler.connect_user("one", self.plain))
+    self.send(self.handler.connect_user("one", self.events))
+    self.handle(self.events, {"type": "protocol", "events": True})
+
+  def send(self, coro):
+    async def send():
+      await coro
+      await self.handler.flush()
+
+    asyncio.run(send())
+
+  def handle(self, websocket, data):
+    self.send(self.handler.handle(websocket, "one", json.dumps(data)))
+
+  def replay(self, messages):
+    """Applies events messages the same way that patch.js does."""
+    log, first = None, None
+    for message in messages:
+      if message.get("type") != "events":
+        continue
+      if log is None or message["seq"] == message["first"]:
+        log, first = [], message["seq"]
+      self.assertLessEqual(message["seq"], first + len(log))
+      log = log[: message["seq"] - first] + message["entries"]
+      if message["first"] > first:
+        log, first = log[message["first"] - first :], message["first"]
+    return log
+
+  def testOnlyNewEntriesSent(self):
+    self.handle(self.plain, {"count": 3})
+    self.handle(self.plain, {"count": 4})
+    messages = [msg for msg in self.events.sent if msg.get("type") == "events"]
+    self.assertEqual(sum(len(msg["entries"]) for msg in messages), 7)
+    self.assertEqual(messages[-1], {"type": "events", "first": 2, "seq": 6, "entries": [6]})
+    self.assertEqual(self.replay(self.events.sent), [2, 3, 4, 5, 6])
+    self.assertEqual(self.plain.sent[-1]["event_log"], [2, 3, 4, 5, 6])
+    self.assertNotIn("event_log", self.events.sent[-1])
+
+  def testEventsComeBeforeTheirState(self):
+    self.handle(self.plain, {"count": 2})
+    start = next(idx for idx, msg in enumerate(self.events.sent) if msg.get("type") == "events")
+    for idx, message in enumerate(self.events.sent[start:], start=start):
+      if "count" in message:
+        with self.subTest(count=message["count"]):
+          self.assertEqual(self.replay(self.events.sent[:idx]), list(range(message["count"])))
+
+  def testResyncSendsWholeLog(self):
+    self.handle(self.plain, {"count": 3})
+    count = len(self.events.sent)
+    self.handle(self.events, {"type": "resync"})
+    self.assertEqual(
+      self.events.sent[count:],
+      [{"type": "events", "first": 0, "seq": 0, "entries": [0, 1, 2]}, {"count": 3}],
+    )
+
+  def testLoadSendsWholeLog(self):
+    self.handle(self.plain, {"count": 3})
+    self.handler.game = FakeGame()
+    self.handle(self.plain, {"count": 1})
+    self.assertEqual(self.events.sent[-2], {"type": "events", "first": 0, "seq": 0, "entries": [0]})
+    self.assertEqual(self.replay(self.events.sent), [0])
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+
+import asyncio
+from concurrent import futures
+import json
+import threading
+import time
+import unittest
+from unittest import mock
+
+import game
+
+
+class FakeGame(game.BaseGame):
+  def __init__(self):
+    self.value = 0
+    self.status = "fake"
+    self.threads = set()
+
+  def game_url(self, game_id):
+    return f"/fake?game_id={game_id}"
+
+  def game_status(self):
+    return self.status
+
+  def connect_user(self, session):
+    pass
+
+  def disconnect_user(self, session):
+    pass
+
+  def json_str(self):
+    return json.dumps({"value": self.value})
+
+  def for_player(self, session):
+    return json.dumps({"value": self.value})
+
+  def handle(self, session, data):
+    if "sleep" in data:
+      self.threads.add(threading.current_thread().name)
+      time.sleep(data["sleep"])
+      self.value += 1
+      return None
+    return self.count(data["count"])
+
+  def count(self, count):
+    for _ in range(count):
+      self.threads.add(threading.current_thread().name)
+      self.value += 1
+      yield None
+
+  @classmethod
+  def parse_json(cls, data):  # pylint: disable=unused-argument
+    return None
+
+
+class FakeWebsocket:
+  def __init__(self, delay=0):
+    self.delay = delay
+    self.sent = []
+
+  async def send(self, message):
+    await asyncio.sleep(self.delay)
+    self.sent.append(json.loads(message))
+
+
+class GameHandlerTest(unittest.TestCase):
+  def setUp(self):
+    self.fast = FakeWebsocket()
+    self.slow = FakeWebsocket(delay=0.01)
+
+  async def play(self, handler, count):
+    await handler.connect_user("a", self.fast)
+    await handler.connect_user("b", self.slow)
+    await handler.handle(self.fast, "a", json.dumps({"count": count}))
+    await handler.flush()
+
+  def testEveryStateSent(self):
+    handler = game.GameHandler("test", FakeGame)
+    asyncio.run(self.play(handler, 5))
+    self.assertEqual([msg["value"] for msg in self.fast.sent], [0, 0, 1, 2, 3, 4, 5])
+    self.assertEqual(self.slow.sent, self.fast.sent[1:])
+
+  def testSlowClientDropsSupersededStates(self):
+    handler = game.GameHandler("test", FakeGame, max_backlog=2)
+    asyncio.run(self.play(handler, 20))
+    self.assertEqual(len(self.fast.sent), 22)
+    self.assertLess(len(self.slow.sent), 10)
+    # The slow client still sees the final state, and states arrive in order.
+    values = [msg["value"] for msg in self.slow.sent]
+    self.assertEqual(values[-1], 20)
+    self.assertListEqual(values, sorted(values))
+
+  def testFrameInterval(self):
+    handler = game.GameHandler("test", FakeGame, frame_interval=10)
+    with mock.patch("game.time") as fake_time:
+      # The nth state is yielded at time 2n.
+      fake_time.monotonic.side_effect = range(2, 100, 2)
+      fake_time.perf_counter.return_value = 0
+      asyncio.run(self.play(handler, 12))
+    # Only one state every 10 seconds, but the final state is always sent.
+    self.assertEqual([msg["value"] for msg in self.fast.sent], [0, 0, 1, 6, 11, 12])
+
+  def testErrorsAreNotDropped(self):
+    handler = game.GameHandler("test", FakeGame, max_backlog=1)
+
+    async def play():
+      await handler.connect_user("b", self.slow)
+      await handler.handle(self.slow, "b", "not json")
+      await handler.handle(self.slow, "b", json.dumps({"count": 5}))
+      await handler.flush()
+
+    asyncio.run(play())
+    self.assertEqual(len([msg for msg in self.slow.sent if msg.get("type") == "error"]), 1)
+    self.assertEqual(self.slow.sent[-1], {"value": 5})
+
+
+class ExecutorTest(unittest.TestCase):
+  def setUp(self):
+    self.executor = futures.ThreadPoolExecutor(2, thread_name_prefix="game")
+    self.addCleanup(self.executor.shutdown)
+
+  def testMovesRunOnExecutor(self):
+    handler = game.GameHandler("test", FakeGame, executor=self.executor)
+    websocket = FakeWebsocket()
+
+    async def play():
+      await handler.connect_user("a", websocket)
+      await handler.handle(websocket, "a", json.dumps({"count": 3}))
+      await handler.flush()
+
+    asyncio.run(play())
+    self.assertEqual([msg["value"] for msg in websocket.sent], [0, 1, 2, 3])
+    self.assertTrue(handler.game.threads)
+    self.assertNotIn(threading.current_thread().name, handler.game.threads)
+
+  def testLoopIsNotBlocked(self):
+    slow_game = game.GameHandler("slow", FakeGame, executor=self.executor)
+    fast_game = game.GameHandler("fast", FakeGame, executor=self.executor)
+    slow = FakeWebsocket()
+    fast = FakeWebsocket()
+
+    async def play():
+      await slow_game.connect_user("a", slow)
+      await fast_game.connect_user("b", fast)
+      moves = [
+        asyncio.create_task(slow_game.handle(slow, "a", json.dumps({"sleep": 0.2})))
+        for _ in range(3)
+      ]
+      await asyncio.sleep(0.05)
+      # The slow game has one move running and two waiting behind it.
+      self.assertEqual(slow_game.stats.depth, 3)
+      await fast_game.handle(fast, "b", json.dumps({"count": 1}))
+      await fast_game.flush()
+      # The fast game's move finished while the first slow move was still running.
+      self.assertEqual(fast.sent[-1], {"value": 1})
+      self.assertEqual(slow_game.game.value, 0)
+      await asyncio.gather(*moves)
+      await slow_game.flush()
+
+    asyncio.run(play())
+    # Moves for the same game ran one after another, in order.
+    self.assertEqual([msg["value"] for msg in slow.sent], [0, 1, 2, 3])
+    stats = slow_game.stats.json_repr()
+    self.assertEqual(stats["depth"], 0)
+    self.assertEqual(stats["max_depth"], 3)
+    self.assertEqual(stats["moves"], 3)
+    self.assertGreaterEqual(stats["max_seconds"], 0.55)
+
+
+if __name__ == "__main__":
+  unittest.main()
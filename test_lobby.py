@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+
+import asyncio
+import json
+import unittest
+from unittest import mock
+
+import game
+import lobby
+from test_game import FakeGame, FakeWebsocket
+
+
+def Entry(game_id, game_type="islanders", status="new"):
+  return {"game_id": game_id, "game_type": game_type, "status": status, "url": f"/{game_id}"}
+
+
+class LobbyTest(unittest.TestCase):
+  def setUp(self):
+    self.lobby = lobby.Lobby()
+    for game_id in ["aa", "bb", "cc"]:
+      self.lobby.update(Entry(game_id))
+    self.lobby.update(Entry("dd", "eldritch"))
+
+  def run_lobby(self, func):
+    async def run():
+      func()
+      await asyncio.sleep(0)
+      for subscription in self.lobby.subscriptions.values():
+        if subscription.outbox.task:
+          await subscription.outbox.task
+
+    asyncio.run(run())
+
+  def testSnapshot(self):
+    websocket = FakeWebsocket()
+    self.run_lobby(lambda: self.lobby.subscribe(websocket))
+    self.assertEqual(len(websocket.sent), 1)
+    self.assertEqual(websocket.sent[0]["type"], "games")
+    self.assertEqual(
+      [entry["game_id"] for entry in websocket.sent[0]["games"]], ["aa", "bb", "cc", "dd"]
+    )
+    self.assertEqual(websocket.sent[0]["total"], 4)
+
+  def testOnlyChangesAreSent(self):
+    websocket = FakeWebsocket()
+    self.run_lobby(lambda: self.lobby.subscribe(websocket))
+
+    def changes():
+      self.lobby.set_status("bb", "new")  # Unchanged, so nothing is sent.
+      self.lobby.set_status("bb", "started")
+      self.lobby.update(Entry("ee"))
+      self.lobby.remove("aa")
+      self.lobby.remove("zz")
+
+    self.run_lobby(changes)
+    self.assertEqual(
+      websocket.sent[1:],
+      [
+        {"type": "lobby", "changed": [Entry("bb", status="started")], "removed": [], "total": 4},
+        {"type": "lobby", "changed": [Entry("ee")], "removed": [], "total": 5},
+        {"type": "lobby", "changed": [], "removed": ["aa"], "total": 4},
+      ],
+    )
+
+  def testFilterAndPage(self):
+    websocket = FakeWebsocket()
+    self.run_lobby(lambda: self.lobby.subscribe(websocket, "islanders", 1, 1))
+    self.assertEqual(websocket.sent[0]["games"], [Entry("bb")])
+    self.assertEqual(websocket.sent[0]["total"], 3)
+
+    def changes():
+      self.lobby.set_status("dd", "started")  # Different game type.
+      self.lobby.set_status("cc", "started")  # Not on this page.
+      self.lobby.update(Entry("ab"))  # Pushes bb off the page.
+
+    self.run_lobby(changes)
+    self.assertEqual(
+      websocket.sent[1:],
+      [{"type": "lobby", "changed": [Entry("ab")], "removed": ["bb"], "total": 4}],
+    )
+
+  def testStatusChangesDoNotRepage(self):
+    websocket = FakeWebsocket()
+    self.run_lobby(lambda: self.lobby.subscribe(websocket, "islanders", 0, 1))
+    subscription = self.lobby.subscriptions[websocket]
+
+    def changes():
+      with mock.patch.object(subscription, "page", wraps=subscription.page) as page:
+        self.lobby.set_status("aa", "started")
+        self.lobby.set_status("cc", "started")
+        self.assertEqual(page.call_count, 0)
+        self.lobby.remove("aa")
+        self.assertEqual(page.call_count, 1)
+
+    self.run_lobby(changes)
+    self.assertEqual(
+      websocket.sent[1:],
+      [
+        {"type": "lobby", "changed": [Entry("aa", status="started")], "removed": [], "total": 3},
+        {"type": "lobby", "changed": [Entry("bb")], "removed": ["aa"], "total": 2},
+      ],
+    )
+
+  def testGameTypeChanges(self):
+    websocket = FakeWebsocket()
+    self.run_lobby(lambda: self.lobby.subscribe(websocket, "eldritch"))
+    self.run_lobby(lambda: self.lobby.update(Entry("bb", "eldritch")))
+    self.assertEqual(websocket.sent[-1]["changed"], [Entry("bb", "eldritch")])
+    self.assertEqual(websocket.sent[-1]["total"], 2)
+    self.assertEqual(self.lobby.game_ids["islanders"], ["aa", "cc"])
+    self.assertEqual(self.lobby.game_ids["eldritch"], ["bb", "dd"])
+    self.assertEqual(
+      [entry["game_id"] for entry in self.lobby.game_list()], ["aa", "bb", "cc", "dd"]
+    )
+
+  def testUnsubscribe(self):
+    websocket = FakeWebsocket()
+    self.run_lobby(lambda: self.lobby.subscribe(websocket))
+    self.lobby.unsubscribe(websocket)
+    self.run_lobby(lambda: self.lobby.update(Entry("ee")))
+    self.assertEqual(len(websocket.sent), 1)
+
+  def testGameHandlerReportsStatus(self):
+    handler = game.GameHandler("ff", FakeGame, lobby=self.lobby)
+    self.lobby.update(Entry("ff", "fake", handler.game_status()))
+    watcher = FakeWebsocket()
+    player = FakeWebsocket()
+
+    async def play():
+      self.lobby.subscribe(watcher, "fake")
+      await handler.connect_user("a", player)
+      handler.game.status = "playing"
+      await handler.handle(player, "a", json.dumps({"count": 2}))
+      await handler.flush()
+      await self.lobby.subscriptions[watcher].outbox.task
+
+    asyncio.run(play())
+    statuses = [entry["status"] for msg in watcher.sent[1:] for entry in msg["changed"]]
+    self.assertEqual(statuses, ["playing"])
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+
+import asyncio
+import json
+import os
+import tempfile
+import unittest
+
+from eldritch import eldritch
+from islanders import islanders
+from mansion import mansion
+import game
+import persist
+from test_game import FakeWebsocket
+
+GAME_TYPES = {
+  "islanders": islanders.IslandersGame,
+  "eldritch": eldritch.EldritchGame,
+  "mansion": mansion.MansionGame,
+}
+
+
+def MakeGame():
+  gamedata = islanders.IslandersGame()
+  for session in ["one", "two", "three"]:
+    gamedata.connect_user(session)
+    gamedata.handle_join(session, {"name": session})
+  gamedata.handle_start("one", {"options": {}})
+  return gamedata
+
+
+class JournalTest(unittest.TestCase):
+  def setUp(self):
+    self.tmpdir = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+    self.addCleanup(self.tmpdir.cleanup)
+    self.store = persist.Store(self.tmpdir.name, GAME_TYPES, snapshot_interval=3)
+    self.game = MakeGame()
+    self.journal = self.store.journal("aa", "islanders")
+    self.addCleanup(self.journal.close)
+
+  def recover(self):
+    self.journal.close()
+    recovered = self.store.recover()
+    self.assertEqual(
+      [(game_id, game_type) for game_id, game_type, _, _ in recovered], [("aa", "islanders")]
+    )
+    _, _, gamedata, journal = recovered[0]
+    self.addCleanup(journal.close)
+    return gamedata, journal
+
+  def change(self, idx):
+    self.game.game.player_data[idx % 3].cards["rsrc1"] += 1
+    self.journal.record(self.game, "one", {"type": "change", "idx": idx})
+
+  def assertSameGame(self, gamedata):
+    self.assertEqual(json.loads(gamedata.json_str()), json.loads(self.game.json_str()))
+
+  def testUnstartedGameIsNotSaved(self):
+    self.journal.record(islanders.IslandersGame())
+    self.assertEqual(os.listdir(self.tmpdir.name), [])
+
+  def testRecoverFromLog(self):
+    self.journal.record(self.game)
+    self.change(0)
+    self.change(1)
+    with open(self.journal.log_path, encoding="ascii") as log:
+      entries = [json.loads(line) for line in log]
+    self.assertEqual([entry["seq"] for entry in entries], [1, 2])
+    self.assertEqual(entries[1]["move"], {"type": "change", "idx": 1})
+
+    gamedata, _ = self.recover()
+    self.assertSameGame(gamedata)
+
+  def testSnapshotStartsNewLog(self):
+    self.journal.record(self.game)
+    for idx in range(7):
+      self.change(idx)
+    # Snapshots were taken after the 3rd and 6th changes.
+    with open(self.journal.log_path, encoding="ascii") as log:
+      self.assertEqual([json.loads(line)["seq"] for line in log], [7])
+    gamedata, _ = self.recover()
+    self.assertSameGame(gamedata)
+
+  def testUnchangedStateIsNotLogged(self):
+    self.journal.record(self.game)
+    self.journal.record(self.game, "one", {"type": "nothing"})
+    self.assertEqual(os.path.getsize(self.journal.log_path), 0)
+
+  def testPartiallyWrittenEntry(self):
+    self.journal.record(self.game)
+    self.change(0)
+    self.journal.log.write('{"seq": 2, "ops": [{"op": "rep')
+    self.journal.log.flush()
+    gamedata, journal = self.recover()
+    self.assertSameGame(gamedata)
+
+    # New entries are appended after the last complete one.
+    self.journal = journal
+    self.game = gamedata
+    self.change(1)
+    gamedata, _ = self.recover()
+    self.assertSameGame(gamedata)
+
+  def testStaleLogAfterSnapshot(self):
+    self.journal.record(self.game)
+    self.change(0)
+    with open(self.journal.log_path, encoding="ascii") as log:
+      stale = log.read()
+    for idx in range(1, 3):
+      self.change(idx)
+    # Pretend we crashed after writing the snapshot, but before starting the new log.
+    self.journal.close()
+    with open(self.journal.log_path, "w", encoding="ascii") as log:
+      log.write(stale)
+    gamedata, _ = self.recover()
+    self.assertSameGame(gamedata)
+
+  def testUnsavableGameType(self):
+    self.assertIsNone(self.store.journal("bb", "mansion"))
+
+  def testEldritchGame(self):
+    gamedata = eldritch.EldritchGame()
+    gamedata.connect_user("one")
+    moves = [{"type": "ancient", "ancient": "Wendigo"}, {"type": "join", "char": "Nun"}]
+    for move in [*moves, {"type": "start"}]:
+      for _ in gamedata.handle("one", move):
+        pass
+    journal = self.store.journal("bb", "eldritch")
+    journal.record(gamedata)
+    move = {"type": "set_slider", "name": "done"}
+    for _ in gamedata.handle("one", move):
+      pass
+    journal.record(gamedata, "one", move)
+    journal.close()
+
+    recovered = self.store.recover()
+    self.assertEqual(len(recovered), 1)
+    game_id, game_type, recovered, recovered_journal = recovered[0]
+    self.addCleanup(recovered_journal.close)
+    self.assertEqual((game_id, game_type), ("bb", "eldritch"))
+    self.assertEqual(recovered.game.turn_number, gamedata.game.turn_number)
+    self.assertEqual(json.loads(recovered.json_str()), json.loads(gamedata.json_str()))
+
+  def testGameHandlerSavesMoves(self):
+    handler = game.GameHandler("aa", islanders.IslandersGame, journal=self.journal)
+    handler.game = self.game
+    websocket = FakeWebsocket()
+
+    async def play():
+      await handler.connect_user("two", websocket)
+      await handler.handle(websocket, "two", json.dumps({"type": "rename", "name": "deux"}))
+      await handler.flush()
+
+    asyncio.run(play())
+    gamedata, _ = self.recover()
+    self.assertEqual(gamedata.game.player_data[gamedata.player_sessions["two"]].name, "deux")
+
+
+if __name__ == "__main__":
+  unittest.main()
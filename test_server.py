@@ -0,0 +1,389 @@
+#!/usr/bin/env python3
+
+import asyncio
+import gzip
+import json
+import os
+import unittest
+from unittest import mock
+
+import websockets.server
+
+import lobby
+import server
+import shard
+
+
+async def Request(reader, writer, method, path, *, body=b"", headers=None):
+  lines = [f"{method} {path} HTTP/1.1", "Host: localhost", f"Content-Length: {len(body)}"]
+  lines.extend(f"{key}: {value}" for key, value in (headers or {}).items())
+  writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("ascii") + body)
+  await writer.drain()
+  head = await reader.readuntil(b"\r\n\r\n")
+  status_line, *header_lines = head.decode("ascii").strip().split("\r\n")
+  response_headers = dict(line.split(": ", 1) for line in header_lines)
+  data = await reader.readexactly(int(response_headers["Content-Length"]))
+  return int(status_line.split()[1]), response_headers, data
+
+
+class ServerTest(unittest.TestCase):
+  def setUp(self):
+    self.port = None
+    self.games = dict(server.GAMES)
+    self.addCleanup(self.restore_games)
+    lobby_patch = mock.patch.object(server, "LOBBY", lobby.Lobby())
+    lobby_patch.start()
+    self.addCleanup(lobby_patch.stop)
+
+  def restore_games(self):
+    server.GAMES.clear()
+    server.GAMES.update(self.games)
+
+  def run_client(self, client):
+    async def run():
+      http_server = await asyncio.start_server(server.MyHandler.serve_connection, "127.0.0.1", 0)
+      self.port = http_server.sockets[0].getsockname()[1]
+      async with http_server:
+        reader, writer = await asyncio.open_connection("127.0.0.1", self.port)
+        try:
+          await client(reader, writer)
+        finally:
+          writer.close()
+
+    asyncio.run(run())
+
+  def testStaticFiles(self):
+    async def client(reader, writer):
+      status, headers, data = await Request(reader, writer, "GET", "/")
+      self.assertEqual(status, 200)
+      self.assertIn("Set-Cookie", headers)
+      self.assertIn(b"<html", data.lower())
+
+      # Same connection is kept alive for the next request.
+      status, _, _ = await Request(reader, writer, "GET", "/islanders/islanders.html")
+      self.assertEqual(status, 200)
+      status, _, _ = await Request(reader, writer, "GET", "/../etc/passwd")
+      self.assertEqual(status, 403)
+      status, _, _ = await Request(reader, writer, "GET", "/nonexistent.js")
+      self.assertEqual(status, 404)
+
+    self.run_client(client)
+
+  def testConditionalAndCompressed(self):
+    async def client(reader, writer):
+      path = "/islanders/islanders.js"
+      status, headers, data = await Request(reader, writer, "GET", path)
+      self.assertEqual(status, 200)
+      self.assertNotIn("Content-Encoding", headers)
+      self.assertEqual(headers["Cache-Control"], "no-cache")
+
+      status, _, empty = await Request(
+        reader, writer, "GET", path, headers={"If-None-Match": headers["ETag"]}
+      )
+      self.assertEqual(status, 304)
+      self.assertEqual(empty, b"")
+
+      status, gzip_headers, compressed = await Request(
+        reader, writer, "GET", path, headers={"Accept-Encoding": "gzip"}
+      )
+      self.assertEqual(status, 200)
+      self.assertEqual(gzip_headers["Content-Encoding"], "gzip")
+      self.assertEqual(gzip_headers["Vary"], "Accept-Encoding")
+      self.assertEqual(gzip.decompress(compressed), data)
+      self.assertNotEqual(gzip_headers["ETag"], headers["ETag"])
+
+      # The plain file's ETag does not validate the compressed variant, and vice versa.
+      status, _, _ = await Request(
+        reader,
+        writer,
+        "GET",
+        path,
+        headers={"Accept-Encoding": "gzip", "If-None-Match": headers["ETag"]},
+      )
+      self.assertEqual(status, 200)
+      status, not_modified_headers, _ = await Request(
+        reader,
+        writer,
+        "GET",
+        path,
+        headers={"Accept-Encoding": "gzip", "If-None-Match": gzip_headers["ETag"]},
+      )
+      self.assertEqual(status, 304)
+      self.assertEqual(not_modified_headers["ETag"], gzip_headers["ETag"])
+      self.assertEqual(not_modified_headers["Vary"], "Accept-Encoding")
+      status, _, _ = await Request(
+        reader, writer, "GET", path, headers={"If-None-Match": gzip_headers["ETag"]}
+      )
+      self.assertEqual(status, 200)
+
+    self.run_client(client)
+
+  def testSendfile(self):
+    path = "/islanders/images/sulfurport.png"
+    with open(os.path.join(server.ROOT_DIR, path.lstrip("/")), "rb") as reader:
+      expected = reader.read()
+
+    async def client(reader, writer):
+      status, headers, data = await Request(reader, writer, "GET", path)
+      self.assertEqual(status, 200)
+      self.assertEqual(headers["Content-Type"], "image/png")
+      self.assertEqual(headers["Cache-Control"], "public, max-age=604800")
+      self.assertEqual(data, expected)
+      # The connection is still usable afterwards.
+      status, _, _ = await Request(reader, writer, "GET", "/index.js")
+      self.assertEqual(status, 200)
+
+    with mock.patch.object(server.STATIC_FILES, "sendfile_threshold", 1024):
+      server.STATIC_FILES.forget(os.path.join(server.ROOT_DIR, path.lstrip("/")))
+      self.run_client(client)
+      self.assertNotIn(os.path.join(server.ROOT_DIR, path.lstrip("/")), server.STATIC_FILES.assets)
+
+  def testGameUrls(self):
+    async def client(reader, writer):
+      status, headers, _ = await Request(reader, writer, "POST", "/new", body=b"type=islanders")
+      self.assertEqual(status, 301)
+      game_id = headers["Location"].split("game_id=")[1]
+      self.assertIn(game_id, server.GAMES)
+
+      status, _, data = await Request(reader, writer, "GET", f"/json?game_id={game_id}")
+      self.assertEqual(status, 200)
+      self.assertIsInstance(json.loads(data), dict)
+      status, _, data = await Request(reader, writer, "GET", f"/stats?game_id={game_id}")
+      self.assertEqual(status, 200)
+      self.assertEqual(json.loads(data)["moves"], 0)
+
+      status, _, _ = await Request(reader, writer, "POST", f"/load?game_id={game_id}", body=b"{")
+      self.assertEqual(status, 400)
+      status, _, _ = await Request(reader, writer, "GET", "/json?game_id=nonexistent")
+      self.assertEqual(status, 400)
+      status, _, _ = await Request(reader, writer, "POST", "/new", body=b"type=unknown")
+      self.assertEqual(status, 400)
+
+    self.run_client(client)
+
+  def testGameListDoesNotTouchGames(self):
+    async def client(reader, writer):
+      status, headers, _ = await Request(reader, writer, "POST", "/new", body=b"type=islanders")
+      self.assertEqual(status, 301)
+      game_id = headers["Location"].split("game_id=")[1]
+
+      # A move may be changing the game on another thread, so the list must not read from it.
+      with mock.patch.object(
+        server.game_handler.GameHandler, "game_status", side_effect=AssertionError
+      ):
+        status, _, data = await Request(reader, writer, "GET", "/games")
+      self.assertEqual(status, 200)
+      self.assertIn(game_id, [entry["game_id"] for entry in json.loads(data)])
+
+    self.run_client(client)
+
+  def testConnectionClose(self):
+    async def client(reader, writer):
+      status, headers, _ = await Request(
+        reader, writer, "GET", "/index.js", headers={"Connection": "close"}
+      )
+      self.assertEqual(status, 200)
+      self.assertEqual(headers["Connection"], "close")
+      self.assertEqual(await reader.read(), b"")
+
+    self.run_client(client)
+
+  def testIdleTimeout(self):
+    async def client(reader, writer):
+      del writer
+      self.assertEqual(await asyncio.wait_for(reader.read(), 5), b"")
+
+    with mock.patch.object(server.MyHandler, "idle_timeout", 0.05):
+      self.run_client(client)
+
+  def testShutdownWithOpenConnection(self):
+    errors = []
+
+    async def run():
+      asyncio.get_running_loop().set_exception_handler(lambda _, context: errors.append(context))
+      http_server = await asyncio.start_server(server.MyHandler.serve_connection, "127.0.0.1", 0)
+      port = http_server.sockets[0].getsockname()[1]
+      reader, writer = await asyncio.open_connection("127.0.0.1", port)
+      status, _, _ = await Request(reader, writer, "GET", "/index.js")
+      self.assertEqual(status, 200)
+      http_server.close()
+      # Cancel the handler while it waits for a second request, as asyncio.run does on shutdown.
+      for task in asyncio.all_tasks() - {asyncio.current_task()}:
+        task.cancel()
+      self.assertEqual(await asyncio.wait_for(reader.read(), 5), b"")
+      writer.close()
+
+    asyncio.run(run())
+    self.assertEqual(errors, [])
+
+  def testBadContentLength(self):
+    async def send(length):
+      reader, writer = await asyncio.open_connection("127.0.0.1", self.port)
+      try:
+        writer.write(f"POST /new HTTP/1.1\r\nContent-Length: {length}\r\n\r\n".encode("ascii"))
+        await writer.drain()
+        response = await reader.read()  # The server answers and then hangs up.
+        return int(response.split(b" ", 2)[1])
+      finally:
+        writer.close()
+
+    async def client(reader, writer):
+      del reader, writer
+      self.assertEqual(await send("ten"), 400)
+      self.assertEqual(await send("-1"), 400)
+      self.assertEqual(await send(str(server.MyHandler.max_body_size + 1)), 413)
+
+    self.run_client(client)
+
+
+class ShardTest(unittest.TestCase):
+  def setUp(self):
+    self.games = dict(server.GAMES)
+    self.addCleanup(self.restore)
+    lobby_patch = mock.patch.object(server, "LOBBY", lobby.Lobby())
+    lobby_patch.start()
+    self.addCleanup(lobby_patch.stop)
+
+  def restore(self):
+    server.GAMES.clear()
+    server.GAMES.update(self.games)
+    server.ROUTER = None
+
+  async def startServers(self):
+    # Both "workers" live in this process, so they share GAMES; that's fine for routing.
+    worker_servers = [
+      await asyncio.start_server(server.MyHandler.serve_connection, "127.0.0.1", 0)
+      for _ in range(2)
+    ]
+    workers = [
+      shard.Worker(idx, srv.sockets[0].getsockname()[1], None)
+      for idx, srv in enumerate(worker_servers)
+    ]
+    server.ROUTER = shard.Router(workers)
+    front = await asyncio.start_server(server.FrontHandler.serve_connection, "127.0.0.1", 0)
+    return front, worker_servers, workers
+
+  def testFrontForwardsToWorkers(self):
+    async def run():
+      front, worker_servers, workers = await self.startServers()
+      port = front.sockets[0].getsockname()[1]
+      reader, writer = await asyncio.open_connection("127.0.0.1", port)
+      try:
+        game_ids = []
+        for _ in range(4):
+          status, headers, _ = await Request(reader, writer, "POST", "/new", body=b"type=islanders")
+          self.assertEqual(status, 301)
+          game_ids.append(headers["Location"].split("game_id=")[1])
+        self.assertEqual([len(worker.games) for worker in workers], [2, 2])
+        self.assertCountEqual(server.ROUTER.owners.keys(), game_ids)
+
+        status, _, data = await Request(reader, writer, "GET", f"/json?game_id={game_ids[1]}")
+        self.assertEqual(status, 200)
+        self.assertIsInstance(json.loads(data), dict)
+        status, _, _ = await Request(reader, writer, "GET", "/json?game_id=nonexistent")
+        self.assertEqual(status, 400)
+
+        status, _, data = await Request(reader, writer, "GET", "/games")
+        self.assertEqual(status, 200)
+        # Each worker reports every game (they share GAMES here), but the ids are what matter.
+        self.assertCountEqual({game["game_id"] for game in json.loads(data)}, game_ids)
+
+        status, _, _ = await Request(reader, writer, "GET", "/index.js")
+        self.assertEqual(status, 200)
+      finally:
+        writer.close()
+        front.close()
+        for srv in worker_servers:
+          srv.close()
+
+    asyncio.run(run())
+
+  def testConcurrentNewGamesGetDistinctIds(self):
+    async def run():
+      front, worker_servers, _ = await self.startServers()
+      port = front.sockets[0].getsockname()[1]
+      connections = [await asyncio.open_connection("127.0.0.1", port) for _ in range(2)]
+      try:
+        # Every generated id is "aa", so only one of the two requests may have it.
+        with mock.patch.object(server.random, "choice", return_value="a"):
+          results = await asyncio.gather(
+            *[
+              Request(reader, writer, "POST", "/new", body=b"type=islanders")
+              for reader, writer in connections
+            ]
+          )
+        self.assertCountEqual([status for status, _, _ in results], [301, 500])
+        self.assertEqual(list(server.ROUTER.owners), ["aa"])
+        self.assertFalse(server.ROUTER.reserved)
+      finally:
+        for _, writer in connections:
+          writer.close()
+        front.close()
+        for srv in worker_servers:
+          srv.close()
+
+    asyncio.run(run())
+
+  def testFailedNewGameReleasesId(self):
+    async def run():
+      front, worker_servers, _ = await self.startServers()
+      port = front.sockets[0].getsockname()[1]
+      reader, writer = await asyncio.open_connection("127.0.0.1", port)
+      try:
+        with mock.patch.object(server.random, "choice", return_value="b"):
+          status, _, _ = await Request(reader, writer, "POST", "/new", body=b"type=nonexistent")
+          self.assertEqual(status, 400)
+          self.assertFalse(server.ROUTER.reserved)
+          status, headers, _ = await Request(reader, writer, "POST", "/new", body=b"type=islanders")
+        self.assertEqual(status, 301)
+        self.assertTrue(headers["Location"].endswith("game_id=bb"))
+      finally:
+        writer.close()
+        front.close()
+        for srv in worker_servers:
+          srv.close()
+
+    asyncio.run(run())
+
+  def testFrontMirrorsWorkerLobbies(self):
+    def Entry(game_id, status):
+      return {"game_id": game_id, "game_type": "islanders", "status": status, "url": "/"}
+
+    async def Wait(condition):
+      for _ in range(100):
+        if condition():
+          return
+        await asyncio.sleep(0.01)
+
+    async def run():
+      server.LOBBY.update(Entry("aa", "new"))
+      ws_server = await websockets.server.serve(  # pylint: disable=no-member
+        server.HandleWebsocket, "127.0.0.1", 0
+      )
+      worker = shard.Worker(0, None, next(iter(ws_server.sockets)).getsockname()[1])
+      router = shard.Router([worker])
+      front_lobby = lobby.Lobby()
+      watcher = asyncio.create_task(router.watch_lobby(worker, front_lobby))
+      try:
+        await Wait(lambda: front_lobby.games)
+        self.assertEqual(front_lobby.game_list(), [Entry("aa", "new")])
+        self.assertIs(router.owner("aa"), worker)
+
+        server.LOBBY.update(Entry("bb", "new"))
+        server.LOBBY.set_status("aa", "started")
+        await Wait(
+          lambda: len(front_lobby.games) == 2 and front_lobby.games["aa"]["status"] != "new"
+        )
+        self.assertEqual(front_lobby.game_list(), [Entry("aa", "started"), Entry("bb", "new")])
+        self.assertIs(router.owner("bb"), worker)
+      finally:
+        watcher.cancel()
+        ws_server.close()
+        await ws_server.wait_closed()
+
+    with mock.patch.object(server, "LOBBY", lobby.Lobby()):
+      asyncio.run(run())
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+
+import email.message
+import gzip
+import os
+import tempfile
+import unittest
+
+import static
+
+
+def Headers(**kwargs):
+  headers = email.message.Message()
+  for key, value in kwargs.items():
+    headers[key.replace("_", "-")] = value
+  return headers
+
+
+class StaticFilesTest(unittest.TestCase):
+  def setUp(self):
+    self.tmpdir = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+    self.addCleanup(self.tmpdir.cleanup)
+    self.root = self.tmpdir.name
+    self.write("small.js", b"let x = 1;\n")
+    self.write("big.js", b"function f() { return 1; }\n" * 200)
+    self.write("image.png", b"\x89PNG" + bytes(range(256)) * 8)
+    self.files = static.StaticFiles([self.root], sendfile_threshold=1024)
+
+  def write(self, name, data):
+    with open(os.path.join(self.root, name), "wb") as writer:
+      writer.write(data)
+    return os.path.join(self.root, name)
+
+  def testAllowed(self):
+    self.assertTrue(self.files.allowed(os.path.join(self.root, "small.js")))
+    self.assertFalse(self.files.allowed(os.path.join(self.root, "sub", "small.js")))
+    self.assertFalse(self.files.allowed("/etc/passwd"))
+
+  def testPreloadAndCache(self):
+    self.files.preload()
+    self.assertEqual(self.files.misses, 3)
+    asset = self.files.get(os.path.join(self.root, "big.js"))
+    self.assertEqual(self.files.hits, 1)
+    self.assertIn(asset.content_type, ["application/javascript", "text/javascript"])
+    self.assertIsNone(self.files.get(os.path.join(self.root, "missing.js")))
+    self.assertIsNone(self.files.get(self.root))
+
+  def testCompression(self):
+    asset = self.files.get(os.path.join(self.root, "big.js"))
+    encoding, data = asset.select("gzip, deflate")
+    self.assertEqual(encoding, "gzip")
+    self.assertEqual(gzip.decompress(data), asset.data)
+    self.assertEqual(asset.select(None), (None, asset.data))
+    self.assertEqual(asset.select("identity"), (None, asset.data))
+
+    # Small files are not worth compressing.
+    small = self.files.get(os.path.join(self.root, "small.js"))
+    self.assertEqual(small.select("gzip"), (None, b"let x = 1;\n"))
+
+  def testLargeUncompressibleFilesAreNotCached(self):
+    asset = self.files.get(os.path.join(self.root, "image.png"))
+    self.assertIsNone(asset.data)
+    self.assertEqual(asset.select("gzip"), (None, None))
+    self.assertNotIn(asset.filepath, self.files.assets)
+
+  def testReloadWhenChanged(self):
+    path = os.path.join(self.root, "small.js")
+    old = self.files.get(path)
+    self.write("small.js", b"let x = 22;\n")
+    os.utime(path, (old.mtime + 10, old.mtime + 10))
+    new = self.files.get(path)
+    self.assertEqual(new.data, b"let x = 22;\n")
+    self.assertNotEqual(new.etag, old.etag)
+
+  def testConditionalRequests(self):
+    asset = self.files.get(os.path.join(self.root, "small.js"))
+    self.assertFalse(asset.not_modified(Headers()))
+    self.assertTrue(asset.not_modified(Headers(If_None_Match=asset.etag)))
+    self.assertTrue(asset.not_modified(Headers(If_None_Match=f'"other", {asset.etag}')))
+    self.assertFalse(asset.not_modified(Headers(If_None_Match='"other"')))
+    self.assertTrue(asset.not_modified(Headers(If_Modified_Since=asset.last_modified)))
+    self.assertFalse(asset.not_modified(Headers(If_Modified_Since="Thu, 01 Jan 1970 00:00:00 GMT")))
+    self.assertFalse(asset.not_modified(Headers(If_Modified_Since="garbage")))
+
+  def testVariantsHaveTheirOwnETags(self):
+    asset = self.files.get(os.path.join(self.root, "big.js"))
+    gzip_etag = asset.etag_for("gzip")
+    self.assertEqual(asset.etag_for(None), asset.etag)
+    self.assertNotEqual(gzip_etag, asset.etag)
+    self.assertTrue(gzip_etag.startswith('"') and gzip_etag.endswith('-gzip"'))
+    self.assertTrue(asset.not_modified(Headers(If_None_Match=gzip_etag), "gzip"))
+    self.assertFalse(asset.not_modified(Headers(If_None_Match=gzip_etag)))
+    self.assertFalse(asset.not_modified(Headers(If_None_Match=asset.etag), "gzip"))
+
+  def testEviction(self):
+    self.files.max_bytes = 8000
+    self.files.get(os.path.join(self.root, "big.js"))
+    self.files.get(os.path.join(self.root, "small.js"))
+    self.assertEqual(len(self.files.assets), 2)
+    for idx in range(5):
+      self.files.get(self.write(f"other{idx}.js", b"x" * 1000))
+    self.assertLessEqual(self.files.total_bytes, self.files.max_bytes)
+    self.assertNotIn(os.path.join(self.root, "big.js"), self.files.assets)
+    self.assertIn(os.path.join(self.root, "other4.js"), self.files.assets)
+
+
+if __name__ == "__main__":
+  unittest.main()